@@ -1,10 +1,10 @@
 """
 Phase 1: Scrape gynecologist phone numbers from Google Places API
 """
-import requests
 import json
-import time
 from config import GOOGLE_PLACES_API_KEY, SEARCH_LOCATION, SEARCH_RADIUS_METERS
+from phone_numbers import PhoneIndex, normalize
+from rate_limit import get_limiter, limited_request
 
 # Safety limit to prevent excessive API billing
 MAX_RESULTS = 100
@@ -18,7 +18,7 @@ def search_places(query: str, location: dict, radius: int, page_token: str = Non
     headers = {
         "Content-Type": "application/json",
         "X-Goog-Api-Key": GOOGLE_PLACES_API_KEY,
-        "X-Goog-FieldMask": "places.displayName,places.formattedAddress,places.nationalPhoneNumber,places.internationalPhoneNumber,places.websiteUri,places.googleMapsUri,places.businessStatus,nextPageToken"
+        "X-Goog-FieldMask": "places.displayName,places.formattedAddress,places.nationalPhoneNumber,places.internationalPhoneNumber,places.websiteUri,places.googleMapsUri,places.businessStatus,places.regularOpeningHours,places.utcOffsetMinutes,nextPageToken"
     }
     
     body = {
@@ -38,7 +38,8 @@ def search_places(query: str, location: dict, radius: int, page_token: str = Non
     if page_token:
         body["pageToken"] = page_token
     
-    response = requests.post(url, headers=headers, json=body)
+    # Paced by the shared "places" bucket (rate_limit.py), retried on 429
+    response = limited_request("places", "POST", url, headers=headers, json=body, timeout=30)
     
     if response.status_code != 200:
         print(f"Error: {response.status_code}")
@@ -59,7 +60,9 @@ def get_all_gynecologists() -> list:
         "women's health clinic ultrasound Cape Town",
     ]
     
-    seen_phones = set()  # Deduplicate by phone number
+    # Deduplicate by E.164 number, so "021 555 1234" and "+27 21 555 1234" are one
+    # practice; invalid and fax-to-email numbers are dropped
+    seen_phones = PhoneIndex()
     
     for query in search_queries:
         # Stop if we've hit the limit
@@ -89,20 +92,22 @@ def get_all_gynecologists() -> list:
                     
                 phone = place.get("nationalPhoneNumber") or place.get("internationalPhoneNumber")
                 
-                # Skip if no phone or already seen
-                if not phone or phone in seen_phones:
+                # Skip if no phone, already seen or not dialable
+                if not seen_phones.add(phone):
                     continue
                 
-                seen_phones.add(phone)
-                
                 place_data = {
                     "name": place.get("displayName", {}).get("text", "Unknown"),
                     "address": place.get("formattedAddress", ""),
                     "phone": phone,
+                    "phone_e164": normalize(phone),
                     "international_phone": place.get("internationalPhoneNumber", ""),
                     "website": place.get("websiteUri", ""),
                     "google_maps_url": place.get("googleMapsUri", ""),
                     "status": place.get("businessStatus", "UNKNOWN"),
+                    # Used by dial_scheduler.py to only dial during business hours
+                    "opening_hours": place.get("regularOpeningHours", {}).get("periods", []),
+                    "utc_offset_minutes": place.get("utcOffsetMinutes", 120),
                 }
                 
                 all_places.append(place_data)
@@ -114,8 +119,9 @@ def get_all_gynecologists() -> list:
                 break
             
             page += 1
-            time.sleep(2)  # Be nice to the API
     
+    print(f"\nPhone numbers: {seen_phones.summary()}")
+    get_limiter().report()
     return all_places
 
 
@@ -1,20 +1,72 @@
 """
 Phase 2: Use VAPI to call gynecologists and gather information
 Saves results to Excel and tracks called numbers
+
+Calls run as a campaign: up to --concurrency calls are in flight at once
+(default VAPI_MAX_CONCURRENT_CALLS from .env), and each finished call is
+written to Excel as soon as it ends. With VAPI_WEBHOOK_URL set, call completion
+comes from VAPI webhooks (see vapi_webhooks.py); otherwise all in-flight calls
+are refreshed together by one batched list-calls poll (see vapi_poller.py).
+
+Which practices get dialed is decided by dial_scheduler.py: failed, busy,
+unanswered and timed-out numbers come back after a per-outcome backoff, only
+during the practice's business hours, best connect odds first. Calls are spread
+over every phone number in VAPI_PHONE_NUMBER_IDS (see line_pool.py).
+
+Every call is timed through its stages (initiated, ringing, answered, ended,
+analysed, recording saved, persisted): one JSON line per call in
+call_trace.jsonl, and p50/p95 per stage, calls/hour and cost/call in
+campaign_metrics.prom (Prometheus text format, see call_metrics.py).
+
+Usage:
+  python 2_vapi_caller.py
+  python 2_vapi_caller.py --max-calls 50 --concurrency 5
+  python 2_vapi_caller.py --ignore-hours          # testing against your own phone
 """
+import argparse
 import requests
 import json
 import time
 import os
-from openpyxl import Workbook, load_workbook
-from config import VAPI_API_KEY, VAPI_PHONE_NUMBER_ID, GEMINI_API_KEY
-
-VAPI_BASE_URL = "https://api.vapi.ai"
-
-# File to track which numbers we've already called
-CALLED_NUMBERS_FILE = "called_numbers.json"
-
-# The assistant prompt - this is what the AI will say on the call
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from config import (
+    VAPI_API_KEY, VAPI_PHONE_NUMBER_ID, VAPI_MAX_CONCURRENT_CALLS,
+    VAPI_WEBHOOK_URL, VAPI_WEBHOOK_PORT, VAPI_WEBHOOK_SECRET, GEMINI_API_KEY,
+)
+import call_analysis
+from assistant_registry import ensure_assistant
+from call_metrics import StageMetrics, iso_to_epoch
+from dial_scheduler import DialScheduler
+from dial_state import get_dial_state
+from excel_sink import ExcelSink
+from gemini_client import get_gemini
+from line_pool import LinePool, NoLinesAvailable, is_line_failure, parse_lines
+from phone_numbers import parse as parse_phone
+from post_call import PostCallPool
+from recording_fetcher import fetch_recording, recording_filename
+from results_log import CALL_RESULTS_LOG, ResultsLog
+from vapi_client import get_client
+from vapi_poller import BatchCallPoller
+from vapi_webhooks import CallWaiter, server_override, start_webhook_server
+
+# How long to wait for a call to end, and how long to poll if its webhook never came
+CALL_TIMEOUT_SECONDS = 300
+WEBHOOK_FALLBACK_POLL_SECONDS = 60
+# Threads for post-call work (Gemini analysis, recording download, saving)
+POST_CALL_WORKERS = 4
+
+# Per-call stage timing (see call_metrics.py). Ringing is only known with webhooks
+CALL_STAGES = ["initiated", "ringing", "answered", "ended", "analysed", "recording_saved", "persisted"]
+CALL_TRACE_FILE = "call_trace.jsonl"
+CAMPAIGN_METRICS_FILE = "campaign_metrics.prom"
+
+# Numbers we've already called, and the retry queue, live in dial_state.db
+# (see dial_state.py / dial_scheduler.py); the old called_numbers.json is
+# imported into it on first run
+
+# The assistant prompt - this is what the AI will say on the call.
+# Cached in assistants_cache.json under ASSISTANT_KEY; edits are PATCHed on the next run.
+ASSISTANT_KEY = "gyni-finder"
 ASSISTANT_CONFIG = {
     "name": "Gyni Finder Assistant",
     "model": {
@@ -81,100 +133,53 @@ CONVERSATION FLOW:
 }
 
 
-def get_headers():
-    return {
-        "Authorization": f"Bearer {VAPI_API_KEY}",
-        "Content-Type": "application/json"
-    }
-
-
 def download_recording(recording_url: str, practice_name: str, call_id: str) -> str:
-    """Download the call recording and save locally"""
+    """Download the call recording and save locally (resumable, atomic; see recording_fetcher.py)"""
     if not recording_url:
         return ""
     
     # Create recordings folder if it doesn't exist
-    if not os.path.exists(RECORDINGS_FOLDER):
-        os.makedirs(RECORDINGS_FOLDER)
-    
-    # Clean practice name for filename
-    safe_name = "".join(c if c.isalnum() or c in (' ', '-', '_') else '_' for c in practice_name)
-    safe_name = safe_name[:50]  # Limit length
-    filename = f"{safe_name}_{call_id[:8]}.mp3"
-    filepath = os.path.join(RECORDINGS_FOLDER, filename)
+    os.makedirs(RECORDINGS_FOLDER, exist_ok=True)
+    filepath = os.path.join(RECORDINGS_FOLDER, recording_filename(practice_name, call_id))
     
     try:
-        response = requests.get(recording_url, stream=True)
-        if response.status_code == 200:
-            with open(filepath, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
-            print(f"  ✓ Recording saved: {filepath}")
-            return filepath
-        else:
-            print(f"  ✗ Failed to download recording: {response.status_code}")
-            return ""
+        status = fetch_recording(recording_url, filepath)
+        print(f"  ✓ Recording {status}: {filepath}")
+        return filepath
     except Exception as e:
         print(f"  ✗ Recording download error: {e}")
         return ""
 
 
-def load_called_numbers() -> set:
-    """Load the set of phone numbers we've already called"""
-    try:
-        with open(CALLED_NUMBERS_FILE, "r") as f:
-            return set(json.load(f))
-    except FileNotFoundError:
-        return set()
-
-
-def save_called_number(phone: str):
-    """Add a phone number to the called list"""
-    called = load_called_numbers()
-    called.add(phone)
-    with open(CALLED_NUMBERS_FILE, "w") as f:
-        json.dump(list(called), f)
-
-
 EXCEL_FILE = "gyni_results.xlsx"
 RECORDINGS_FOLDER = "recordings"
 
-def setup_excel():
-    """Setup Excel file with headers"""
-    headers = [
-        "Practice Name",
-        "Phone",
-        "Address", 
-        "Gyni Available",
-        "Ultrasound Available",
-        "Consultation Price",
-        "Earliest Availability",
-        "Call Status",
-        "Call Duration (s)",
-        "Full Transcript",
-        "Recording URL",
-        "Local Recording File",
-        "Called At"
-    ]
-    
-    if os.path.exists(EXCEL_FILE):
-        # Load existing workbook
-        wb = load_workbook(EXCEL_FILE)
-        ws = wb.active
-        print(f"Loaded existing Excel file: {EXCEL_FILE}")
-    else:
-        # Create new workbook with headers
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Call Results"
-        ws.append(headers)
-        wb.save(EXCEL_FILE)
-        print(f"Created new Excel file: {EXCEL_FILE}")
-    
-    return wb, ws
-
-
-def append_to_excel(wb, ws, result: dict):
+EXCEL_HEADERS = [
+    "Practice Name",
+    "Phone",
+    "Address", 
+    "Gyni Available",
+    "Ultrasound Available",
+    "Consultation Price",
+    "Earliest Availability",
+    "Call Status",
+    "Call Duration (s)",
+    "Full Transcript",
+    "Recording URL",
+    "Local Recording File",
+    "Called At"
+]
+
+
+def setup_excel() -> ExcelSink:
+    """Open the Excel sink (rows are journaled, the workbook is rebuilt in the background)"""
+    existed = os.path.exists(EXCEL_FILE)
+    sink = ExcelSink(EXCEL_FILE, EXCEL_HEADERS)
+    print(f"{'Using existing' if existed else 'Created new'} Excel file: {EXCEL_FILE}")
+    return sink
+
+
+def append_to_excel(sink: ExcelSink, result: dict):
     """Append a result row to Excel"""
     practice = result.get("practice", {})
     
@@ -195,41 +200,29 @@ def append_to_excel(wb, ws, result: dict):
     ]
     
     try:
-        ws.append(row)
-        wb.save(EXCEL_FILE)
+        sink.append(row)
         print(f"  ✓ Added to {EXCEL_FILE}")
     except Exception as e:
         print(f"  ✗ Excel error: {e}")
 
 
-def create_assistant():
-    """Create a VAPI assistant for the calls"""
-    url = f"{VAPI_BASE_URL}/assistant"
-    response = requests.post(url, headers=get_headers(), json=ASSISTANT_CONFIG)
-    
-    if response.status_code != 201:
-        print(f"Error creating assistant: {response.status_code}")
-        print(response.text)
-        return None
-    
-    assistant = response.json()
-    print(f"Created assistant: {assistant['id']}")
-    return assistant
-
-
-def make_call(phone_number: str, assistant_id: str, practice_name: str):
-    """Make an outbound call to a phone number"""
-    url = f"{VAPI_BASE_URL}/call/phone"
-    
-    # Format phone number for South Africa if needed
-    formatted_number = phone_number.strip().replace(" ", "")
-    if formatted_number.startswith("0"):
-        formatted_number = "+27" + formatted_number[1:]
-    elif not formatted_number.startswith("+"):
-        formatted_number = "+27" + formatted_number
+def make_call(phone_number: str, assistant_id: str, practice_name: str, assistant_overrides: dict = None,
+              phone_number_id: str = None):
+    """
+    Make an outbound call to a phone number. Returns (call, None), or
+    (None, error) where error says why nothing was dialled:
+    {"reason": "undialable" | "network" | "http", "status": ..., "detail": ...}
+    (see line_pool.is_line_failure).
+    """
+    # E.164, validated against the SA numbering plan (see phone_numbers.py)
+    number = parse_phone(phone_number)
+    if not number.dialable:
+        print(f"  Not calling {practice_name}: {phone_number!r} is {number.kind}")
+        return None, {"reason": "undialable", "status": None, "detail": number.kind}
+    formatted_number = number.e164
     
     payload = {
-        "phoneNumberId": VAPI_PHONE_NUMBER_ID,
+        "phoneNumberId": phone_number_id or VAPI_PHONE_NUMBER_ID,
         "assistantId": assistant_id,
         "customer": {
             "number": formatted_number,
@@ -240,23 +233,31 @@ def make_call(phone_number: str, assistant_id: str, practice_name: str):
             "original_phone": phone_number
         }
     }
+    if assistant_overrides:
+        payload["assistantOverrides"] = assistant_overrides
     
-    response = requests.post(url, headers=get_headers(), json=payload)
+    try:
+        response = get_client().create_call(payload)
+    except requests.RequestException as e:
+        print(f"  Error calling {practice_name}: {e}")
+        return None, {"reason": "network", "status": None, "detail": str(e)}
     
     if response.status_code != 201:
         print(f"  Error calling {practice_name}: {response.status_code}")
         print(f"  {response.text}")
-        return None
+        return None, {"reason": "http", "status": response.status_code, "detail": response.text[:500]}
     
     call = response.json()
     print(f"  Call initiated: {call['id']} -> {formatted_number}")
-    return call
+    return call, None
 
 
 def get_call_status(call_id: str):
     """Get the status of a call"""
-    url = f"{VAPI_BASE_URL}/call/{call_id}"
-    response = requests.get(url, headers=get_headers())
+    try:
+        response = get_client().get_call(call_id)
+    except requests.RequestException:
+        return None
     
     if response.status_code != 200:
         return None
@@ -264,7 +265,22 @@ def get_call_status(call_id: str):
     return response.json()
 
 
-def wait_for_call_completion(call_id: str, timeout: int = 300):
+def list_calls(created_after: str, limit: int = 100) -> list:
+    """List calls created after an ISO timestamp (one request for many in-flight calls)"""
+    try:
+        response = get_client().list_calls(createdAtGt=created_after, limit=limit)
+    except requests.RequestException as e:
+        print(f"  Error listing calls: {e}")
+        return []
+    
+    if response.status_code != 200:
+        print(f"  Error listing calls: {response.status_code}")
+        return []
+    
+    return response.json()
+
+
+def wait_for_call_completion(call_id: str, timeout: int = CALL_TIMEOUT_SECONDS):
     """Wait for a call to complete and return the result"""
     start_time = time.time()
     
@@ -286,62 +302,9 @@ def wait_for_call_completion(call_id: str, timeout: int = 300):
 
 def analyze_transcript(transcript: str) -> dict:
     """Use Gemini to analyze transcript and extract key info"""
-    
-    result = {
-        "has_gyni": "Unknown",
-        "has_ultrasound": "Unknown",
-        "price": "Unknown",
-        "availability": "Unknown"
-    }
-    
-    if not transcript or not GEMINI_API_KEY:
-        return result
-    
-    try:
-        prompt = """Analyze this phone call transcript and extract the following information. 
-Return ONLY a JSON object with these exact keys:
-- has_gyni: "Yes", "No", or "Unknown"
-- has_ultrasound: "Yes", "No", or "Unknown"  
-- price: The consultation price mentioned (e.g., "R2800") or "Unknown"
-- availability: The earliest available appointment mentioned (e.g., "Wednesday 2pm", "Next Monday") or "Unknown"
-
-Be thorough - look for any mention of prices, fees, costs, availability, appointments, gynecologist/gynaecologist availability.
-
-Transcript:
-""" + transcript
-        
-        response = requests.post(
-            f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={GEMINI_API_KEY}",
-            headers={"Content-Type": "application/json"},
-            json={
-                "contents": [{"parts": [{"text": prompt}]}],
-                "generationConfig": {"temperature": 0}
-            }
-        )
-        
-        if response.status_code == 200:
-            content = response.json()["candidates"][0]["content"]["parts"][0]["text"]
-            # Parse the JSON response
-            import json
-            # Clean up the response (remove markdown code blocks if present)
-            content = content.strip()
-            if content.startswith("```"):
-                content = content.split("```")[1]
-                if content.startswith("json"):
-                    content = content[4:]
-            content = content.strip()
-            
-            parsed = json.loads(content)
-            result["has_gyni"] = parsed.get("has_gyni", "Unknown")
-            result["has_ultrasound"] = parsed.get("has_ultrasound", "Unknown")
-            result["price"] = parsed.get("price", "Unknown")
-            result["availability"] = parsed.get("availability", "Unknown")
-            print(f"  AI Analysis: Gyni={result['has_gyni']}, Ultrasound={result['has_ultrasound']}, Price={result['price']}, Avail={result['availability']}")
-        else:
-            print(f"  Gemini error: {response.status_code} - {response.text}")
-    except Exception as e:
-        print(f"  AI analysis error: {e}")
-    
+    result = call_analysis.analyze_transcript(transcript)
+    if transcript and GEMINI_API_KEY:
+        print(f"  AI Analysis: Gyni={result['has_gyni']}, Ultrasound={result['has_ultrasound']}, Price={result['price']}, Avail={result['availability']}")
     return result
 
 
@@ -364,6 +327,7 @@ def extract_call_results(call: dict) -> dict:
         "has_ultrasound": analysis["has_ultrasound"],
         "price": analysis["price"],
         "availability": analysis["availability"],
+        **{key: analysis[key] for key in call_analysis.STAMP_FIELDS if key in analysis},
     }
     
     return result
@@ -379,151 +343,272 @@ def load_gynecologists(filename: str = "gynecologists.json") -> list:
         return []
 
 
-CALL_RESULTS_FILE = "call_results.json"
+def await_call_end(call: dict, waiter: CallWaiter = None, poller: BatchCallPoller = None,
+                   timeout: int = CALL_TIMEOUT_SECONDS):
+    """
+    Wait for a call to end: from its webhook when a receiver is running, else from the
+    batched poller, else by polling this one call.
+    """
+    call_id = call['id']
+    if waiter:
+        ended = waiter.wait(call_id, timeout)
+        if ended:
+            return ended
+        print(f"  No end-of-call-report for {call_id[:8]}, polling instead")
+        timeout = WEBHOOK_FALLBACK_POLL_SECONDS
+    if poller:
+        return poller.wait(call_id, timeout, call.get("createdAt", ""))
+    return wait_for_call_completion(call_id, timeout)
+
+
+def mark_call_stages(trace, call: dict, completed_call: dict, waiter: CallWaiter = None):
+    """ringing / answered / ended from webhook status-updates, else VAPI's own call timestamps."""
+    timeline = waiter.timeline(call['id']) if waiter else {}
+    ended = completed_call or {}
+    stamps = {
+        "ringing": timeline.get("ringing"),
+        "answered": timeline.get("in-progress") or iso_to_epoch(ended.get("startedAt")),
+        "ended": timeline.get("ended") or iso_to_epoch(ended.get("endedAt")) or (time.time() if completed_call else None),
+    }
+    for stage, ts in stamps.items():
+        if ts:
+            trace.mark(stage, ts)
+
+
+def place_call(practice: dict, assistant_id: str, waiter: CallWaiter = None, poller: BatchCallPoller = None,
+               lines: LinePool = None, trace=None):
+    """
+    Dial one practice and block until the call ends. Runs on a campaign worker thread.
+    With a line pool, waits for the least-loaded phone line and holds it for the call.
+    """
+    overrides = server_override(VAPI_WEBHOOK_URL, VAPI_WEBHOOK_SECRET) if waiter else None
+    line = lines.acquire() if lines else None
+    started = time.time()
+    if trace:
+        trace.mark("initiated", started)
+    call, completed_call, error = None, None, None
+    try:
+        call, error = make_call(practice['phone'], assistant_id, practice['name'], overrides, line.id if line else None)
+        if call:
+            if waiter:
+                waiter.expect(call['id'])
+            completed_call = await_call_end(call, waiter, poller)
+            if trace:
+                mark_call_stages(trace, call, completed_call, waiter)
+        return call, completed_call
+    finally:
+        if line:
+            lines.release(line, failed=is_line_failure(call, completed_call, error), started=started)
+
+
+def handle_call_outcome(practice: dict, call, completed_call, sink: ExcelSink, trace=None) -> dict:
+    """Turn a finished dial into a result row: Excel and recording."""
+    if not call:
+        result = {
+            "practice": practice,
+            "status": "failed",
+            "error": "Failed to initiate call"
+        }
+        append_to_excel(sink, result)
+        return result
 
+    if not completed_call:
+        result = {
+            "practice": practice,
+            "call_id": call['id'],
+            "status": "timeout",
+            "error": "Call timed out"
+        }
+        append_to_excel(sink, result)
+        return result
 
-def load_existing_results(filename: str = CALL_RESULTS_FILE) -> list:
-    """Load existing call results so we accumulate across runs."""
-    if not os.path.exists(filename):
-        return []
-    try:
-        with open(filename, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        return data if isinstance(data, list) else []
-    except Exception:
-        return []
+    result = extract_call_results(completed_call)
+    result["practice"] = practice
+    if trace:
+        trace.mark("analysed")
+        trace.cost = result.get("cost")
+
+    print(f"  Call ended: {result['end_reason']} ({result['duration_seconds']}s)")
+    print(f"  Gyni: {result['has_gyni']} | Ultrasound: {result['has_ultrasound']} | Price: {result['price']}")
+
+    # Download the recording
+    if result.get("recording_url"):
+        local_recording = download_recording(
+            result["recording_url"],
+            practice['name'],
+            result['call_id']
+        )
+        result["local_recording"] = local_recording
+        if trace and local_recording:
+            trace.mark("recording_saved")
 
+    # Save to Excel
+    append_to_excel(sink, result)
+    return result
 
-def save_results(results: list, filename: str = CALL_RESULTS_FILE):
-    """Save call results to JSON (appends to existing so we keep all runs)."""
-    existing = load_existing_results(filename)
-    combined = existing + results
-    with open(filename, "w", encoding="utf-8") as f:
-        json.dump(combined, f, indent=2, ensure_ascii=False)
-    print(f"\nSaved {len(results)} new results → {filename} now has {len(combined)} total")
+
+def run_campaign(practices: list, assistant_id: str, sink: ExcelSink, max_concurrent: int = VAPI_MAX_CONCURRENT_CALLS,
+                 waiter: CallWaiter = None, poller: BatchCallPoller = None,
+                 results_log: ResultsLog = None, post_call_workers: int = POST_CALL_WORKERS,
+                 scheduler: DialScheduler = None, lines: LinePool = None, metrics: StageMetrics = None) -> list:
+    """
+    Keep up to max_concurrent calls in flight. Dialing and waiting happen on dialer
+    threads; each finished call is handed to the post-call pool (transcript analysis,
+    recording download, Excel, results log, retry scheduling), so dialing never
+    waits on that work. Returns results in the order their post-call work finished.
+    """
+    max_concurrent = max(1, max_concurrent)
+
+    def process(practice, call, completed_call, trace=None):
+        result = handle_call_outcome(practice, call, completed_call, sink, trace)
+        result.setdefault("called_at", time.strftime("%Y-%m-%d %H:%M:%S"))
+        if scheduler:
+            # Connected -> called; anything else is queued for a retry in business hours
+            result["dial_outcome"] = scheduler.record(practice, result)
+        if results_log:
+            results_log.append(result)
+        if trace:
+            trace.mark("persisted")
+            trace.labels.update(call_id=result.get("call_id"), outcome=result.get("dial_outcome") or result.get("status"))
+            metrics.finish(trace)
+        return result
+
+    post_call = PostCallPool(process, workers=post_call_workers)
+    try:
+        with ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix="dialer") as pool:
+            futures = {}
+            for p in practices:
+                trace = metrics.start(p['phone'], practice=p['name']) if metrics else None
+                futures[pool.submit(place_call, p, assistant_id, waiter, poller, lines, trace)] = (p, trace)
+            for done, future in enumerate(as_completed(futures), 1):
+                practice, trace = futures[future]
+                try:
+                    call, completed_call = future.result()
+                except NoLinesAvailable:
+                    # Never dialed - leave it for the next run instead of counting a failed attempt
+                    print(f"  ✗ No phone lines left, skipping {practice['name']}")
+                    continue
+                except Exception as e:
+                    print(f"  ✗ Call error for {practice['name']}: {e}")
+                    call, completed_call = None, None
+                print(f"\n[{done}/{len(practices)}] Finished: {practice['name']} ({practice['phone']})"
+                      f" | post-call queue: {post_call.depth()}")
+                post_call.submit(practice=practice, call=call, completed_call=completed_call, trace=trace)
+    finally:
+        print("\nWaiting for post-call processing to finish...")
+        results = post_call.drain()
+        post_call.report()
+    return results
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Call practices from gynecologists.json with VAPI")
+    parser.add_argument("--max-calls", type=int, default=10, help="Practices to call this run (default 10)")
+    parser.add_argument("--concurrency", type=int, default=VAPI_MAX_CONCURRENT_CALLS,
+                        help="Max calls in flight at once (default VAPI_MAX_CONCURRENT_CALLS)")
+    parser.add_argument("--post-call-workers", type=int, default=POST_CALL_WORKERS,
+                        help=f"Threads for analysis / recording download (default {POST_CALL_WORKERS})")
+    parser.add_argument("--ignore-hours", action="store_true",
+                        help="Dial due numbers even outside practice business hours")
+    parser.add_argument("--no-cache", action="store_true", help="Ask Gemini again instead of using llm_cache.db answers")
+    args = parser.parse_args()
+    if args.no_cache:
+        get_gemini().use_cache = False
+
     if not VAPI_API_KEY:
         print("ERROR: Please set VAPI_API_KEY in your .env file")
         return
     
-    if not VAPI_PHONE_NUMBER_ID:
-        print("ERROR: Please set VAPI_PHONE_NUMBER_ID in your .env file")
+    lines = parse_lines()
+    if not lines:
+        print("ERROR: Please set VAPI_PHONE_NUMBER_ID (or VAPI_PHONE_NUMBER_IDS) in your .env file")
         return
+    lines = LinePool(lines)
     
     print("=" * 50)
     print("Gyni Finder - Phase 2: VAPI Calling")
     print("=" * 50)
     
-    # Setup Excel file
-    wb, ws = setup_excel()
-    
     # Load gynecologists from Phase 1
     practices = load_gynecologists()
     if not practices:
         return
     
-    # Load already-called numbers to avoid duplicates
-    called_numbers = load_called_numbers()
-    print(f"Already called: {len(called_numbers)} numbers")
-    
-    # Filter out already-called numbers
-    practices_to_call = [p for p in practices if p['phone'] not in called_numbers]
-    print(f"Remaining to call: {len(practices_to_call)} practices")
+    # Skip called / given-up numbers and retries that aren't due; best odds first
+    scheduler = DialScheduler()
+    plan = scheduler.plan(practices, ignore_hours=args.ignore_hours)
+    practices_to_call = plan["due"]
+    print(f"Already called or given up: {len(plan['done'])} numbers")
+    print(f"Waiting for a retry slot or business hours: {len(plan['waiting'])}")
+    if plan["skipped"]:
+        print(f"Skipped duplicate / invalid / fax numbers: {len(plan['skipped'])}")
+    print(f"Due now: {len(practices_to_call)} practices")
     
     if not practices_to_call:
-        print("\n✓ All practices have been called!")
+        if plan["waiting"]:
+            print("\nNothing due right now - run again later (or --ignore-hours).")
+        else:
+            print("\n✓ All practices have been called!")
         return
     
-    # Create assistant
-    print("\nCreating VAPI assistant...")
-    assistant = create_assistant()
-    if not assistant:
+    # Reuse the cached assistant (created / patched only when ASSISTANT_CONFIG changes)
+    print("\nSyncing VAPI assistant...")
+    assistant_id = ensure_assistant(ASSISTANT_KEY, ASSISTANT_CONFIG)
+    if not assistant_id:
         return
     
-    # Limit calls for testing (IMPORTANT: start small!)
-    MAX_CALLS = 10  # Batch of 10 calls per run
-    practices_batch = practices_to_call[:MAX_CALLS]
-    
-    print(f"\n📞 Calling {MAX_CALLS} practice(s) this run")
-    print("Edit MAX_CALLS in the script to adjust batch size\n")
-    
-    all_results = []
-    
-    for i, practice in enumerate(practices_batch, 1):
-        print(f"\n[{i}/{len(practices_batch)}] Calling: {practice['name']}")
-        print(f"  Phone: {practice['phone']}")
-        
-        # Make the call
-        call = make_call(practice['phone'], assistant['id'], practice['name'])
-        
-        if not call:
-            result = {
-                "practice": practice,
-                "status": "failed",
-                "error": "Failed to initiate call"
-            }
-            all_results.append(result)
-            append_to_excel(wb, ws, result)
-            # DON'T mark as called if it failed - so we can retry
-            continue
-        
-        # Wait for call to complete
-        print("  Waiting for call to complete...")
-        completed_call = wait_for_call_completion(call['id'])
-        
-        if completed_call:
-            result = extract_call_results(completed_call)
-            result["practice"] = practice
-            
-            print(f"  Call ended: {result['end_reason']} ({result['duration_seconds']}s)")
-            print(f"  Gyni: {result['has_gyni']} | Ultrasound: {result['has_ultrasound']} | Price: {result['price']}")
-            
-            # Download the recording
-            if result.get("recording_url"):
-                local_recording = download_recording(
-                    result["recording_url"], 
-                    practice['name'], 
-                    result['call_id']
-                )
-                result["local_recording"] = local_recording
-            
-            all_results.append(result)
-            
-            # Save to Excel
-            append_to_excel(wb, ws, result)
-            # Only mark as called if the call actually connected
-            save_called_number(practice['phone'])
-        else:
-            result = {
-                "practice": practice,
-                "call_id": call['id'],
-                "status": "timeout",
-                "error": "Call timed out"
-            }
-            all_results.append(result)
-            append_to_excel(wb, ws, result)
-            # DON'T mark as called if it timed out - so we can retry
-        
-        # Small delay between calls
-        if i < len(practices_batch):
-            print("  Waiting 10s before next call...")
-            time.sleep(10)
-    
-    # Save results to JSON as backup
-    save_results(all_results)
+    # Limit calls per run (IMPORTANT: start small!)
+    practices_batch = practices_to_call[:args.max_calls]
+    concurrency = min(args.concurrency, lines.capacity, len(practices_batch))
+    
+    print(f"\n📞 Calling {len(practices_batch)} practice(s) this run, up to {concurrency} at a time"
+          f" over {len(lines.lines)} phone line(s)")
+    print("Use --max-calls / --concurrency to adjust\n")
+    
+    # Webhook receiver for call completion; the batched poller covers calls without one
+    waiter, webhook_server = None, None
+    if VAPI_WEBHOOK_URL:
+        waiter = CallWaiter()
+        webhook_server = start_webhook_server(waiter, VAPI_WEBHOOK_PORT, VAPI_WEBHOOK_SECRET)
+        print(f"Call completion via webhooks: {VAPI_WEBHOOK_URL}")
+    poller = BatchCallPoller(
+        list_calls, get_call_status,
+        max_duration=ASSISTANT_CONFIG["maxDurationSeconds"], timeout=CALL_TIMEOUT_SECONDS,
+    ).start()
+    
+    sink = setup_excel()
+    results_log = ResultsLog(CALL_RESULTS_LOG)
+    metrics = StageMetrics(CALL_STAGES, prefix="vapi_campaign", item="call",
+                           trace_path=CALL_TRACE_FILE, metrics_path=CAMPAIGN_METRICS_FILE)
+    try:
+        all_results = run_campaign(
+            practices_batch, assistant_id, sink, concurrency, waiter, poller, results_log,
+            args.post_call_workers, scheduler, lines, metrics
+        )
+    finally:
+        metrics.close()
+        results_log.close()
+        sink.close()
+        poller.stop()
+        if webhook_server:
+            webhook_server.shutdown()
+    print(f"Status poll requests: {poller.requests_made}")
+    lines.report()
+    call_analysis.report()
+    get_gemini().report()
     
     print("\n" + "=" * 50)
     print("CALLING COMPLETE")
     print("=" * 50)
-    print(f"Calls attempted: {len(all_results)}")
-    print(f"Total called so far: {len(load_called_numbers())}")
-    print(f"Remaining: {len(practices_to_call) - len(practices_batch)}")
+    print(f"Calls attempted: {len(all_results)} (appended to {CALL_RESULTS_LOG})")
+    print(f"Total called so far: {get_dial_state().count_called()}")
+    print(f"Due but not dialed this run: {len(practices_to_call) - len(practices_batch)}")
+    print(f"Scheduled for retry: {len(scheduler.plan(practices, ignore_hours=True)['waiting'])}")
     print("\nResults saved to:")
     print(f"  - {EXCEL_FILE}")
     print(f"  - {RECORDINGS_FOLDER}/ (audio recordings)")
-    print("  - call_results.json (backup)")
+    print(f"  - {CALL_RESULTS_LOG} (one JSON result per line)")
+    print(f"  - {CALL_TRACE_FILE} / {CAMPAIGN_METRICS_FILE} (stage timing)")
     print("\nRun the script again to call more practices.")
 
 
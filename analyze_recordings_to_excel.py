@@ -2,26 +2,50 @@
 Analyze all recordings/transcripts and create the same Excel file (gyni_results.xlsx).
 
 Inputs (use one):
-  1. call_results.json  — from 2_vapi_caller.py (has transcript + practice). Rebuilds Excel from it;
+  1. call_results.jsonl — from 2_vapi_caller.py (has transcript + practice; one result per line,
+     streamed - the legacy call_results.json array also works). Rebuilds Excel from it;
      optionally re-runs Gemini analysis with --reanalyze.
   2. recordings/ + manifest — transcript files (.txt) and recordings_manifest.json listing
      practice_name, phone, address, transcript_file (and optional recording_file). Analyzes each
-     with Gemini and writes Excel.
+     with Gemini and writes Excel. recordings_manifest.jsonl from an unfinished
+     transcribe_recordings.py run works too.
+
+Per-transcript stage timing (started, analysed, persisted) goes to analysis_trace.jsonl and
+analysis_metrics.prom (see call_metrics.py).
+
+Each analysis is stamped with a hash of its transcript and the prompt/model version
+(call_analysis.analysis_version). --reanalyze only redoes rows where either differs (or
+that were never stamped) and writes the new answers and stamps back into the call results
+file; --reanalyze-all redoes everything. --dry-run prints how many rows would be redone
+and roughly what it would cost, without calling Gemini or writing anything.
+
+--workers N runs the Gemini requests on N threads (under the shared rate limits in
+rate_limit.py); rows are still written in input order. A progress line (rows, rate, ETA)
+is printed every few seconds, and Ctrl+C keeps every row written so far.
 
 Usage:
   python analyze_recordings_to_excel.py
   python analyze_recordings_to_excel.py --reanalyze
+  python analyze_recordings_to_excel.py --reanalyze --dry-run    # rows to redo and estimated cost
+  python analyze_recordings_to_excel.py --reanalyze-all
+  python analyze_recordings_to_excel.py --reanalyze --no-cache   # fresh Gemini answers (see llm_cache.py)
   python analyze_recordings_to_excel.py --from-recordings
-  python analyze_recordings_to_excel.py --call-results call_results.json --output my_results.xlsx
+  python analyze_recordings_to_excel.py --reanalyze --batch 10   # 10 transcripts per Gemini request
+  python analyze_recordings_to_excel.py --reanalyze --workers 8  # 8 Gemini requests in flight
+  python analyze_recordings_to_excel.py --call-results call_results.jsonl --output my_results.xlsx
 """
 
 import argparse
-import json
 import os
 import time
 
-# Reuse Excel setup and append from 2_vapi_caller
-from openpyxl import Workbook, load_workbook
+from call_analysis import (MAX_BATCH_SIZE, STAMP_FIELDS, analyze_stream, empty_analysis, estimate_run,
+                           stale_reason)
+from call_analysis import report as report_analysis
+from call_metrics import StageMetrics
+from excel_sink import ExcelSink
+from gemini_client import get_gemini
+from results_log import ResultsRewrite, default_results_path, iter_results
 
 EXCEL_HEADERS = [
     "Practice Name",
@@ -40,80 +64,22 @@ EXCEL_HEADERS = [
 ]
 
 RECORDINGS_FOLDER = "recordings"
-DEFAULT_CALL_RESULTS = "call_results.json"
 DEFAULT_EXCEL = "gyni_results.xlsx"
 MANIFEST_FILE = "recordings_manifest.json"
+ANALYSIS_STAGES = ["started", "analysed", "persisted"]
+ANALYSIS_TRACE_FILE = "analysis_trace.jsonl"
+ANALYSIS_METRICS_FILE = "analysis_metrics.prom"
+PROGRESS_SECONDS = 10.0
 
 
-def get_gemini_analysis(transcript: str, gemini_key: str) -> dict:
-    """Run Gemini to extract has_gyni, has_ultrasound, price, availability."""
-    result = {
-        "has_gyni": "Unknown",
-        "has_ultrasound": "Unknown",
-        "price": "Unknown",
-        "availability": "Unknown",
-    }
-    if not transcript or not gemini_key:
-        return result
+def setup_excel(path: str) -> ExcelSink:
+    """Create or overwrite Excel with headers. Rows are journaled and saved in batches."""
+    return ExcelSink(path, EXCEL_HEADERS, reset=True)
 
-    try:
-        prompt = """Analyze this phone call transcript and extract the following information.
-Return ONLY a JSON object with these exact keys:
-- has_gyni: "Yes", "No", or "Unknown"
-- has_ultrasound: "Yes", "No", or "Unknown"
-- price: The consultation price mentioned (e.g., "R2800") or "Unknown"
-- availability: The earliest available appointment mentioned (e.g., "Wednesday 2pm", "Next Monday") or "Unknown"
-
-Be thorough - look for any mention of prices, fees, costs, availability, appointments, gynecologist/gynaecologist availability.
-
-Transcript:
-""" + transcript
-
-        import requests
-        response = requests.post(
-            f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={gemini_key}",
-            headers={"Content-Type": "application/json"},
-            json={
-                "contents": [{"parts": [{"text": prompt}]}],
-                "generationConfig": {"temperature": 0},
-            },
-            timeout=30,
-        )
-
-        if response.status_code == 200:
-            content = response.json()["candidates"][0]["content"]["parts"][0]["text"]
-            content = content.strip()
-            if content.startswith("```"):
-                content = content.split("```")[1]
-                if content.startswith("json"):
-                    content = content[4:]
-            content = content.strip()
-            parsed = json.loads(content)
-            result["has_gyni"] = parsed.get("has_gyni", "Unknown")
-            result["has_ultrasound"] = parsed.get("has_ultrasound", "Unknown")
-            result["price"] = parsed.get("price", "Unknown")
-            result["availability"] = parsed.get("availability", "Unknown")
-        else:
-            print(f"  Gemini error: {response.status_code}")
-    except Exception as e:
-        print(f"  Gemini error: {e}")
-    return result
 
-
-def setup_excel(path: str):
-    """Create or overwrite Excel with headers."""
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Call Results"
-    ws.append(EXCEL_HEADERS)
-    wb.save(path)
-    return wb, ws
-
-
-def append_row(wb, ws, row: list, excel_path: str):
-    """Append one row and save."""
-    ws.append(row)
-    wb.save(excel_path)
+def append_row(sink: ExcelSink, row: list):
+    """Append one row (the workbook is rebuilt in the background, not per row)."""
+    sink.append(row)
 
 
 def result_to_row(result: dict, called_at: str | None = None) -> list:
@@ -145,50 +111,156 @@ def result_to_row(result: dict, called_at: str | None = None) -> list:
     ]
 
 
-def run_from_call_results(call_results_path: str, excel_path: str, reanalyze: bool, gemini_key: str):
-    """Load call_results.json and write all rows to Excel. Optionally re-run Gemini."""
+class Progress:
+    """Prints rows written, analyses done, rate and (with a known total) ETA every few seconds."""
+
+    def __init__(self, total: int = None, every: float = PROGRESS_SECONDS):
+        self.total = total
+        self.every = every
+        self.rows = 0
+        self.analysed = 0
+        self._started = time.time()
+        self._last = self._started
+
+    def tick(self, analysed: bool):
+        self.rows += 1
+        self.analysed += bool(analysed)
+        if time.time() - self._last >= self.every:
+            self._last = time.time()
+            print(self.line())
+
+    def line(self) -> str:
+        elapsed = max(time.time() - self._started, 1e-9)
+        rate = self.rows / elapsed * 60
+        line = f"  Progress: {self.rows}{f'/{self.total}' if self.total else ''} rows, {self.analysed} analysed, {rate:.0f} rows/min"
+        if self.total and self.rows:
+            line += f", ETA {(self.total - self.rows) / self.rows * elapsed:.0f}s"
+        return line
+
+
+def analysis_metrics() -> StageMetrics:
+    return StageMetrics(ANALYSIS_STAGES, prefix="recording_analysis", item="transcript",
+                        trace_path=ANALYSIS_TRACE_FILE, metrics_path=ANALYSIS_METRICS_FILE)
+
+
+REASONS = {"new": "never analysed", "unstamped": "no version stamp", "transcript": "transcript changed",
+           "version": "prompt/model changed"}
+
+
+def analysis_reason(result: dict, reanalyze: bool, reanalyze_all: bool = False) -> str | None:
+    """Why this result should go to Gemini this run, or None to keep the stored analysis."""
+    if not result.get("transcript"):
+        return None
+    if reanalyze_all:
+        return "all"
+    reason = stale_reason(result)
+    return reason if reanalyze or reason == "new" else None
+
+
+def plan_reanalysis(call_results_path: str, reanalyze: bool, reanalyze_all: bool = False, batch_size: int = 1):
+    """--dry-run: how many rows would be (re)analysed, why, and an estimated Gemini cost."""
+    if not os.path.exists(call_results_path):
+        print(f"Not found: {call_results_path}")
+        return
+    total, reasons = 0, {}
+
+    def transcripts():
+        nonlocal total
+        for result in iter_results(call_results_path):
+            total += 1
+            reason = analysis_reason(result, reanalyze, reanalyze_all)
+            if reason:
+                reasons[reason] = reasons.get(reason, 0) + 1
+                yield result["transcript"]
+
+    est = estimate_run(transcripts(), batch_size)
+    todo = sum(reasons.values())
+    why = ", ".join(f"{REASONS.get(r, r)} {n}" for r, n in sorted(reasons.items(), key=lambda kv: -kv[1]))
+    print(f"Dry run: {total} results in {call_results_path}")
+    print(f"  would analyse {todo}{f' ({why})' if why else ''}; {total - todo} kept as stored")
+    if todo:
+        cost = f", ~${est['cost']:.4f}" if est["cost"] is not None else ""
+        print(f"  ~{est['requests']} Gemini requests (batch {max(1, batch_size)}), ~{est['prompt_tokens']} in / "
+              f"{est['output_tokens']} out tokens{cost}; {est['local']} answered locally (escalations and cached replies not counted)")
+
+
+def run_from_call_results(call_results_path: str, excel_path: str, reanalyze: bool, gemini_key: str,
+                          metrics: StageMetrics = None, batch_size: int = 1, workers: int = 1,
+                          reanalyze_all: bool = False):
+    """
+    Stream call results (JSONL or legacy JSON) and write all rows to Excel. Re-runs Gemini on
+    stale rows with reanalyze (every row with reanalyze_all) and writes the new analyses back.
+    """
     if not os.path.exists(call_results_path):
         print(f"Not found: {call_results_path}")
         print("Run 2_vapi_caller.py first to generate call results, or use --from-recordings.")
         return
 
-    with open(call_results_path, "r", encoding="utf-8") as f:
-        results = json.load(f)
-
-    if not results:
+    sink = setup_excel(excel_path)
+    print(f"Writing rows from {call_results_path} to {excel_path}")
+    rewrite = ResultsRewrite(call_results_path) if gemini_key and (reanalyze or reanalyze_all) else None
+    updated, completed = 0, False
+
+    def to_analyze():
+        """(row context, transcript to send to Gemini or "" to keep the stored analysis)"""
+        for i, result in enumerate(iter_results(call_results_path), 1):
+            practice = result.get("practice") or {}
+            name = practice.get("name", "?") if isinstance(practice, dict) else str(practice)
+            transcript = result.get("transcript", "")
+            trace = metrics.start(practice.get("phone", "") if isinstance(practice, dict) else name, practice=name) \
+                if metrics else None
+            if trace:
+                trace.mark("started")
+            wanted = gemini_key and analysis_reason(result, reanalyze, reanalyze_all)
+            yield (i, name, result, trace), transcript if wanted else ""
+
+    i = 0
+    progress = Progress()
+    try:
+        for (i, name, result, trace), analysis in analyze_stream(to_analyze(), batch_size, workers=workers):
+            if analysis and not analysis.get(STAMP_FIELDS[0]) and result.get("has_gyni"):
+                print(f"  [{i}] Kept the stored analysis for {name[:40]} (Gemini failed)")
+            elif analysis:
+                print(f"  [{i}] {'Re-analyzed' if reanalyze or reanalyze_all else 'Analyzed'}: {name[:40]} "
+                      f"(Gyni={analysis['has_gyni']}, Price={analysis['price']})")
+                result.update(analysis)
+                updated += 1
+            if rewrite:
+                rewrite.append(result)
+
+            if trace:
+                trace.mark("analysed")
+                if analysis and analysis.get("analysis_model"):
+                    trace.labels["model"] = analysis["analysis_model"]
+            row = result_to_row(result, result.get("called_at"))
+            append_row(sink, row)
+            progress.tick(analysis)
+            if trace:
+                trace.mark("persisted")
+                metrics.finish(trace)
+        completed = True
+    except KeyboardInterrupt:
+        print(f"\nInterrupted. Keeping the {progress.rows} rows written so far -> {excel_path}")
+        if rewrite:
+            # The results file stays as it was; answers already paid for are in llm_cache.db for the rerun
+            print(f"  {call_results_path} not updated")
+        return
+    finally:
+        sink.close()
+        if rewrite and not (completed and updated):
+            rewrite.discard()
+
+    if rewrite and updated and rewrite.commit():
+        print(f"Stamped {updated} updated analyses into {call_results_path}")
+    if not i:
         print("No results in file.")
         return
+    print(progress.line())
+    print(f"Done. {i} rows -> {excel_path}")
 
-    wb, ws = setup_excel(excel_path)
-    print(f"Writing {len(results)} rows to {excel_path}")
-
-    for i, result in enumerate(results, 1):
-        practice = result.get("practice") or {}
-        name = practice.get("name", "?") if isinstance(practice, dict) else str(practice)
-        transcript = result.get("transcript", "")
-
-        if reanalyze and transcript and gemini_key:
-            print(f"  [{i}/{len(results)}] Re-analyzing: {name[:40]}...")
-            analysis = get_gemini_analysis(transcript, gemini_key)
-            result["has_gyni"] = analysis["has_gyni"]
-            result["has_ultrasound"] = analysis["has_ultrasound"]
-            result["price"] = analysis["price"]
-            result["availability"] = analysis["availability"]
-        elif not result.get("has_gyni") and transcript and gemini_key:
-            print(f"  [{i}/{len(results)}] Analyzing: {name[:40]}...")
-            analysis = get_gemini_analysis(transcript, gemini_key)
-            result["has_gyni"] = analysis["has_gyni"]
-            result["has_ultrasound"] = analysis["has_ultrasound"]
-            result["price"] = analysis["price"]
-            result["availability"] = analysis["availability"]
-
-        row = result_to_row(result, result.get("called_at"))
-        append_row(wb, ws, row, excel_path)
 
-    print(f"Done. {excel_path}")
-
-
-def run_from_recordings(recordings_dir: str, manifest_path: str, excel_path: str, gemini_key: str):
+def run_from_recordings(recordings_dir: str, manifest_path: str, excel_path: str, gemini_key: str,
+                        metrics: StageMetrics = None, batch_size: int = 1, workers: int = 1):
     """Use recordings_manifest.json + transcript files to build Excel."""
     if not os.path.exists(manifest_path):
         print(f"Not found: {manifest_path}")
@@ -196,53 +268,77 @@ def run_from_recordings(recordings_dir: str, manifest_path: str, excel_path: str
         print('  [{"transcript_file": "call1.txt", "practice_name": "X", "phone": "...", "address": "..."}]')
         return
 
-    with open(manifest_path, "r", encoding="utf-8") as f:
-        manifest = json.load(f)
+    # A JSON array, or the recordings_manifest.jsonl of an unfinished transcription run
+    manifest = list(iter_results(manifest_path))
 
     if not gemini_key:
         print("GEMINI_API_KEY required for --from-recordings. Set it in .env.")
         return
 
-    wb, ws = setup_excel(excel_path)
+    sink = setup_excel(excel_path)
     base = os.path.dirname(manifest_path) or "."
     if recordings_dir:
         base = recordings_dir
 
-    for i, entry in enumerate(manifest, 1):
-        transcript_file = entry.get("transcript_file", "")
-        path = os.path.join(base, transcript_file)
-        if not os.path.exists(path):
-            path = os.path.join(RECORDINGS_FOLDER, transcript_file)
-        if not os.path.exists(path):
-            print(f"  Skip: transcript file not found: {transcript_file}")
-            continue
-
-        with open(path, "r", encoding="utf-8", errors="replace") as f:
-            transcript = f.read()
-
-        print(f"  [{i}/{len(manifest)}] Analyzing: {entry.get('practice_name', '?')[:40]}...")
-        analysis = get_gemini_analysis(transcript, gemini_key)
-
-        practice = {
-            "name": entry.get("practice_name", ""),
-            "phone": entry.get("phone", ""),
-            "address": entry.get("address", ""),
-        }
-        result = {
-            "practice": practice,
-            "has_gyni": analysis["has_gyni"],
-            "has_ultrasound": analysis["has_ultrasound"],
-            "price": analysis["price"],
-            "availability": analysis["availability"],
-            "status": "from transcript",
-            "duration_seconds": entry.get("duration_seconds", ""),
-            "transcript": transcript,
-            "recording_url": entry.get("recording_url", ""),
-            "local_recording": entry.get("recording_file", "") or entry.get("local_recording", ""),
-        }
-        row = result_to_row(result)
-        append_row(wb, ws, row, excel_path)
+    def to_analyze():
+        for i, entry in enumerate(manifest, 1):
+            transcript_file = entry.get("transcript_file", "")
+            path = os.path.join(base, transcript_file)
+            if not os.path.exists(path):
+                path = os.path.join(RECORDINGS_FOLDER, transcript_file)
+            if not os.path.exists(path):
+                print(f"  Skip: transcript file not found: {transcript_file}")
+                continue
+
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                transcript = f.read()
+
+            trace = metrics.start(transcript_file, practice=entry.get("practice_name", "")) if metrics else None
+            if trace:
+                trace.mark("started")
+            yield (i, entry, transcript, trace), transcript
+
+    progress = Progress(len(manifest))
+    try:
+        for (i, entry, transcript, trace), analysis in analyze_stream(to_analyze(), batch_size, workers=workers):
+            progress.tick(analysis)
+            analysis = analysis or empty_analysis()
+            print(f"  [{i}/{len(manifest)}] Analyzed: {entry.get('practice_name', '?')[:40]} "
+                  f"(Gyni={analysis['has_gyni']}, Price={analysis['price']})")
+            if trace:
+                trace.mark("analysed")
+                if analysis.get("analysis_model"):
+                    trace.labels["model"] = analysis["analysis_model"]
+
+            practice = {
+                "name": entry.get("practice_name", ""),
+                "phone": entry.get("phone", ""),
+                "address": entry.get("address", ""),
+            }
+            result = {
+                "practice": practice,
+                "has_gyni": analysis["has_gyni"],
+                "has_ultrasound": analysis["has_ultrasound"],
+                "price": analysis["price"],
+                "availability": analysis["availability"],
+                "status": "from transcript",
+                "duration_seconds": entry.get("duration_seconds", ""),
+                "transcript": transcript,
+                "recording_url": entry.get("recording_url", ""),
+                "local_recording": entry.get("recording_file", "") or entry.get("local_recording", ""),
+            }
+            row = result_to_row(result)
+            append_row(sink, row)
+            if trace:
+                trace.mark("persisted")
+                metrics.finish(trace)
+    except KeyboardInterrupt:
+        print(f"\nInterrupted. Keeping the {progress.rows} rows written so far -> {excel_path}")
+        return
+    finally:
+        sink.close()
 
+    print(progress.line())
     print(f"Done. {excel_path}")
 
 
@@ -252,18 +348,45 @@ def main():
     gemini_key = os.environ.get("GEMINI_API_KEY", "")
 
     parser = argparse.ArgumentParser(description="Analyze recordings/transcripts and create Excel (gyni_results.xlsx)")
-    parser.add_argument("--call-results", default=DEFAULT_CALL_RESULTS, help="Path to call_results.json")
+    parser.add_argument("--call-results", default=default_results_path(),
+                        help="Path to call_results.jsonl (or a legacy call_results.json)")
     parser.add_argument("--output", "-o", default=DEFAULT_EXCEL, help="Output Excel path")
-    parser.add_argument("--reanalyze", action="store_true", help="Re-run Gemini on all transcripts (from call_results)")
+    parser.add_argument("--reanalyze", action="store_true",
+                        help="Re-run Gemini where the transcript or prompt/model version changed (from call_results)")
+    parser.add_argument("--reanalyze-all", action="store_true", help="Re-run Gemini on every transcript")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Print how many rows would be (re)analysed and the estimated cost, then stop")
     parser.add_argument("--from-recordings", action="store_true", help="Use recordings/ + recordings_manifest.json")
     parser.add_argument("--recordings-dir", default=RECORDINGS_FOLDER, help="Folder for transcript files (with --from-recordings)")
     parser.add_argument("--manifest", default=MANIFEST_FILE, help="Path to manifest JSON (with --from-recordings)")
+    parser.add_argument("--batch", type=int, nargs="?", const=MAX_BATCH_SIZE, default=1, metavar="N",
+                        help=f"Pack up to N transcripts into each Gemini request (default {MAX_BATCH_SIZE} with no N)")
+    parser.add_argument("--workers", type=int, default=1, metavar="N",
+                        help="Gemini requests in flight at once (rows are still written in order)")
+    parser.add_argument("--no-cache", action="store_true", help="Ask Gemini again instead of using llm_cache.db answers")
     args = parser.parse_args()
+    if args.no_cache:
+        get_gemini().use_cache = False
+
+    if args.dry_run:
+        if args.from_recordings:
+            print("--dry-run applies to call results; --from-recordings analyses every transcript")
+            return
+        plan_reanalysis(args.call_results, args.reanalyze, args.reanalyze_all, args.batch)
+        return
 
-    if args.from_recordings:
-        run_from_recordings(args.recordings_dir, args.manifest, args.output, gemini_key)
-    else:
-        run_from_call_results(args.call_results, args.output, args.reanalyze, gemini_key)
+    metrics = analysis_metrics()
+    try:
+        if args.from_recordings:
+            run_from_recordings(args.recordings_dir, args.manifest, args.output, gemini_key, metrics, args.batch,
+                                args.workers)
+        else:
+            run_from_call_results(args.call_results, args.output, args.reanalyze, gemini_key, metrics, args.batch,
+                                  args.workers, args.reanalyze_all)
+    finally:
+        metrics.close()
+        report_analysis()
+        get_gemini().report()
 
 
 if __name__ == "__main__":
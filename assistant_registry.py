@@ -0,0 +1,155 @@
+"""
+Content-addressed cache of VAPI assistants, so campaigns reuse one assistant
+instead of POSTing a new one every run.
+
+Each assistant config is hashed and mapped to its remote id in assistants_cache.json
+(per VAPI base URL). On ensure_assistant():
+  - same hash      -> reuse the cached id, no request at all
+  - config changed -> PATCH only the top-level fields that changed
+  - unknown / 404  -> create it (or PATCH a known id, e.g. VAPI_DEMO_ASSISTANT_ID)
+
+Usage:
+  python assistant_registry.py sync      # push every known config, in parallel
+  python assistant_registry.py list
+"""
+import argparse
+import hashlib
+import importlib.util
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from vapi_client import get_client
+
+CACHE_FILE = "assistants_cache.json"
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_cache_lock = threading.Lock()
+
+
+def config_hash(config: dict) -> str:
+    canonical = json.dumps(config, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def load_cache(path: str = CACHE_FILE) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _store(key: str, base_url: str, assistant_id: str, config: dict, path: str = CACHE_FILE):
+    with _cache_lock:
+        cache = load_cache(path)
+        cache.setdefault(base_url, {})[key] = {
+            "id": assistant_id,
+            "hash": config_hash(config),
+            "config": config,
+        }
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(cache, f, indent=2, ensure_ascii=False)
+        os.replace(tmp, path)
+
+
+def changed_fields(old: dict, new: dict) -> dict:
+    """Top-level fields to PATCH. Removed fields can't be expressed as a partial update, so send everything."""
+    if set(old) - set(new):
+        return dict(new)
+    return {k: v for k, v in new.items() if old.get(k) != v}
+
+
+def ensure_assistant(key: str, config: dict, known_id: str = None, cache_path: str = CACHE_FILE) -> str | None:
+    """Return the remote assistant id for this config, creating or patching only when needed."""
+    client = get_client()
+    base_url = client.base_url
+    entry = load_cache(cache_path).get(base_url, {}).get(key)
+    new_hash = config_hash(config)
+
+    if entry and entry.get("hash") == new_hash:
+        print(f"Reusing assistant {key}: {entry['id']} (config unchanged)")
+        return entry["id"]
+
+    target_id = entry["id"] if entry else known_id
+    if target_id:
+        patch = changed_fields(entry["config"], config) if entry else config
+        try:
+            resp = client.update_assistant(target_id, patch)
+        except requests.RequestException as e:
+            print(f"Error updating assistant {key}: {e}")
+            return None
+        if resp.status_code == 200:
+            _store(key, base_url, target_id, config, cache_path)
+            print(f"Updated assistant {key}: {target_id} ({', '.join(sorted(patch))})")
+            return target_id
+        if resp.status_code != 404:
+            print(f"Error updating assistant {key}: {resp.status_code}")
+            print(resp.text)
+            return None
+        print(f"Assistant {target_id} no longer exists, creating a new one...")
+
+    try:
+        resp = client.create_assistant(config)
+    except requests.RequestException as e:
+        print(f"Error creating assistant {key}: {e}")
+        return None
+    if resp.status_code not in (200, 201):
+        print(f"Error creating assistant {key}: {resp.status_code}")
+        print(resp.text)
+        return None
+    assistant_id = resp.json()["id"]
+    _store(key, base_url, assistant_id, config, cache_path)
+    print(f"Created assistant {key}: {assistant_id}")
+    return assistant_id
+
+
+def _load_script(filename: str):
+    spec = importlib.util.spec_from_file_location(os.path.splitext(filename)[0], os.path.join(SCRIPT_DIR, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def known_assistants() -> list:
+    """(key, config, known_id) for every assistant the scripts in this repo use."""
+    caller = _load_script("2_vapi_caller.py")
+    demo = _load_script("create_demo_agent.py")
+    return [
+        (caller.ASSISTANT_KEY, caller.ASSISTANT_CONFIG, None),
+        (demo.DEMO_ASSISTANT_KEY, demo.DEMO_ASSISTANT, os.getenv("VAPI_DEMO_ASSISTANT_ID")),
+    ]
+
+
+def sync_all(assistants: list = None) -> dict:
+    """Ensure every known assistant in parallel. Returns {key: id or None}."""
+    assistants = assistants or known_assistants()
+    with ThreadPoolExecutor(max_workers=len(assistants) or 1) as pool:
+        futures = {key: pool.submit(ensure_assistant, key, config, known_id) for key, config, known_id in assistants}
+    return {key: fut.result() for key, fut in futures.items()}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Sync VAPI assistants with the local config cache")
+    ap.add_argument("command", choices=["sync", "list"])
+    args = ap.parse_args()
+
+    if args.command == "list":
+        for base_url, entries in load_cache().items():
+            print(base_url)
+            for key, entry in entries.items():
+                print(f"  {key:<24} {entry['id']}  {entry['hash'][:12]}")
+        return
+
+    ids = sync_all()
+    print()
+    for key, assistant_id in ids.items():
+        print(f"  {key:<24} {assistant_id or 'FAILED'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,491 @@
+"""
+Gemini extraction of the campaign fields from a call transcript: is a
+gynaecologist available, is there an ultrasound, the consultation price and
+the earliest appointment.
+
+Shared by 2_vapi_caller.py (as calls end) and analyze_recordings_to_excel.py
+(rebuilds and --reanalyze), so both ask the same question the same way. The
+reply is constrained by ANALYSIS_SCHEMA, so it is always the four keys.
+
+For bulk runs, analyze_stream() packs several transcripts (up to a token
+budget) into one request and gets back a JSON array keyed by id: the long
+instruction block is sent once per batch instead of once per transcript, and
+far fewer requests count against the RPM limit. Items missing or malformed in
+a batch reply fall back to a single request each. workers=N sends requests
+from a thread pool and still yields in input order.
+
+Fields a transcript answers plainly (a single rand amount, "we don't have a
+gynae") are taken from fast_extract.py first; Gemini is asked only for what is
+left, and transcripts answered completely never reach it.
+
+Long transcripts are cut to the turns around the relevant mentions
+(transcript_window.py) before they go into a prompt; window_stats keeps the
+tokens saved. Routing, the fast path and the escalation check still read the
+full transcript.
+
+Model routing: ANALYSIS_MODELS is a list of tiers, cheapest first. Transcripts
+up to ANALYSIS_ROUTE_MAX_TOKENS start on the first, longer ones on the second.
+A reply that fails validation, or says "Unknown" for a field the practice
+evidently talked about (fast_extract.mentions), is asked again one tier up for
+just those fields. Per-tier latency, cost and escalations are kept in
+routing_stats and printed by report().
+
+Usage:
+  from call_analysis import analyze_transcript
+  analyze_transcript(transcript)   # {"has_gyni": "Yes", "has_ultrasound": "Unknown", ...}
+  for item, analysis in analyze_stream(((r, r["transcript"]) for r in results), batch_size=10, workers=4): ...
+"""
+import hashlib
+import json
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from config import ANALYSIS_MODELS, ANALYSIS_ROUTE_MAX_TOKENS, FAST_EXTRACT_ENABLED, TRANSCRIPT_WINDOW_ENABLED
+from fast_extract import FAST_EXTRACT_VERSION, extract, mentions
+from gemini_client import GeminiError, estimate_cost, get_gemini
+from post_call import percentile
+from transcript_window import WINDOW_VERSION, window
+
+ANALYSIS_FIELDS = ("has_gyni", "has_ultrasound", "price", "availability")
+UNKNOWN = "Unknown"
+
+FIELD_LINES = {
+    "has_gyni": '- has_gyni: "Yes", "No", or "Unknown"',
+    "has_ultrasound": '- has_ultrasound: "Yes", "No", or "Unknown"',
+    "price": '- price: The consultation price mentioned (e.g., "R2800") or "Unknown"',
+    "availability": '- availability: The earliest available appointment mentioned (e.g., "Wednesday 2pm", "Next Monday") or "Unknown"',
+}
+
+
+def field_instructions(fields=ANALYSIS_FIELDS) -> str:
+    return "".join(FIELD_LINES[field] + "\n" for field in fields) + """
+Be thorough - look for any mention of prices, fees, costs, availability, appointments, gynecologist/gynaecologist availability.
+"""
+
+
+def analysis_prompt(fields=ANALYSIS_FIELDS) -> str:
+    return """Analyze this phone call transcript and extract the following information.
+Return a JSON object with these exact keys:
+""" + field_instructions(fields) + """
+Transcript:
+"""
+
+
+FIELD_INSTRUCTIONS = field_instructions()
+ANALYSIS_PROMPT = analysis_prompt()
+
+BATCH_PROMPT = """Analyze each phone call transcript below and extract the following information for each call.
+Return a JSON array with one object per transcript, with these exact keys:
+- id: the transcript's id, exactly as given in its header
+""" + FIELD_INSTRUCTIONS + """Judge every transcript on its own; never carry information between calls.
+"""
+
+_YES_NO = {"type": "STRING", "enum": ["Yes", "No", UNKNOWN]}
+_FIELD_SCHEMA = {
+    "has_gyni": _YES_NO,
+    "has_ultrasound": _YES_NO,
+    "price": {"type": "STRING"},
+    "availability": {"type": "STRING"},
+}
+
+
+def analysis_schema(fields=ANALYSIS_FIELDS) -> dict:
+    return {
+        "type": "OBJECT",
+        "properties": {field: _FIELD_SCHEMA[field] for field in fields},
+        "required": list(fields),
+    }
+
+
+ANALYSIS_SCHEMA = analysis_schema()
+BATCH_SCHEMA = {
+    "type": "ARRAY",
+    "items": {
+        "type": "OBJECT",
+        "properties": {"id": {"type": "STRING"}, **_FIELD_SCHEMA},
+        "required": ["id", *ANALYSIS_FIELDS],
+    },
+}
+# Hash of everything besides the model that shapes an answer: prompts, schemas, the local fast path
+# and transcript windowing
+PROMPT_VERSION = hashlib.sha256(json.dumps(
+    [ANALYSIS_PROMPT, BATCH_PROMPT, ANALYSIS_SCHEMA, BATCH_SCHEMA, FAST_EXTRACT_VERSION if FAST_EXTRACT_ENABLED else None,
+     WINDOW_VERSION if TRANSCRIPT_WINDOW_ENABLED else None],
+    sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
+# Batches are sized by estimated input tokens (~4 characters per token)
+CHARS_PER_TOKEN = 4
+BATCH_TOKEN_BUDGET = 16000
+MAX_BATCH_SIZE = 10
+# Rows held back (in order) behind a batch that hasn't been sent yet
+MAX_PENDING = 500
+fast_path_stats = {"transcripts": 0, "fields": 0, "skipped": 0}  # local_fields() this run
+window_stats = {"prompts": 0, "windowed": 0, "full_tokens": 0, "sent_tokens": 0}  # prompt_transcript() this run
+_stats_lock = threading.Lock()
+# analyze_stream(workers=N): requests queued per worker ahead of the oldest unfinished one
+IN_FLIGHT_PER_WORKER = 2
+# Stored with each analysis so --reanalyze only redoes rows whose transcript or prompt/models changed,
+# plus the tier that answered ("local" for the fast path)
+STAMP_FIELDS = ("transcript_hash", "analysis_version", "analysis_model")
+ROUTING_ID = ">".join(ANALYSIS_MODELS) + f"@{ANALYSIS_ROUTE_MAX_TOKENS}"
+LOCAL_MODEL = "local"
+YES_NO_VALUES = ("Yes", "No", UNKNOWN)
+# model -> requests, latencies, escalations (by reason) this run
+routing_stats = {}
+# For cost estimates: a reply is the four short fields as JSON
+OUTPUT_TOKENS_PER_ANALYSIS = 40
+BATCH_HEADER_TOKENS = 10  # "=== Transcript id: N ===" per transcript in a batch
+
+
+def empty_analysis() -> dict:
+    return {field: UNKNOWN for field in ANALYSIS_FIELDS}
+
+
+def transcript_hash(transcript: str) -> str:
+    return hashlib.sha256((transcript or "").encode("utf-8")).hexdigest()[:16]
+
+
+def analysis_version(routing: str = ROUTING_ID) -> str:
+    """'<models>@<route threshold>:<PROMPT_VERSION>' - changes whenever the answers could."""
+    return f"{routing}:{PROMPT_VERSION}"
+
+
+def analysis_stamp(transcript: str, model: str) -> dict:
+    return {"transcript_hash": transcript_hash(transcript), "analysis_version": analysis_version(),
+            "analysis_model": model}
+
+
+def stale_reason(result: dict, routing: str = ROUTING_ID) -> str | None:
+    """
+    Why a stored result needs (re)analysis, or None if it is current: "new"
+    (never analysed), "unstamped" (analysed before stamps existed),
+    "transcript" (changed since) or "version" (prompt, schema or models changed).
+    """
+    if not result.get("has_gyni"):
+        return "new"
+    if not result.get("analysis_version"):
+        return "unstamped"
+    if result.get("transcript_hash") != transcript_hash(result.get("transcript", "")):
+        return "transcript"
+    if result["analysis_version"] != analysis_version(routing):
+        return "version"
+    return None
+
+
+def local_fields(transcript: str) -> dict:
+    """Fields fast_extract.py is sure of (none with FAST_EXTRACT=off), counted in fast_path_stats."""
+    local = extract(transcript) if FAST_EXTRACT_ENABLED and transcript else {}
+    with _stats_lock:
+        fast_path_stats["transcripts"] += 1
+        fast_path_stats["fields"] += len(local)
+        fast_path_stats["skipped"] += len(local) == len(ANALYSIS_FIELDS)
+    return local
+
+
+def prompt_transcript(transcript: str, windowed: bool = None) -> str:
+    """The transcript as it goes into a prompt (windowed unless TRANSCRIPT_WINDOW=off), counted in window_stats."""
+    windowed = TRANSCRIPT_WINDOW_ENABLED if windowed is None else windowed
+    text = window(transcript) if windowed else transcript
+    with _stats_lock:
+        window_stats["prompts"] += 1
+        window_stats["windowed"] += text != transcript
+        window_stats["full_tokens"] += estimate_tokens(transcript)
+        window_stats["sent_tokens"] += estimate_tokens(text)
+    return text
+
+
+def route(transcripts) -> int:
+    """Starting tier: the cheapest for short transcripts, the next one up for long ones."""
+    longest = max((estimate_tokens(t) for t in transcripts), default=0)
+    return 0 if longest <= ANALYSIS_ROUTE_MAX_TOKENS else min(1, len(ANALYSIS_MODELS) - 1)
+
+
+def _record(model: str, seconds: float = None, answers: int = 1, escalation: str = None):
+    with _stats_lock:
+        s = routing_stats.setdefault(model, {"requests": 0, "answers": 0, "latencies": [], "escalated": 0,
+                                             "reasons": {}})
+        if seconds is not None:
+            s["requests"] += 1
+            s["answers"] += answers
+            s["latencies"].append(seconds)
+        if escalation:
+            s["escalated"] += 1
+            s["reasons"][escalation] = s["reasons"].get(escalation, 0) + 1
+
+
+def _timed_json(client, model: str, prompt: str, schema: dict, answers: int = 1):
+    start = time.time()
+    try:
+        return client.generate_json(prompt, schema=schema, model=model)
+    finally:
+        _record(model, time.time() - start, answers)
+
+
+def validation_error(parsed, fields=ANALYSIS_FIELDS) -> str | None:
+    """What is wrong with a reply against the schema, or None."""
+    if not isinstance(parsed, dict):
+        return "not an object"
+    for field in fields:
+        value = parsed.get(field)
+        if not isinstance(value, str) or not value.strip():
+            return f"{field} missing"
+        if field in ("has_gyni", "has_ultrasound") and value not in YES_NO_VALUES:
+            return f"{field}={value!r}"
+    return None
+
+
+def doubtful(answer: dict, transcript: str, hints: set = None) -> list:
+    """Fields answered "Unknown" that the practice evidently talked about."""
+    hints = mentions(transcript) if hints is None else hints
+    return [field for field, value in answer.items() if value == UNKNOWN and field in hints]
+
+
+def analyze_transcript(transcript: str, client=None, local: dict = None, tier: int = None,
+                       windowed: bool = None) -> dict:
+    """
+    The four fields, "Unknown" for anything missing or when Gemini isn't
+    available. Fields the transcript answers plainly come from fast_extract.py
+    (or local, if already worked out); Gemini is asked only for the rest, and
+    not at all when nothing is left. tier overrides the routed starting tier;
+    windowed overrides TRANSCRIPT_WINDOW for the prompt.
+    A complete answer also carries STAMP_FIELDS; one that fell back to
+    "Unknown" on an error doesn't.
+    """
+    result = empty_analysis()
+    if not transcript:
+        return result
+    local = local_fields(transcript) if local is None else local
+    result.update(local)
+    wanted = [field for field in ANALYSIS_FIELDS if field not in local]
+    client = client or get_gemini()
+    if not wanted:
+        return {**result, **analysis_stamp(transcript, LOCAL_MODEL)}
+    if not client.api_key:
+        return result
+
+    tier = route([transcript]) if tier is None else tier
+    text = prompt_transcript(transcript, windowed)
+    hints = None
+    while True:
+        model = ANALYSIS_MODELS[tier]
+        top = tier + 1 >= len(ANALYSIS_MODELS)
+        try:
+            parsed = _timed_json(client, model, analysis_prompt(wanted) + text, analysis_schema(wanted))
+            kind, problem = "invalid", validation_error(parsed, wanted)
+        except GeminiError as e:
+            # A reply that isn't JSON fails validation; anything else is a failed request
+            parsed, kind, problem = None, "invalid" if e.raw is not None else "error", str(e)
+        if problem:
+            if top:
+                print(f"  Gemini {model} {kind}: {problem}")
+                return result
+            _record(model, escalation=kind)
+            tier += 1
+            continue
+        answer = _fields(parsed, wanted)
+        result.update(answer)
+        if hints is None:
+            hints = mentions(transcript)
+        unsure = doubtful(answer, transcript, hints)
+        if not unsure or top:
+            return {**result, **analysis_stamp(transcript, model)}
+        _record(model, escalation="unknown")
+        wanted = unsure
+        tier += 1
+
+
+def report(client=None):
+    """Fast-path and windowing savings, and per-tier requests, latency, cost and escalation rate for this run."""
+    s = dict(fast_path_stats)
+    if FAST_EXTRACT_ENABLED and s["transcripts"]:
+        print(f"Fast path: {s['skipped']} of {s['transcripts']} transcripts needed no Gemini request, "
+              f"{s['fields']} fields answered locally")
+    w = dict(window_stats)
+    if w["windowed"]:
+        print(f"Windowing: {w['windowed']} of {w['prompts']} prompt transcripts cut, {w['full_tokens']} -> "
+              f"{w['sent_tokens']} transcript tokens ({1 - w['sent_tokens'] / w['full_tokens']:.0%} fewer)")
+    with _stats_lock:
+        tiers = {model: {**st, "latencies": list(st["latencies"]), "reasons": dict(st["reasons"])}
+                 for model, st in routing_stats.items()}
+    if not tiers:
+        return
+    usage = (client or get_gemini()).usage()
+    print(f"Model routing ({' > '.join(ANALYSIS_MODELS)}, long over {ANALYSIS_ROUTE_MAX_TOKENS} tokens):")
+    for model in sorted(tiers, key=lambda m: ANALYSIS_MODELS.index(m) if m in ANALYSIS_MODELS else len(ANALYSIS_MODELS)):
+        st = tiers[model]
+        cost = (usage.get(model) or {}).get("estimated_cost")
+        reasons = ", ".join(f"{n} {r}" for r, n in sorted(st["reasons"].items()))
+        rate = st["escalated"] / st["answers"] if st["answers"] else 0
+        print(f"  {model:<24} {st['requests']} requests ({st['answers']} transcripts), p50 {percentile(st['latencies'], 50):.2f}s / "
+              f"p95 {percentile(st['latencies'], 95):.2f}s"
+              f"{f', ~${cost:.4f}' if cost is not None else ''}, escalated {st['escalated']} ({rate:.0%})"
+              f"{f': {reasons}' if reasons else ''}")
+
+
+def _fields(parsed: dict, fields=ANALYSIS_FIELDS) -> dict:
+    return {field: str(parsed.get(field) or UNKNOWN) for field in fields}
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text or "") // CHARS_PER_TOKEN + 1
+
+
+def estimate_run(transcripts, batch_size: int = 1) -> dict:
+    """
+    Rough Gemini requests, tokens and cost for analysing these transcripts on
+    their routed starting tiers (fast-path answers are free; escalations and
+    cached replies aren't known here).
+    """
+    batch_size = max(1, batch_size)
+    local = 0
+    by_model = {}  # model -> [transcripts, transcript tokens]
+    for transcript in transcripts:
+        if FAST_EXTRACT_ENABLED and len(extract(transcript)) == len(ANALYSIS_FIELDS):
+            local += 1
+            continue
+        tally = by_model.setdefault(ANALYSIS_MODELS[route([transcript])], [0, 0])
+        tally[0] += 1
+        tally[1] += estimate_tokens(window(transcript) if TRANSCRIPT_WINDOW_ENABLED else transcript)
+    out = {"transcripts": 0, "local": local, "requests": 0, "prompt_tokens": 0, "output_tokens": 0, "cost": 0.0}
+    for model, (count, tokens) in by_model.items():
+        requests = math.ceil(count / batch_size)
+        if batch_size > 1:
+            tokens += requests * estimate_tokens(BATCH_PROMPT) + count * BATCH_HEADER_TOKENS
+        else:
+            tokens += count * estimate_tokens(ANALYSIS_PROMPT)
+        cost = estimate_cost(model, tokens, count * OUTPUT_TOKENS_PER_ANALYSIS)
+        out["transcripts"] += count
+        out["requests"] += requests
+        out["prompt_tokens"] += tokens
+        out["output_tokens"] += count * OUTPUT_TOKENS_PER_ANALYSIS
+        out["cost"] = None if cost is None or out["cost"] is None else out["cost"] + cost
+    return out
+
+
+def analyze_batch(items: list, client=None) -> dict:
+    """
+    Analyse several transcripts in one request. items is [(id, transcript)];
+    returns {id: analysis}. Anything missing or malformed in the reply (or the
+    whole batch, if the request fails) is retried as a single request.
+    Transcripts fast_extract.py answers completely stay out of the request;
+    for the rest, its fields take precedence over the batch reply. The batch
+    goes to the tier its longest transcript routes to; entries that fail
+    validation or look doubtful are escalated one by one.
+    """
+    client = client or get_gemini()
+    if len(items) == 1 or not client.api_key:
+        return {item_id: analyze_transcript(transcript, client) for item_id, transcript in items}
+
+    local = {str(item_id): local_fields(transcript) for item_id, transcript in items}
+    done = {item_id: {**empty_analysis(), **local[str(item_id)], **analysis_stamp(transcript, LOCAL_MODEL)}
+            for item_id, transcript in items if len(local[str(item_id)]) == len(ANALYSIS_FIELDS)}
+    items = [(item_id, transcript) for item_id, transcript in items if item_id not in done]
+    if len(items) <= 1:
+        return {**done, **{item_id: analyze_transcript(transcript, client, local[str(item_id)])
+                           for item_id, transcript in items}}
+
+    prompt = BATCH_PROMPT + "".join(f"\n=== Transcript id: {item_id} ===\n{prompt_transcript(transcript)}\n"
+                                    for item_id, transcript in items)
+    tier = route(transcript for _, transcript in items)
+    model, top = ANALYSIS_MODELS[tier], tier + 1 >= len(ANALYSIS_MODELS)
+    results = {}
+    try:
+        parsed = _timed_json(client, model, prompt, BATCH_SCHEMA, answers=len(items))
+    except GeminiError as e:
+        print(f"  Gemini batch error ({len(items)} transcripts), retrying one by one: {e}")
+        parsed = []
+    wanted = {str(item_id) for item_id, _ in items}
+    transcripts = {str(item_id): transcript for item_id, transcript in items}
+    for entry in parsed if isinstance(parsed, list) else []:
+        if not isinstance(entry, dict) or str(entry.get("id")) not in wanted or str(entry["id"]) in results:
+            continue
+        item_id = str(entry["id"])
+        transcript, known = transcripts[item_id], local[item_id]
+        if validation_error(entry):
+            if not top:
+                _record(model, escalation="invalid")
+                results[item_id] = analyze_transcript(transcript, client, known, tier + 1)
+            continue  # otherwise retried below as a single request
+        answer = {**_fields(entry), **known}
+        unsure = doubtful({f: v for f, v in answer.items() if f not in known}, transcript)
+        if unsure and not top:
+            _record(model, escalation="unknown")
+            settled = {f: v for f, v in answer.items() if f not in unsure}
+            results[item_id] = analyze_transcript(transcript, client, settled, tier + 1)
+        else:
+            results[item_id] = {**answer, **analysis_stamp(transcript, model)}
+
+    missing = [(item_id, transcript) for item_id, transcript in items if str(item_id) not in results]
+    if missing and len(missing) < len(items):
+        print(f"  {len(missing)} of {len(items)} transcripts missing from the batch reply, retrying one by one")
+    for item_id, transcript in missing:
+        results[str(item_id)] = analyze_transcript(transcript, client, local[str(item_id)])
+    return {**done, **{item_id: results[str(item_id)] for item_id, _ in items}}
+
+
+def _chunks(items, batch_size: int, token_budget: int):
+    """Group (item, transcript) pairs into the lists analyze_stream sends together."""
+    pending, tokens, count = [], 0, 0
+    for item, transcript in items:
+        if not transcript and not count:
+            yield [(item, transcript)]  # nothing waiting on Gemini ahead of it
+            continue
+        if transcript and TRANSCRIPT_WINDOW_ENABLED:
+            cost = estimate_tokens(window(transcript))
+        else:
+            cost = estimate_tokens(transcript) if transcript else 0
+        if count and (len(pending) >= MAX_PENDING
+                      or transcript and (count >= batch_size or tokens + cost > token_budget)):
+            yield pending
+            pending, tokens, count = [], 0, 0
+        pending.append((item, transcript))
+        if transcript:
+            tokens += cost
+            count += 1
+    if pending:
+        yield pending
+
+
+def _analyze_chunk(chunk: list, client) -> list:
+    todo = [(str(i), transcript) for i, (_, transcript) in enumerate(chunk) if transcript]
+    analyses = analyze_batch(todo, client) if todo else {}
+    return [(item, analyses.get(str(i))) for i, (item, _) in enumerate(chunk)]
+
+
+def analyze_stream(items, batch_size: int = 1, token_budget: int = BATCH_TOKEN_BUDGET, client=None,
+                   workers: int = 1):
+    """
+    items: iterable of (item, transcript). Yields (item, analysis) in input
+    order; analysis is None where the transcript is empty (nothing to ask).
+    With batch_size > 1, up to batch_size transcripts within token_budget go
+    into each request (a transcript over the budget goes on its own).
+
+    With workers > 1, requests run on a thread pool (paced by the shared
+    Gemini rate limits) and results are still yielded in input order. At most
+    IN_FLIGHT_PER_WORKER requests per worker are queued ahead of the one being
+    waited on, so items are read lazily. Closing the generator early (or an
+    interrupt) cancels whatever hasn't started.
+    """
+    chunks = _chunks(items, batch_size, token_budget)
+    if workers <= 1:
+        for chunk in chunks:
+            yield from _analyze_chunk(chunk, client)
+        return
+
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="analysis")
+    in_flight = deque()
+    try:
+        for chunk in chunks:
+            in_flight.append(pool.submit(_analyze_chunk, chunk, client))
+            # Hand back everything finished at the head; block only when in_flight is full
+            while in_flight and (in_flight[0].done() or len(in_flight) >= workers * IN_FLIGHT_PER_WORKER):
+                yield from in_flight.popleft().result()
+        while in_flight:
+            yield from in_flight.popleft().result()
+    finally:
+        for future in in_flight:
+            future.cancel()
+        pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,236 @@
+"""
+Per-item stage timing for campaigns and batch jobs.
+
+Each call (or transcript, or recording) gets a Trace; code marks stages on it
+as they happen. When the item is finished the trace goes to a JSONL file (one
+line per item, with the time spent reaching each stage), and a Prometheus
+text-format metrics file is refreshed with per-stage p50/p95, throughput per
+hour and cost per item, ready for node_exporter's textfile collector or just
+reading.
+
+Stage durations are measured from the previous stage that was actually marked,
+so a missing stage (no "ringing" without webhooks, no recording for a
+no-answer) doesn't break the ones after it.
+
+Usage:
+  metrics = StageMetrics(["initiated", "ended", "persisted"], prefix="vapi_campaign",
+                         trace_path="call_trace.jsonl", metrics_path="campaign_metrics.prom")
+  trace = metrics.start(call_key, practice="Blouberg Doctors")
+  trace.mark("initiated"); ...; trace.cost = 0.42
+  metrics.finish(trace)
+  metrics.close()     # final metrics file + printed summary
+
+  python call_metrics.py call_trace.jsonl      # summarise a trace file
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+from post_call import percentile
+
+WRITE_EVERY_SECONDS = 15.0
+QUANTILES = (0.5, 0.95)
+
+
+def iso_to_epoch(value: str) -> float | None:
+    """VAPI ISO timestamps ('2026-01-02T10:00:00.000Z') -> epoch seconds."""
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except (AttributeError, ValueError):
+        return None
+
+
+class Trace:
+    __slots__ = ("key", "labels", "marks", "cost")
+
+    def __init__(self, key: str, labels: dict):
+        self.key = key
+        self.labels = labels
+        self.marks = {}
+        self.cost = None
+
+    def mark(self, stage: str, ts: float = None):
+        """Record when a stage was reached (now by default). The first mark wins."""
+        self.marks.setdefault(stage, time.time() if ts is None else ts)
+
+
+class StageMetrics:
+    def __init__(self, stages: list, prefix: str = "campaign", item: str = "call",
+                 trace_path: str = None, metrics_path: str = None, write_every: float = WRITE_EVERY_SECONDS):
+        self.stages = list(stages)
+        self.prefix = prefix
+        self.item = item
+        self.trace_path = trace_path
+        self.metrics_path = metrics_path
+        self.write_every = write_every
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._durations = {stage: [] for stage in self.stages[1:]}
+        self._totals = []
+        self._costs = []
+        self._finished = 0
+        self._started = time.time()
+        self._last_finish = None
+        self._last_write = 0.0
+        self._trace = open(trace_path, "a", encoding="utf-8") if trace_path else None
+
+    def start(self, key: str, **labels) -> Trace:
+        return Trace(key, labels)
+
+    def durations(self, trace: Trace) -> dict:
+        """{stage: seconds since the previous marked stage}"""
+        out, prev = {}, None
+        for stage in self.stages:
+            ts = trace.marks.get(stage)
+            if ts is None:
+                continue
+            if prev is not None:
+                out[stage] = max(0.0, ts - prev)
+            prev = ts
+        return out
+
+    def finish(self, trace: Trace):
+        durations = self.durations(trace)
+        marked = [trace.marks[s] for s in self.stages if s in trace.marks]
+        total = marked[-1] - marked[0] if len(marked) > 1 else None
+        line = json.dumps({
+            "key": trace.key,
+            **trace.labels,
+            "stages": {s: round(trace.marks[s], 3) for s in self.stages if s in trace.marks},
+            "durations": {s: round(d, 3) for s, d in durations.items()},
+            "total_seconds": round(total, 3) if total is not None else None,
+            "cost": trace.cost,
+        }, ensure_ascii=False, default=str)
+        with self._lock:
+            for stage, seconds in durations.items():
+                self._durations[stage].append(seconds)
+            if total is not None:
+                self._totals.append(total)
+            if isinstance(trace.cost, (int, float)):
+                self._costs.append(trace.cost)
+            self._finished += 1
+            self._last_finish = time.time()
+            if self._trace:
+                self._trace.write(line + "\n")
+                self._trace.flush()
+            due = self.metrics_path and time.time() - self._last_write >= self.write_every
+            if due:
+                self._last_write = time.time()
+        if due:
+            self.write_metrics()
+
+    def summary(self) -> dict:
+        with self._lock:
+            durations = {s: list(v) for s, v in self._durations.items()}
+            totals, costs, finished = list(self._totals), list(self._costs), self._finished
+            elapsed = (self._last_finish or time.time()) - self._started
+        return {
+            "finished": finished,
+            "per_hour": finished / elapsed * 3600 if elapsed > 0 and finished else 0.0,
+            "cost_total": sum(costs),
+            "cost_per_item": sum(costs) / len(costs) if costs else None,
+            "stages": {s: {"p50": percentile(v, 50), "p95": percentile(v, 95), "sum": sum(v), "count": len(v)}
+                       for s, v in durations.items()},
+            "total": {"p50": percentile(totals, 50), "p95": percentile(totals, 95),
+                      "sum": sum(totals), "count": len(totals)},
+        }
+
+    def prometheus_text(self) -> str:
+        s = self.summary()
+        p, item = self.prefix, self.item
+        lines = [
+            f"# HELP {p}_stage_seconds Seconds from the previous stage to this one, per {item}",
+            f"# TYPE {p}_stage_seconds summary",
+        ]
+        for stage, st in list(s["stages"].items()) + [("total", s["total"])]:
+            for q in QUANTILES:
+                value = st["p50"] if q == 0.5 else st["p95"]
+                lines.append(f'{p}_stage_seconds{{stage="{stage}",quantile="{q}"}} {value:.6f}')
+            lines.append(f'{p}_stage_seconds_sum{{stage="{stage}"}} {st["sum"]:.6f}')
+            lines.append(f'{p}_stage_seconds_count{{stage="{stage}"}} {st["count"]}')
+        lines += [
+            f"# HELP {p}_{item}s_total {item.capitalize()}s finished",
+            f"# TYPE {p}_{item}s_total counter",
+            f"{p}_{item}s_total {s['finished']}",
+            f"# HELP {p}_{item}s_per_hour Throughput since the run started",
+            f"# TYPE {p}_{item}s_per_hour gauge",
+            f"{p}_{item}s_per_hour {s['per_hour']:.3f}",
+            f"# HELP {p}_cost_total Summed cost reported for finished {item}s",
+            f"# TYPE {p}_cost_total counter",
+            f"{p}_cost_total {s['cost_total']:.6f}",
+        ]
+        if s["cost_per_item"] is not None:
+            lines += [
+                f"# HELP {p}_cost_per_{item} Mean cost per {item} that reported one",
+                f"# TYPE {p}_cost_per_{item} gauge",
+                f"{p}_cost_per_{item} {s['cost_per_item']:.6f}",
+            ]
+        return "\n".join(lines) + "\n"
+
+    def write_metrics(self):
+        """Atomically replace the metrics file (scrapers never see a partial one)."""
+        if not self.metrics_path:
+            return
+        text = self.prometheus_text()
+        tmp = self.metrics_path + ".tmp"
+        with self._write_lock:
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp, self.metrics_path)
+
+    def report(self):
+        s = self.summary()
+        cost = f", cost/{self.item} {s['cost_per_item']:.3f}" if s["cost_per_item"] is not None else ""
+        print(f"Stage timing ({s['finished']} {self.item}s, {s['per_hour']:.0f}/hr{cost}), p50/p95:")
+        for stage, st in list(s["stages"].items()) + [("total", s["total"])]:
+            if st["count"]:
+                print(f"  {stage:<16} {st['p50']:7.2f}s / {st['p95']:7.2f}s  (n={st['count']})")
+
+    def close(self):
+        self.write_metrics()
+        with self._lock:
+            if self._trace:
+                self._trace.close()
+                self._trace = None
+        self.report()
+
+
+def summarise_trace(path: str):
+    """Rebuild the summary from a trace file (stage order as first seen)."""
+    stages, entries = [], []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            entries.append(entry)
+            for stage in entry.get("stages", {}):
+                if stage not in stages:
+                    stages.append(stage)
+    metrics = StageMetrics(stages)
+    first = min((min(e["stages"].values()) for e in entries if e.get("stages")), default=None)
+    for entry in entries:
+        trace = metrics.start(entry.get("key"))
+        for stage, ts in entry.get("stages", {}).items():
+            trace.mark(stage, ts)
+        trace.cost = entry.get("cost")
+        metrics.finish(trace)
+    if first is not None:
+        metrics._started = first
+        metrics._last_finish = max(max(e["stages"].values()) for e in entries if e.get("stages"))
+    metrics.report()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Summarise a stage trace JSONL file")
+    ap.add_argument("trace", nargs="?", default="call_trace.jsonl")
+    args = ap.parse_args()
+    summarise_trace(args.trace)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,13 +8,46 @@ GOOGLE_PLACES_API_KEY = os.getenv("GOOGLE_PLACES_API_KEY")
 
 # VAPI (Phase 2)
 VAPI_API_KEY = os.getenv("VAPI_API_KEY")
+VAPI_BASE_URL = os.getenv("VAPI_BASE_URL", "https://api.vapi.ai")
 VAPI_PHONE_NUMBER_ID = os.getenv("VAPI_PHONE_NUMBER_ID")
+# Several outbound lines: "id1,id2" or "id1:5:60,id2:3:40" (id:max concurrent:calls per hour).
+# Unset = the single VAPI_PHONE_NUMBER_ID (see line_pool.py)
+VAPI_PHONE_NUMBER_IDS = os.getenv("VAPI_PHONE_NUMBER_IDS", "")
+VAPI_LINE_MAX_CONCURRENT = int(os.getenv("VAPI_LINE_MAX_CONCURRENT", "5"))
+VAPI_LINE_CALLS_PER_HOUR = int(os.getenv("VAPI_LINE_CALLS_PER_HOUR", "60"))
+# Max calls in flight at once - keep at or below the VAPI account concurrency limit
+VAPI_MAX_CONCURRENT_CALLS = int(os.getenv("VAPI_MAX_CONCURRENT_CALLS", "10"))
+# Public URL that forwards to the local webhook receiver (e.g. ngrok). Unset = poll call status
+VAPI_WEBHOOK_URL = os.getenv("VAPI_WEBHOOK_URL")
+VAPI_WEBHOOK_PORT = int(os.getenv("VAPI_WEBHOOK_PORT", "8765"))
+VAPI_WEBHOOK_SECRET = os.getenv("VAPI_WEBHOOK_SECRET", "")
 
 # Google Sheets (Phase 3)
 GOOGLE_SHEETS_ID = os.getenv("GOOGLE_SHEETS_ID")
 
-# Gemini (for transcript analysis)
+# Gemini (transcript analysis, transcription, lead tooling - see gemini_client.py)
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com/v1beta")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+# On-disk Gemini response cache (see llm_cache.py). LLM_CACHE=off bypasses it
+LLM_CACHE_DB = os.getenv("LLM_CACHE_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "llm_cache.db"))
+LLM_CACHE_MAX_MB = float(os.getenv("LLM_CACHE_MAX_MB", "256"))
+LLM_CACHE_TTL_DAYS = float(os.getenv("LLM_CACHE_TTL_DAYS", "0"))  # 0 = entries never expire
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE", "on").lower() not in ("off", "0", "false", "no")
+# Transcript analysis tiers, cheapest first (see call_analysis.py): transcripts up to
+# ANALYSIS_ROUTE_MAX_TOKENS start on the first model, longer ones on the second; a doubtful or
+# invalid answer moves up a tier. One model turns routing off.
+ANALYSIS_MODELS = list(dict.fromkeys(
+    m.strip() for m in os.getenv("ANALYSIS_MODELS", f"gemini-2.0-flash-lite,{GEMINI_MODEL}").split(",") if m.strip()))
+ANALYSIS_ROUTE_MAX_TOKENS = int(os.getenv("ANALYSIS_ROUTE_MAX_TOKENS", "1500"))
+# Answer plain transcripts locally before asking Gemini (see fast_extract.py). FAST_EXTRACT=off disables it
+FAST_EXTRACT_ENABLED = os.getenv("FAST_EXTRACT", "on").lower() not in ("off", "0", "false", "no")
+# Send Gemini only the relevant windows of long transcripts (see transcript_window.py). TRANSCRIPT_WINDOW=off disables it
+TRANSCRIPT_WINDOW_ENABLED = os.getenv("TRANSCRIPT_WINDOW", "on").lower() not in ("off", "0", "false", "no")
+
+# Shared API rate limits (see rate_limit.py). Override per bucket: "gemini-rpm=300/60,places=5/1"
+RATE_LIMIT_DB = os.getenv("RATE_LIMIT_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "rate_limits.db"))
+RATE_LIMITS = os.getenv("RATE_LIMITS", "")
 
 # Hunter.io (leads_gen: find emails)
 HUNTER_API_KEY = os.getenv("HUNTER_API_KEY")
@@ -2,16 +2,18 @@
 Create the Intellidial Website Demo Agent in VAPI.
 This agent explains the business so visitors can talk to it on the website.
 Run once to create the assistant, then use the returned ID in the website embed.
+Re-running only PATCHes fields that changed (see assistant_registry.py).
 """
 import os
-import requests
 from dotenv import load_dotenv
 
+from assistant_registry import ensure_assistant
+
 load_dotenv()
 
 VAPI_API_KEY = os.getenv("VAPI_API_KEY")
-VAPI_BASE = "https://api.vapi.ai"
 
+DEMO_ASSISTANT_KEY = "intellidial-demo"
 DEMO_ASSISTANT = {
     "name": "Intellidial Website Demo",
     "model": {
@@ -72,37 +74,12 @@ def create_demo_assistant():
         return None
 
     existing_id = os.getenv("VAPI_DEMO_ASSISTANT_ID")
-    if existing_id:
-        # Update existing assistant (e.g. after changing prompt / company name)
-        resp = requests.patch(
-            f"{VAPI_BASE}/assistant/{existing_id}",
-            headers={
-                "Authorization": f"Bearer {VAPI_API_KEY}",
-                "Content-Type": "application/json",
-            },
-            json=DEMO_ASSISTANT,
-        )
-        if resp.status_code == 200:
-            print(f"Updated demo assistant: {existing_id}")
-            return existing_id
-        print(f"Update failed ({resp.status_code}), creating new assistant...")
-
-    resp = requests.post(
-        f"{VAPI_BASE}/assistant",
-        headers={
-            "Authorization": f"Bearer {VAPI_API_KEY}",
-            "Content-Type": "application/json",
-        },
-        json=DEMO_ASSISTANT,
-    )
-
-    if resp.status_code not in (200, 201):
-        print(f"ERROR: {resp.status_code} - {resp.text}")
+    assistant_id = ensure_assistant(DEMO_ASSISTANT_KEY, DEMO_ASSISTANT, known_id=existing_id)
+    if not assistant_id:
         return None
+    if assistant_id == existing_id:
+        return assistant_id
 
-    data = resp.json()
-    assistant_id = data.get("id")
-    print(f"Created demo assistant: {assistant_id}")
     print(f"\nAdd to your .env:")
     print(f"VAPI_DEMO_ASSISTANT_ID={assistant_id}")
     print(f"\nFor the website embed, use this ID in the VAPI Web SDK.")
@@ -0,0 +1,247 @@
+"""
+Retry queue and dial ordering for campaigns, persisted in dial_state.db.
+
+Every dial attempt is recorded with its outcome, classified from VAPI's
+endedReason:
+
+  connected   - someone (or the assistant) ended a real conversation; done
+  busy        - retry soon, backing off 15 min, 30 min, 1 h ...
+  no-answer   - retry in 2 h, 4 h, ...
+  voicemail   - retry in 4 h, 8 h, ...
+  ivr         - stuck in a phone menu / silence; retry next day, give up sooner
+  dial-failed / timeout / error - our side or VAPI's; retry after a short pause
+
+Retries are only scheduled inside the practice's business hours (Google Places
+regularOpeningHours when Phase 1 captured them, else Mon-Fri 08:00-17:00 and
+Sat 08:00-12:00 in the practice's UTC offset, SAST by default), and due numbers
+are dialed highest expected connect probability first: the historical connect
+rate for the current local hour, discounted by each number's failed attempts.
+
+Usage:
+  python dial_scheduler.py status
+  python dial_scheduler.py due --limit 20
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timedelta, timezone
+
+from dial_state import get_dial_state
+from phone_numbers import PhoneIndex, phone_key
+
+# outcome -> (first retry delay in seconds, max attempts before giving up)
+RETRY_POLICY = {
+    "busy": (15 * 60, 6),
+    "no-answer": (2 * 3600, 5),
+    "voicemail": (4 * 3600, 4),
+    "ivr": (24 * 3600, 2),
+    "dial-failed": (10 * 60, 5),
+    "timeout": (30 * 60, 4),
+    "error": (30 * 60, 4),
+}
+MAX_BACKOFF_SECONDS = 3 * 24 * 3600
+
+# South African practices; Places' utcOffsetMinutes overrides this per practice
+DEFAULT_UTC_OFFSET_MINUTES = 120
+# (weekday Mon=0, open minute, close minute) in local time
+DEFAULT_HOURS = [(d, 8 * 60, 17 * 60) for d in range(5)] + [(5, 8 * 60, 12 * 60)]
+# Don't start a call this close to closing time
+CLOSING_MARGIN_MINUTES = 10
+
+# Smoothed prior for hours with no history, and the per-failure discount
+PRIOR_CONNECTS, PRIOR_ATTEMPTS = 1, 2
+FAILED_ATTEMPT_FACTOR = 0.7
+# A busy line means someone is there; a menu we couldn't get past rarely changes
+LAST_OUTCOME_FACTOR = {"busy": 1.3, "voicemail": 0.8, "ivr": 0.5}
+
+BUSY_REASONS = ("customer-busy",)
+NO_ANSWER_REASONS = ("customer-did-not-answer", "customer-did-not-give-microphone-permission")
+VOICEMAIL_REASONS = ("voicemail",)
+IVR_REASONS = ("silence-timed-out",)
+IVR_PHRASES = ("press 1", "press one", "press 2", "press two", "for reception press",
+               "please hold", "your call is important", "menu options")
+
+
+def classify_outcome(result: dict) -> str:
+    """Map a handle_call_outcome() result to 'connected' or a RETRY_POLICY outcome."""
+    status = result.get("status")
+    if status == "failed":
+        return "dial-failed"
+    if status == "timeout":
+        return "timeout"
+
+    reason = (result.get("end_reason") or "").lower()
+    transcript = (result.get("transcript") or "").lower()
+    if reason in BUSY_REASONS:
+        return "busy"
+    if reason in NO_ANSWER_REASONS:
+        return "no-answer"
+    if reason in VOICEMAIL_REASONS:
+        return "voicemail"
+    # A menu we never got past looks like silence, or a short call full of "press 1"
+    got_answer = any(result.get(k) not in (None, "", "Unknown") for k in ("has_gyni", "has_ultrasound", "price"))
+    if reason in IVR_REASONS or (not got_answer and any(p in transcript for p in IVR_PHRASES)):
+        return "ivr" if transcript else "no-answer"
+    if "error" in reason or "failed" in reason or reason.startswith("call.start"):
+        return "error"
+    return "connected"
+
+
+# --- Business hours ---
+
+def practice_hours(practice: dict) -> list:
+    """
+    Opening windows as (weekday, open minute, close minute), from Places
+    regularOpeningHours periods (day 0 = Sunday) when available.
+    """
+    periods = practice.get("opening_hours") or []
+    hours = []
+    for period in periods:
+        start, end = period.get("open"), period.get("close")
+        if not start:
+            continue
+        weekday = (start.get("day", 0) - 1) % 7
+        open_min = start.get("hour", 0) * 60 + start.get("minute", 0)
+        if not end:
+            # Open 24 hours
+            return [(d, 0, 24 * 60) for d in range(7)]
+        close_min = end.get("hour", 0) * 60 + end.get("minute", 0)
+        if end.get("day", start.get("day")) != start.get("day"):
+            close_min = 24 * 60  # past midnight: calls after that aren't worth it anyway
+        hours.append((weekday, open_min, close_min))
+    return hours or DEFAULT_HOURS
+
+
+def local_time(practice: dict, ts: float) -> datetime:
+    offset = practice.get("utc_offset_minutes", DEFAULT_UTC_OFFSET_MINUTES)
+    return datetime.fromtimestamp(ts, timezone(timedelta(minutes=offset)))
+
+
+def is_open(practice: dict, ts: float, hours: list = None) -> bool:
+    local = local_time(practice, ts)
+    minute = local.hour * 60 + local.minute
+    for weekday, open_min, close_min in hours or practice_hours(practice):
+        if weekday == local.weekday() and open_min <= minute < close_min - CLOSING_MARGIN_MINUTES:
+            return True
+    return False
+
+
+def next_open(practice: dict, ts: float, hours: list = None) -> float:
+    """The earliest time >= ts when the practice is open (ts itself if open now)."""
+    hours = hours or practice_hours(practice)
+    local = local_time(practice, ts)
+    midnight = local.replace(hour=0, minute=0, second=0, microsecond=0)
+    minute = local.hour * 60 + local.minute
+    for day in range(8):
+        weekday = (local.weekday() + day) % 7
+        for _, open_min, close_min in sorted(h for h in hours if h[0] == weekday):
+            last_start = close_min - CLOSING_MARGIN_MINUTES
+            if day == 0:
+                if minute >= last_start:
+                    continue
+                if minute >= open_min:
+                    return ts
+            return (midnight + timedelta(days=day, minutes=open_min)).timestamp()
+    return ts
+
+
+# --- Scheduler ---
+
+class DialScheduler:
+    def __init__(self, state=None):
+        self.state = state or get_dial_state()
+
+    def backoff(self, outcome: str, attempts: int) -> float:
+        base, _ = RETRY_POLICY[outcome]
+        return min(MAX_BACKOFF_SECONDS, base * 2 ** max(0, attempts - 1))
+
+    def record(self, practice: dict, result: dict, now: float = None) -> str:
+        """Record one attempt and schedule the retry. Returns the outcome."""
+        now = now or time.time()
+        phone = phone_key(practice["phone"])
+        outcome = classify_outcome(result)
+        connected = outcome == "connected"
+        attempts = (self.state.queue_entry(phone) or {}).get("attempts", 0) + 1
+
+        next_at, gave_up = None, False
+        if not connected:
+            _, max_attempts = RETRY_POLICY[outcome]
+            gave_up = attempts >= max_attempts
+            if not gave_up:
+                next_at = next_open(practice, now + self.backoff(outcome, attempts))
+        self.state.record_attempt(
+            phone, outcome, connected, local_time(practice, now).hour, next_at, gave_up, attempted_at=now
+        )
+        if connected:
+            self.state.add_called(phone)
+        return outcome
+
+    def connect_probability(self, practice: dict, entry: dict, rates: dict, now: float) -> float:
+        connected, total = rates.get(local_time(practice, now).hour, (0, 0))
+        p = (connected + PRIOR_CONNECTS) / (total + PRIOR_ATTEMPTS)
+        if not entry:
+            return p
+        return p * FAILED_ATTEMPT_FACTOR ** entry["attempts"] * LAST_OUTCOME_FACTOR.get(entry["last_outcome"], 1.0)
+
+    def plan(self, practices: list, now: float = None, ignore_hours: bool = False) -> dict:
+        """
+        Sort practices into due (best first), waiting (backoff or closed), done
+        (connected or given up) and skipped (duplicate or undialable number).
+        Numbers are matched by E.164, so older raw-format state still counts.
+        """
+        now = now or time.time()
+        called = {phone_key(p) for p in self.state.called_numbers()}
+        queue = {phone_key(p): entry for p, entry in self.state.queue_entries().items()}
+        rates = self.state.connect_rates_by_hour()
+        index = PhoneIndex()
+        due, waiting, done, skipped = [], [], [], []
+        for practice in practices:
+            if not index.add(practice.get("phone"), practice):
+                skipped.append(practice)
+                continue
+            phone = phone_key(practice["phone"])
+            entry = queue.get(phone)
+            if phone in called or (entry and entry["gave_up"]):
+                done.append(practice)
+            elif entry and entry["next_attempt_at"] and entry["next_attempt_at"] > now:
+                waiting.append(practice)
+            elif not ignore_hours and not is_open(practice, now):
+                waiting.append(practice)
+            else:
+                due.append((self.connect_probability(practice, entry, rates, now), practice))
+        due.sort(key=lambda x: x[0], reverse=True)
+        return {"due": [p for _, p in due], "waiting": waiting, "done": done, "skipped": skipped}
+
+    def due(self, practices: list, now: float = None, ignore_hours: bool = False) -> list:
+        return self.plan(practices, now, ignore_hours)["due"]
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Inspect the dial retry queue")
+    ap.add_argument("command", choices=["status", "due"])
+    ap.add_argument("--practices", default="gynecologists.json")
+    ap.add_argument("--limit", type=int, default=20)
+    ap.add_argument("--ignore-hours", action="store_true")
+    args = ap.parse_args()
+
+    with open(args.practices, "r", encoding="utf-8") as f:
+        practices = json.load(f)
+    scheduler = DialScheduler()
+    plan = scheduler.plan(practices, ignore_hours=args.ignore_hours)
+    print(f"Due now: {len(plan['due'])} | waiting: {len(plan['waiting'])} | done: {len(plan['done'])}"
+          f" | skipped (duplicate / undialable): {len(plan['skipped'])}")
+
+    if args.command == "status":
+        counts = {}
+        for entry in scheduler.state.queue_entries().values():
+            key = "gave up" if entry["gave_up"] else entry["last_outcome"]
+            counts[key] = counts.get(key, 0) + 1
+        for key, n in sorted(counts.items()):
+            print(f"  {key}: {n}")
+    else:
+        for practice in plan["due"][:args.limit]:
+            print(f"  {practice['phone']}  {practice['name']}")
+
+
+if __name__ == "__main__":
+    main()
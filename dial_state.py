@@ -0,0 +1,200 @@
+"""
+Dialing state in SQLite (WAL mode) instead of rewriting called_numbers.json after
+every call: the called numbers, plus the retry queue and attempt history used by
+dial_scheduler.py.
+
+- O(1) indexed membership checks and inserts (phone is the primary key)
+- each insert is its own small transaction, so a crash can't corrupt earlier rows
+- WAL + busy timeout: several dialer threads / processes can share one file
+- the legacy called_numbers.json is imported automatically on first open
+
+Usage:
+  python dial_state.py count
+  python dial_state.py import called_numbers.json
+  python dial_state.py export called_numbers.json
+"""
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DIAL_STATE_DB = "dial_state.db"
+LEGACY_CALLED_NUMBERS_FILE = "called_numbers.json"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS called_numbers (
+    phone     TEXT PRIMARY KEY,
+    called_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS dial_queue (
+    phone           TEXT PRIMARY KEY,
+    attempts        INTEGER NOT NULL DEFAULT 0,
+    last_outcome    TEXT,
+    last_attempt_at REAL,
+    next_attempt_at REAL,
+    gave_up         INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS dial_attempts (
+    phone        TEXT NOT NULL,
+    attempted_at REAL NOT NULL,
+    local_hour   INTEGER,
+    outcome      TEXT NOT NULL,
+    connected    INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS dial_attempts_hour ON dial_attempts (local_hour);
+"""
+
+
+class DialState:
+    """One connection per thread on a shared WAL database."""
+
+    def __init__(self, path: str = DIAL_STATE_DB, legacy_json: str = LEGACY_CALLED_NUMBERS_FILE):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        if legacy_json and os.path.exists(legacy_json) and not self._meta("imported_legacy_json"):
+            n = self.import_json(legacy_json)
+            self._set_meta("imported_legacy_json", legacy_json)
+            if n:
+                print(f"Imported {n} numbers from {legacy_json} into {path}")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _meta(self, key: str) -> str | None:
+        row = self._conn().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value: str):
+        self._conn().execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    # --- Called numbers ---
+
+    def add_called(self, phone: str):
+        self._conn().execute(
+            "INSERT OR IGNORE INTO called_numbers (phone, called_at) VALUES (?, ?)",
+            (phone, time.time()),
+        )
+
+    def is_called(self, phone: str) -> bool:
+        return self._conn().execute(
+            "SELECT 1 FROM called_numbers WHERE phone = ?", (phone,)
+        ).fetchone() is not None
+
+    def called_numbers(self) -> set:
+        return {row[0] for row in self._conn().execute("SELECT phone FROM called_numbers")}
+
+    def count_called(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM called_numbers").fetchone()[0]
+
+    # --- Retry queue / attempt history ---
+
+    def record_attempt(self, phone: str, outcome: str, connected: bool, local_hour: int,
+                       next_attempt_at: float | None, gave_up: bool, attempted_at: float = None):
+        """Log one dial attempt and update the number's retry state in a single transaction."""
+        attempted_at = attempted_at or time.time()
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT INTO dial_attempts (phone, attempted_at, local_hour, outcome, connected) VALUES (?, ?, ?, ?, ?)",
+                (phone, attempted_at, local_hour, outcome, int(connected)),
+            )
+            conn.execute(
+                """INSERT INTO dial_queue (phone, attempts, last_outcome, last_attempt_at, next_attempt_at, gave_up)
+                   VALUES (?, 1, ?, ?, ?, ?)
+                   ON CONFLICT(phone) DO UPDATE SET
+                       attempts = attempts + 1,
+                       last_outcome = excluded.last_outcome,
+                       last_attempt_at = excluded.last_attempt_at,
+                       next_attempt_at = excluded.next_attempt_at,
+                       gave_up = excluded.gave_up""",
+                (phone, outcome, attempted_at, next_attempt_at, int(gave_up)),
+            )
+
+    def queue_entry(self, phone: str) -> dict | None:
+        return self.queue_entries(phone).get(phone)
+
+    def queue_entries(self, phone: str = None) -> dict:
+        """{phone: {attempts, last_outcome, last_attempt_at, next_attempt_at, gave_up}}"""
+        sql = "SELECT phone, attempts, last_outcome, last_attempt_at, next_attempt_at, gave_up FROM dial_queue"
+        rows = self._conn().execute(sql + " WHERE phone = ?", (phone,)) if phone else self._conn().execute(sql)
+        return {
+            r[0]: {"attempts": r[1], "last_outcome": r[2], "last_attempt_at": r[3],
+                   "next_attempt_at": r[4], "gave_up": bool(r[5])}
+            for r in rows
+        }
+
+    def connect_rates_by_hour(self) -> dict:
+        """{local_hour: (connected, attempts)} across all history."""
+        rows = self._conn().execute(
+            "SELECT local_hour, SUM(connected), COUNT(*) FROM dial_attempts GROUP BY local_hour"
+        )
+        return {r[0]: (r[1], r[2]) for r in rows}
+
+    def import_json(self, path: str) -> int:
+        """Merge a called_numbers.json list. Returns how many numbers were new."""
+        with open(path, "r", encoding="utf-8") as f:
+            phones = json.load(f)
+        conn = self._conn()
+        before = self.count_called()
+        now = time.time()
+        with conn:
+            conn.execute("BEGIN")
+            conn.executemany(
+                "INSERT OR IGNORE INTO called_numbers (phone, called_at) VALUES (?, ?)",
+                [(p, now) for p in phones],
+            )
+        return self.count_called() - before
+
+    def export_json(self, path: str) -> int:
+        phones = sorted(self.called_numbers())
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(phones, f)
+        return len(phones)
+
+
+_state = None
+_state_lock = threading.Lock()
+
+
+def get_dial_state() -> DialState:
+    """The process-wide store (created on first use)."""
+    global _state
+    with _state_lock:
+        if _state is None:
+            _state = DialState()
+        return _state
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Inspect / migrate the dialing state database")
+    ap.add_argument("command", choices=["count", "import", "export"])
+    ap.add_argument("file", nargs="?", default=LEGACY_CALLED_NUMBERS_FILE)
+    ap.add_argument("--db", default=DIAL_STATE_DB)
+    args = ap.parse_args()
+
+    state = DialState(args.db, legacy_json=None)
+    if args.command == "count":
+        print(f"{state.count_called()} called numbers in {args.db}")
+    elif args.command == "import":
+        print(f"Imported {state.import_json(args.file)} new numbers from {args.file}")
+    else:
+        print(f"Exported {state.export_json(args.file)} numbers to {args.file}")
+
+
+if __name__ == "__main__":
+    main()
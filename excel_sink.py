@@ -0,0 +1,146 @@
+"""
+Buffered, crash-safe Excel output for live campaigns.
+
+Rows are journaled to a JSONL file next to the workbook (gyni_results.rows.jsonl)
+the moment they arrive - a cheap append. A background thread rebuilds the .xlsx
+from the journal every FLUSH_ROWS rows or FLUSH_SECONDS seconds and on close,
+using openpyxl write-only mode (streams rows, constant memory) and an atomic
+rename, so the dialing loop never waits on spreadsheet serialisation and a crash
+mid-save can't leave a half-written workbook.
+
+An existing workbook without a journal is read once (read-only mode) to seed it.
+If the workbook is open in Excel, saving is retried on the next flush; the rows
+are safe in the journal meanwhile.
+"""
+import json
+import os
+import threading
+import time
+
+from openpyxl import Workbook, load_workbook
+
+FLUSH_ROWS = 25
+FLUSH_SECONDS = 30
+
+
+def journal_path_for(path: str) -> str:
+    return os.path.splitext(path)[0] + ".rows.jsonl"
+
+
+class ExcelSink:
+    def __init__(self, path: str, headers: list, sheet_title: str = "Call Results",
+                 flush_rows: int = FLUSH_ROWS, flush_seconds: float = FLUSH_SECONDS, reset: bool = False):
+        self.path = path
+        self.headers = list(headers)
+        self.sheet_title = sheet_title
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self.journal_path = journal_path_for(path)
+
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._pending = 0
+        self.saves = 0
+
+        if reset and os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        existed = os.path.exists(path)
+        if existed and not reset and not os.path.exists(self.journal_path):
+            self._seed_from_workbook()
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+
+        if reset or not existed:
+            self.save()
+        self._thread = threading.Thread(target=self._run, name="excel-sink", daemon=True)
+        self._thread.start()
+
+    def _seed_from_workbook(self):
+        wb = load_workbook(self.path, read_only=True)
+        ws = wb.active
+        n = 0
+        with open(self.journal_path, "w", encoding="utf-8") as f:
+            for i, row in enumerate(ws.iter_rows(values_only=True)):
+                if i == 0 and list(row[:len(self.headers)]) == self.headers:
+                    continue
+                f.write(json.dumps(list(row), ensure_ascii=False, default=str) + "\n")
+                n += 1
+        wb.close()
+        print(f"Journaled {n} existing rows from {self.path} -> {self.journal_path}")
+
+    def append(self, row: list):
+        line = json.dumps(list(row), ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            self._journal.write(line)
+            self._journal.flush()
+            self._pending += 1
+            due = self._pending >= self.flush_rows
+        if due:
+            self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            if self._pending and not self._stop.is_set():
+                self.save()
+
+    def save(self) -> bool:
+        """Rebuild the workbook from the journal. Returns False if the file couldn't be replaced."""
+        with self._save_lock:
+            with self._lock:
+                if not self._journal_closed():
+                    self._journal.flush()
+                    os.fsync(self._journal.fileno())
+                size = os.path.getsize(self.journal_path) if os.path.exists(self.journal_path) else 0
+                pending, self._pending = self._pending, 0
+
+            wb = Workbook(write_only=True)
+            ws = wb.create_sheet(self.sheet_title)
+            ws.append(self.headers)
+            if size:
+                with open(self.journal_path, "rb") as f:
+                    read = 0
+                    for raw in f:
+                        read += len(raw)
+                        if read > size:
+                            break
+                        try:
+                            ws.append(json.loads(raw))
+                        except json.JSONDecodeError:
+                            continue
+
+            tmp = self.path + ".tmp"
+            try:
+                wb.save(tmp)
+                os.replace(tmp, self.path)
+            except OSError as e:
+                print(f"  ✗ Excel save deferred ({e}) - is {self.path} open? Rows are kept in {self.journal_path}")
+                with self._lock:
+                    self._pending += pending
+                return False
+            self.saves += 1
+            return True
+
+    def _journal_closed(self) -> bool:
+        return getattr(self, "_journal", None) is None or self._journal.closed
+
+    def close(self):
+        """Stop the background thread and write the final workbook."""
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout=10)
+        if self._pending:
+            for _ in range(3):
+                if self.save():
+                    break
+                time.sleep(2)
+        with self._lock:
+            self._journal.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
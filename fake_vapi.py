@@ -0,0 +1,608 @@
+"""
+Offline stand-in for the VAPI API, for load-testing the dialer without spending
+call minutes.
+
+The fake server implements what 2_vapi_caller.py uses:
+  POST/PATCH/GET /assistant[/{id}]   POST /call/phone   GET /call/{id}   GET /call
+  GET/HEAD /recordings/{id}.mp3      (Range supported, like the real storage)
+and sends status-update / end-of-call-report webhooks to the server URL set in
+assistantOverrides, just like VAPI.
+
+Each call draws ring time, endedReason, duration, transcript and cost from a
+profile - built-in defaults, or one seeded from our real results:
+  python fake_vapi.py profile --results call_results.jsonl --out sim_profile.json
+Time is compressed by --speed (60 = a one-minute call ends after one second).
+
+The bench driver runs 2_vapi_caller.py against a fresh fake server for each
+concurrency setting and reports calls/hour, server-side stage latencies
+(dial request, end -> report delivered, end -> recording fetched) and CPU /
+memory per in-flight call of the dialer process:
+  python fake_vapi.py bench --calls 300 --concurrency 5,20,50 --speed 60
+  python fake_vapi.py serve --port 8900 --speed 30     # then VAPI_BASE_URL=http://127.0.0.1:8900
+"""
+import argparse
+import heapq
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+from post_call import percentile
+from results_log import default_results_path, iter_results
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+CALLER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "2_vapi_caller.py")
+
+DEFAULT_PROFILE = {
+    "ended_reasons": {
+        "customer-ended-call": 0.45,
+        "assistant-ended-call": 0.15,
+        "customer-did-not-answer": 0.15,
+        "voicemail": 0.10,
+        "customer-busy": 0.08,
+        "silence-timed-out": 0.05,
+        "twilio-failed-to-connect-call": 0.02,
+    },
+    # seconds: {"uniform": [lo, hi]} or a list of observed values to sample from
+    "durations": {
+        "customer-ended-call": {"uniform": [30, 150]},
+        "assistant-ended-call": {"uniform": [40, 170]},
+        "customer-did-not-answer": {"uniform": [0, 0]},
+        "voicemail": {"uniform": [15, 40]},
+        "customer-busy": {"uniform": [0, 0]},
+        "silence-timed-out": {"uniform": [30, 60]},
+        "twilio-failed-to-connect-call": {"uniform": [0, 0]},
+    },
+    "ring_seconds": {"uniform": [3, 20]},
+    "no_answer_ring_seconds": {"uniform": [25, 40]},
+    "transcripts": {
+        "customer-ended-call": [
+            "AI: Hi, I'm calling to ask whether you have a gynaecologist available.\n"
+            "User: Yes, Dr Smith. A consultation is R1,200 and includes an ultrasound.\n"
+            "AI: When is the earliest appointment?\nUser: Next Tuesday at 10.\nAI: Thank you, bye.",
+            "AI: Hi, do you have a gynaecologist at the practice?\nUser: No, sorry, we're a GP practice.\n"
+            "AI: Thanks, goodbye.",
+        ],
+        "assistant-ended-call": [
+            "AI: Hello, is there a gynaecologist available?\nUser: Yes. It's R950 for a consult.\n"
+            "AI: Do you do ultrasounds?\nUser: Yes we do.\nAI: Great, thank you.",
+        ],
+        "voicemail": ["AI: Hi, I'm calling on behalf of a patient..."],
+        "silence-timed-out": ["User: Welcome. For reception press 1, for accounts press 2."],
+    },
+    "cost_per_minute": 0.12,
+    "create_latency_ms": {"uniform": [40, 250]},
+    "create_error_rate": 0.0,
+}
+
+NOT_ANSWERED = ("customer-did-not-answer", "customer-busy", "twilio-failed-to-connect-call")
+
+
+def _iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def _draw(rng: random.Random, spec, default: float = 0.0) -> float:
+    if not spec:
+        return default
+    if isinstance(spec, dict):
+        lo, hi = spec.get("uniform", [default, default])
+        return rng.uniform(lo, hi)
+    return float(rng.choice(spec))
+
+
+def profile_from_results(path: str, max_transcripts: int = 50) -> dict:
+    """Build a profile from real call results (JSONL or legacy JSON)."""
+    reasons, durations, transcripts = {}, {}, {}
+    cost, minutes = 0.0, 0.0
+    for result in iter_results(path):
+        reason = result.get("end_reason")
+        if not reason:
+            continue
+        reasons[reason] = reasons.get(reason, 0) + 1
+        duration = result.get("duration_seconds")
+        if isinstance(duration, (int, float)):
+            durations.setdefault(reason, []).append(round(duration, 1))
+            if isinstance(result.get("cost"), (int, float)) and duration > 0:
+                cost += result["cost"]
+                minutes += duration / 60
+        if result.get("transcript") and len(transcripts.get(reason, [])) < max_transcripts:
+            transcripts.setdefault(reason, []).append(result["transcript"])
+    total = sum(reasons.values())
+    if not total:
+        raise ValueError(f"no ended calls in {path}")
+    profile = json.loads(json.dumps(DEFAULT_PROFILE))
+    profile["ended_reasons"] = {r: n / total for r, n in reasons.items()}
+    profile["durations"] = {r: durations.get(r) or DEFAULT_PROFILE["durations"].get(r) or {"uniform": [0, 0]}
+                            for r in reasons}
+    profile["transcripts"] = transcripts
+    if minutes:
+        profile["cost_per_minute"] = cost / minutes
+    return profile
+
+
+class FakeVapi:
+    """Call state is computed from timestamps; a single timer thread sends the webhooks."""
+
+    def __init__(self, profile: dict = None, speed: float = 1.0, seed: int = None,
+                 recording_bytes_per_second: int = 2000):
+        self.profile = profile or DEFAULT_PROFILE
+        self.speed = max(speed, 1e-6)
+        self.rng = random.Random(seed)
+        self.bytes_per_second = recording_bytes_per_second
+        self.public_host = "127.0.0.1"  # host:port for absolute recording URLs, set on start
+        self.calls = {}
+        self.assistants = {}
+        self._lock = threading.Lock()
+        self._events = []
+        self._wake = threading.Condition(self._lock)
+        self._stop = False
+        self._senders = ThreadPoolExecutor(max_workers=16, thread_name_prefix="fake-vapi-webhook")
+        self._session = requests.Session()
+        # real-seconds latencies seen from the server side
+        self.stages = {"dial_request": [], "report_delivered": [], "recording_fetched": []}
+        self._reasons = list(self.profile["ended_reasons"])
+        self._weights = [self.profile["ended_reasons"][r] for r in self._reasons]
+        threading.Thread(target=self._run_events, name="fake-vapi-events", daemon=True).start()
+
+    # --- Calls ---
+
+    def create_call(self, payload: dict) -> tuple:
+        """(status code, body) for POST /call/phone."""
+        started = time.time()
+        with self._lock:
+            latency = _draw(self.rng, self.profile.get("create_latency_ms"), 0) / 1000.0
+            failed = self.rng.random() < self.profile.get("create_error_rate", 0)
+        time.sleep(latency)
+        if failed:
+            return 500, {"message": "simulated create failure"}
+        with self._lock:
+            rng = self.rng
+            reason = rng.choices(self._reasons, self._weights)[0]
+            not_answered = reason in NOT_ANSWERED
+            ring = _draw(rng, self.profile.get("no_answer_ring_seconds" if not_answered else "ring_seconds"), 5)
+            if reason in ("customer-busy", "twilio-failed-to-connect-call"):
+                ring = rng.uniform(0.5, 3)
+            talk = 0.0 if not_answered else max(1.0, _draw(rng, self.profile["durations"].get(reason), 60))
+            transcripts = self.profile.get("transcripts", {}).get(reason) or [""]
+            now = time.time()
+            call_id = str(uuid.uuid4())
+            record = {
+                "payload": payload,
+                "created": now,
+                "ring_at": now + 1.0 / self.speed,
+                "answer_at": None if not_answered else now + (1 + ring) / self.speed,
+                "end_at": now + (1 + ring + talk) / self.speed,
+                "reason": reason,
+                "duration": round(talk, 1),
+                "transcript": rng.choice(transcripts) if talk else "",
+                "cost": round((ring + talk) / 60 * self.profile.get("cost_per_minute", 0.1), 4),
+                "fetched": False,
+            }
+            self.calls[call_id] = record
+            server = ((payload.get("assistantOverrides") or {}).get("server") or {})
+            if server.get("url"):
+                for at, kind in ((record["ring_at"], "ringing"), (record["answer_at"], "in-progress"),
+                                 (record["end_at"], "ended"), (record["end_at"], "report")):
+                    if at:
+                        heapq.heappush(self._events, (at, call_id, kind, server.get("url"), server.get("secret")))
+                self._wake.notify()
+        self.stages["dial_request"].append(time.time() - started)
+        return 201, self.view(call_id)
+
+    def view(self, call_id: str, now: float = None) -> dict | None:
+        now = now or time.time()
+        record = self.calls.get(call_id)
+        if not record:
+            return None
+        payload = record["payload"]
+        call = {
+            "id": call_id,
+            "type": "outboundPhoneCall",
+            "assistantId": payload.get("assistantId"),
+            "phoneNumberId": payload.get("phoneNumberId"),
+            "customer": payload.get("customer"),
+            "metadata": payload.get("metadata"),
+            "createdAt": _iso(record["created"]),
+            "status": "queued",
+        }
+        if now >= record["ring_at"]:
+            call["status"] = "ringing"
+        if record["answer_at"] and now >= record["answer_at"]:
+            call["status"] = "in-progress"
+            call["startedAt"] = _iso(record["answer_at"])
+        if now >= record["end_at"]:
+            call.update({
+                "status": "ended",
+                "endedAt": _iso(record["end_at"]),
+                "endedReason": record["reason"],
+                "duration": record["duration"],
+                "transcript": record["transcript"],
+                "cost": record["cost"],
+                "recordingUrl": f"/recordings/{call_id}.mp3" if record["duration"] else "",
+            })
+        return call
+
+    def list_calls(self, created_gt: str = "", limit: int = 100) -> list:
+        now = time.time()
+        with self._lock:
+            ids = [cid for cid, r in self.calls.items() if not created_gt or _iso(r["created"]) > created_gt]
+        ids.sort(key=lambda cid: self.calls[cid]["created"], reverse=True)
+        return [self.view(cid, now) for cid in ids[:limit]]
+
+    def in_flight(self) -> int:
+        now = time.time()
+        with self._lock:
+            return sum(1 for r in self.calls.values() if r["end_at"] > now)
+
+    def recording(self, call_id: str) -> bytes | None:
+        record = self.calls.get(call_id)
+        if not record or not record["duration"] or time.time() < record["end_at"]:
+            return None
+        size = int(record["duration"] * self.bytes_per_second)
+        block = (call_id.encode() * (size // len(call_id) + 1))[:size]
+        return block
+
+    def recording_fetched(self, call_id: str):
+        record = self.calls.get(call_id)
+        if record and not record["fetched"]:
+            record["fetched"] = True
+            self.stages["recording_fetched"].append(time.time() - record["end_at"])
+
+    # --- Webhooks ---
+
+    def _message(self, call_id: str, kind: str) -> dict:
+        call = self.view(call_id, now=float("inf"))
+        base = {k: call[k] for k in ("id", "type", "phoneNumberId", "customer", "metadata", "createdAt")}
+        if kind == "report":
+            return {"message": {
+                "type": "end-of-call-report",
+                "endedReason": call["endedReason"],
+                "call": base,
+                "artifact": {"transcript": call["transcript"], "recordingUrl": call.get("recordingUrl", "")},
+                "transcript": call["transcript"],
+                "recordingUrl": call.get("recordingUrl", ""),
+                "cost": call["cost"],
+                "durationSeconds": call["duration"],
+                "startedAt": call.get("startedAt"),
+                "endedAt": call["endedAt"],
+            }}
+        message = {"type": "status-update", "status": kind, "call": base}
+        if kind == "ended":
+            message["endedReason"] = call["endedReason"]
+        return {"message": message}
+
+    def _send(self, call_id: str, kind: str, url: str, secret: str):
+        headers = {"x-vapi-secret": secret} if secret else {}
+        body = self._message(call_id, kind)
+        if kind == "report" and body["message"]["recordingUrl"]:
+            # Absolute URL on this server, like VAPI's storage links
+            base = url.split("://", 1)[0] + "://" + self.public_host
+            for holder in (body["message"], body["message"]["artifact"]):
+                holder["recordingUrl"] = base + holder["recordingUrl"]
+        try:
+            self._session.post(url, json=body, headers=headers, timeout=10)
+        except requests.RequestException:
+            return
+        if kind == "report":
+            self.stages["report_delivered"].append(time.time() - self.calls[call_id]["end_at"])
+
+    def _run_events(self):
+        with self._lock:
+            while not self._stop:
+                if not self._events:
+                    self._wake.wait(1.0)
+                    continue
+                at, call_id, kind, url, secret = self._events[0]
+                delay = at - time.time()
+                if delay > 0:
+                    self._wake.wait(delay)
+                    continue
+                heapq.heappop(self._events)
+                self._senders.submit(self._send, call_id, kind, url, secret)
+
+    def close(self):
+        with self._lock:
+            self._stop = True
+            self._wake.notify()
+        self._senders.shutdown(wait=False)
+
+
+def make_handler(fake: FakeVapi):
+    class FakeVapiHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _json(self, status: int, body):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _body(self) -> dict:
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                return json.loads(self.rfile.read(length) or b"{}")
+            except json.JSONDecodeError:
+                return {}
+
+        def do_POST(self):
+            path = urlparse(self.path).path.rstrip("/")
+            body = self._body()
+            if path == "/assistant":
+                assistant_id = str(uuid.uuid4())
+                fake.assistants[assistant_id] = dict(body, id=assistant_id)
+                return self._json(201, fake.assistants[assistant_id])
+            if path == "/call/phone":
+                status, call = fake.create_call(body)
+                return self._json(status, call)
+            self._json(404, {"message": "not found"})
+
+        def do_PATCH(self):
+            path = urlparse(self.path).path.rstrip("/")
+            body = self._body()
+            assistant_id = path.rsplit("/", 1)[-1]
+            if path.startswith("/assistant/") and assistant_id in fake.assistants:
+                fake.assistants[assistant_id].update(body)
+                return self._json(200, fake.assistants[assistant_id])
+            self._json(404, {"message": "not found"})
+
+        def do_GET(self):
+            self._get(send_body=True)
+
+        def do_HEAD(self):
+            self._get(send_body=False)
+
+        def _get(self, send_body: bool):
+            url = urlparse(self.path)
+            path = url.path.rstrip("/")
+            if path.startswith("/recordings/"):
+                return self._recording(path.rsplit("/", 1)[-1].replace(".mp3", ""), send_body)
+            if path == "/call":
+                query = parse_qs(url.query)
+                calls = fake.list_calls(query.get("createdAtGt", [""])[0], int(query.get("limit", ["100"])[0]))
+                return self._json(200, calls)
+            if path.startswith("/call/"):
+                call = fake.view(path.rsplit("/", 1)[-1])
+                return self._json(200, call) if call else self._json(404, {"message": "not found"})
+            if path.startswith("/assistant/"):
+                assistant = fake.assistants.get(path.rsplit("/", 1)[-1])
+                return self._json(200, assistant) if assistant else self._json(404, {"message": "not found"})
+            self._json(404, {"message": "not found"})
+
+        def _recording(self, call_id: str, send_body: bool):
+            data = fake.recording(call_id)
+            if data is None:
+                return self._json(404, {"message": "no recording"})
+            start, status = 0, 200
+            match = (self.headers.get("Range") or "").replace("bytes=", "").split("-")[0]
+            if match.isdigit() and int(match) < len(data):
+                start, status = int(match), 206
+            chunk = data[start:]
+            self.send_response(status)
+            self.send_header("Content-Type", "audio/mpeg")
+            self.send_header("Content-Length", str(len(chunk)))
+            if status == 206:
+                self.send_header("Content-Range", f"bytes {start}-{len(data) - 1}/{len(data)}")
+            self.end_headers()
+            if send_body:
+                self.wfile.write(chunk)
+                fake.recording_fetched(call_id)
+
+        def log_message(self, format, *args):
+            pass
+
+    return FakeVapiHandler
+
+
+def start_fake_vapi(fake: FakeVapi, port: int = 0, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), make_handler(fake))
+    server.daemon_threads = True
+    fake.public_host = f"{host}:{server.server_port}"
+    threading.Thread(target=server.serve_forever, name="fake-vapi", daemon=True).start()
+    return server
+
+
+# --- Bench driver ---
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _rss_bytes(pid: int) -> int | None:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+def _children_cpu() -> float | None:
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def synthetic_practices(n: int) -> list:
+    return [{"name": f"Sim Practice {i}", "phone": f"021 {500 + i // 10000:03d} {i % 10000:04d}"}
+            for i in range(n)]
+
+
+def run_bench(calls: int, concurrency: int, speed: float, profile: dict, seed: int = None,
+              keep_dir: bool = False) -> dict:
+    """Run 2_vapi_caller.py once against a fresh fake server; returns the metrics."""
+    fake = FakeVapi(profile, speed, seed)
+    server = start_fake_vapi(fake)
+    workdir = tempfile.mkdtemp(prefix="vapi-sim-")
+    with open(os.path.join(workdir, "gynecologists.json"), "w", encoding="utf-8") as f:
+        json.dump(synthetic_practices(calls), f)
+    webhook_port = _free_port()
+    lines = max(1, -(-concurrency // 10))
+    env = dict(
+        os.environ,
+        VAPI_BASE_URL=f"http://127.0.0.1:{server.server_port}",
+        VAPI_API_KEY="sim-key",
+        VAPI_PHONE_NUMBER_ID="sim-line-0",
+        VAPI_PHONE_NUMBER_IDS=",".join(f"sim-line-{i}:10:100000" for i in range(lines)),
+        VAPI_MAX_CONCURRENT_CALLS=str(concurrency),
+        VAPI_WEBHOOK_URL=f"http://127.0.0.1:{webhook_port}/",
+        VAPI_WEBHOOK_PORT=str(webhook_port),
+        VAPI_WEBHOOK_SECRET="",
+        GEMINI_API_KEY="",
+        # The simulator has no quotas; keep the real buckets' state out of the benchmark
+        RATE_LIMIT_DB=os.path.join(workdir, "rate_limits.db"),
+        RATE_LIMITS="vapi=100000/1",
+        PYTHONIOENCODING="utf-8",
+    )
+    cmd = [sys.executable, CALLER_SCRIPT, "--max-calls", str(calls), "--concurrency", str(concurrency),
+           "--ignore-hours"]
+    cpu_before = _children_cpu()
+    started = time.time()
+    with open(os.path.join(workdir, "caller.log"), "w", encoding="utf-8") as log:
+        proc = subprocess.Popen(cmd, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+        samples = []  # (rss, in flight)
+        while proc.poll() is None:
+            samples.append((_rss_bytes(proc.pid), fake.in_flight()))
+            time.sleep(0.2)
+    wall = time.time() - started
+    cpu_after = _children_cpu()
+    server.shutdown()
+    fake.close()
+
+    ended = sum(1 for r in fake.calls.values() if r["end_at"] <= time.time())
+    rss = [s for s, _ in samples if s]
+    in_flight = [n for _, n in samples]
+    active = [(s, n) for s, n in samples if s and n]
+    baseline = active[0][0] if active else (rss[0] if rss else None)
+    peak_in_flight = max(in_flight, default=0)
+    avg_in_flight = sum(n for _, n in active) / len(active) if active else 0
+    cpu = cpu_after - cpu_before if cpu_before is not None else None
+    metrics = {
+        "concurrency": concurrency,
+        "calls": ended,
+        "exit_code": proc.returncode,
+        "wall_seconds": wall,
+        "calls_per_hour": ended / wall * 3600 if wall else 0,
+        "sim_calls_per_hour": ended / (wall * speed) * 3600 if wall else 0,
+        "peak_in_flight": peak_in_flight,
+        "peak_rss_mb": max(rss) / 2 ** 20 if rss else None,
+        "rss_per_in_flight_kb": ((max(rss) - baseline) / peak_in_flight / 1024
+                                 if rss and baseline and peak_in_flight else None),
+        "cpu_seconds": cpu,
+        "cpu_percent_per_in_flight": (cpu / wall * 100 / avg_in_flight if cpu is not None and avg_in_flight else None),
+        "stages": {name: {"p50": percentile(v, 50), "p95": percentile(v, 95), "p99": percentile(v, 99), "n": len(v)}
+                   for name, v in fake.stages.items()},
+        "workdir": workdir,
+    }
+    if not keep_dir and proc.returncode == 0:
+        shutil.rmtree(workdir, ignore_errors=True)
+        metrics["workdir"] = None
+    return metrics
+
+
+def print_bench(results: list):
+    def fmt(value, spec):
+        return "n/a" if value is None else format(value, spec)
+
+    print(f"\n{'conc':>5} {'calls':>6} {'wall s':>7} {'calls/hr':>9} {'sim calls/hr':>12} {'peak MB':>8} "
+          f"{'KB/call':>8} {'CPU%/call':>9}")
+    for m in results:
+        print(f"{m['concurrency']:>5} {m['calls']:>6} {m['wall_seconds']:>7.1f} {m['calls_per_hour']:>9.0f} "
+              f"{m['sim_calls_per_hour']:>12.0f} {fmt(m['peak_rss_mb'], '.1f'):>8} "
+              f"{fmt(m['rss_per_in_flight_kb'], '.0f'):>8} {fmt(m['cpu_percent_per_in_flight'], '.2f'):>9}")
+    print("\nStage latency (real seconds) p50 / p95 / p99:")
+    for m in results:
+        stages = "  ".join(f"{name} {s['p50']:.3f}/{s['p95']:.3f}/{s['p99']:.3f}" for name, s in m["stages"].items())
+        print(f"  conc {m['concurrency']:>3}: {stages}")
+    for m in results:
+        if m["exit_code"] != 0:
+            print(f"  ! conc {m['concurrency']}: caller exited {m['exit_code']}, log kept in {m['workdir']}")
+
+
+def load_profile(path: str) -> dict:
+    if not path:
+        return DEFAULT_PROFILE
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Local fake VAPI server and campaign load driver")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    sp = sub.add_parser("serve", help="Run the fake API")
+    sp.add_argument("--port", type=int, default=8900)
+    sp.add_argument("--speed", type=float, default=1.0, help="Time compression (60 = minute-long calls take 1s)")
+    sp.add_argument("--profile", default="", help="JSON profile (see the profile command)")
+    sp.add_argument("--seed", type=int)
+
+    pp = sub.add_parser("profile", help="Build a call profile from real results")
+    pp.add_argument("--results", default=default_results_path())
+    pp.add_argument("--out", default="sim_profile.json")
+
+    bp = sub.add_parser("bench", help="Run 2_vapi_caller.py against the fake API")
+    bp.add_argument("--calls", type=int, default=200)
+    bp.add_argument("--concurrency", default="5,10,20", help="Comma-separated settings to compare")
+    bp.add_argument("--speed", type=float, default=60.0)
+    bp.add_argument("--profile", default="")
+    bp.add_argument("--seed", type=int, default=1)
+    bp.add_argument("--keep", action="store_true", help="Keep each run's working directory")
+    bp.add_argument("--json", default="", help="Also write the metrics here")
+    args = ap.parse_args()
+
+    if args.cmd == "profile":
+        profile = profile_from_results(args.results)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(profile, f, indent=2, ensure_ascii=False)
+        print(f"Wrote {args.out}: " + ", ".join(f"{r} {p:.0%}" for r, p in profile["ended_reasons"].items()))
+        return
+
+    profile = load_profile(args.profile)
+    if args.cmd == "serve":
+        fake = FakeVapi(profile, args.speed, args.seed)
+        server = start_fake_vapi(fake, args.port)
+        print(f"Fake VAPI on http://127.0.0.1:{server.server_port} (speed x{args.speed})")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            server.shutdown()
+            fake.close()
+        return
+
+    results = []
+    for concurrency in [int(c) for c in args.concurrency.split(",") if c.strip()]:
+        print(f"Running {args.calls} calls at concurrency {concurrency}...")
+        results.append(run_bench(args.calls, concurrency, args.speed, profile, args.seed, args.keep))
+    print_bench(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,392 @@
+"""
+Deterministic pre-extraction of the campaign fields (see call_analysis.py)
+from a call transcript, so the obvious answers don't need Gemini.
+
+Only fields it is sure of are returned; anything ambiguous is left out and
+call_analysis.py asks Gemini for just those. A field is resolved when every
+signal found for it agrees:
+
+- price: exactly one distinct rand amount, in the practice's reply to the
+  price question or a sentence about the consultation ("R1 200",
+  "R1,200.00", "950 rand") -> "R1200"; an amount next to a scan goes to Gemini
+- has_gyni / has_ultrasound: the practice's answer to the assistant's
+  question, when it is a bare yes or no ("Yes, Dr Smith." / "No, sorry,
+  we're a GP practice."), and plain statements ("we don't have a gynae",
+  "includes an ultrasound"). "No" needs the negation to apply to the topic
+  itself; any other negation in the sentence leaves the field to Gemini
+- availability: one day (and optional time) in the answer to the
+  appointment question ("Next Tuesday at 10" -> "Next Tuesday 10"), and
+  nothing date-like left over ("Tuesday the 5th at 10am" goes to Gemini)
+
+VAPI transcripts ("AI: ... / User: ...") are read turn by turn. Unlabelled
+transcripts (transcribe_recordings.py) get the statement and price checks
+only, with questions skipped. A labelled transcript where the practice
+never spoke (voicemail) is "Unknown" for all four fields.
+
+FAST_EXTRACT=off in .env sends everything to Gemini as before.
+
+Usage:
+  from fast_extract import extract
+  extract(transcript)    # {"has_gyni": "No"} - only the fields it is sure of
+  python fast_extract.py bench call_results.jsonl   # agreement with stored Gemini answers
+  python fast_extract.py check                      # the regression cases in CHECKS
+"""
+import argparse
+import re
+import time
+
+from results_log import default_results_path, iter_results
+
+# Part of call_analysis.analysis_version(): bump when the rules change, so --reanalyze redoes old answers
+FAST_EXTRACT_VERSION = 3
+FIELDS = ("has_gyni", "has_ultrasound", "price", "availability")
+UNKNOWN = "Unknown"
+
+TURN_RE = re.compile(r"^\s*(AI|Assistant|Bot|User|Customer|Human)\s*:\s*(.*)$", re.IGNORECASE)
+PRACTICE_SPEAKERS = ("user", "customer", "human")
+SENTENCE_RE = re.compile(r"[^.?!\n]+[.?!]?")
+
+TOPICS = {
+    "has_gyni": re.compile(r"\b(?:ob[- /]?)?gyn\w*", re.IGNORECASE),
+    "has_ultrasound": re.compile(r"\b(?:ultra[- ]?sound\w*|sonar\w*|sonograph\w*|scans?)\b", re.IGNORECASE),
+}
+# The negation applied to the topic itself: "we don't have a gynae", "no ultrasound", "there isn't an in-house gynae"
+NEGATED_TOPICS = {
+    field: re.compile(
+        r"\b(?:no|not|don't|do not|doesn't|does not|haven't|have not|hasn't|has not|isn't|is not|aren't|are not"
+        r"|never|no longer|without)(?:\s+(?:have|has|had|got|offer|offers|do|does|provide|provides|any|a|an"
+        r"|in-house|resident|female|male|own|specialist|on-site|onsite|currently|really|actually))*\s+(?:"
+        + topic.pattern + ")", re.IGNORECASE)
+    for field, topic in TOPICS.items()
+}
+AVAILABILITY_QUESTION = re.compile(r"\b(?:earliest|soonest|next available|when|appointments?|slots?|book)\b",
+                                   re.IGNORECASE)
+QUESTION_RE = re.compile(r"\?|\b(?:whether|if you|do you|is there|are there)\b", re.IGNORECASE)
+PRICE_QUESTION = re.compile(r"\b(?:price|fee|cost|charge|how much)\b", re.IGNORECASE)
+
+YES_RE = re.compile(r"^\W*(?:yes|yeah|yep|yup|ja|certainly|definitely|correct|that's right"
+                    r"|we do|we have|we offer|there is|there's)\b", re.IGNORECASE)
+NO_RE = re.compile(r"^\W*(?:no|nope|we don't|we do not|we don't have|we haven't"
+                   r"|there isn't|there is no|not at the moment|not anymore)\b", re.IGNORECASE)
+# Openers that are not an answer by themselves ("Sorry, can you repeat that?", "Oh. Yes, Dr Naidoo.")
+OPENER_RE = re.compile(r"^\W*(?:sorry|unfortunately|oh|ah|um|uh|hmm)\b[\s,.]*", re.IGNORECASE)
+NEGATION_RE = re.compile(r"\b(?:no|not|don't|doesn't|didn't|isn't|aren't|haven't|hasn't|never|nobody|none"
+                         r"|unfortunately|no longer|can't|cannot|won't)\b|n't\b", re.IGNORECASE)
+HEDGE_RE = re.compile(r"\b(?:maybe|might|perhaps|not sure|i think|check|depends|sometimes|but|except|only"
+                      r"|hold on|hang on|one moment|one sec|one second|just a (?:sec|second|moment)|bear with me"
+                      r"|repeat|pardon)\b", re.IGNORECASE)
+# A reply clause that only repeats the "no" ("we don't", "sorry", "not at the moment")
+NO_RESTATEMENT_RE = re.compile(
+    r"^(?:no|nope|sorry|unfortunately(?: not)?|we don't|we do not|we haven't|there isn't|there is no"
+    r"|not at the moment|not anymore|no longer)(?:\s+(?:have|offer|do|provide|one|any|that|it|them|here"
+    r"|at the moment|anymore|sorry))*$", re.IGNORECASE)
+POSITIVE_STATEMENT_RE = re.compile(
+    r"\b(?:we (?:do|have|offer|provide)|there (?:is|are)|there's|includes?|including|with an?|our)\b",
+    re.IGNORECASE)
+
+_AMOUNT = r"(\d{1,3}(?:[ ,]\d{3})+|\d+)(?:[.,]\d{2})?"
+PRICE_RES = (
+    re.compile(r"(?<![\w])R\s?" + _AMOUNT + r"(?![\d\w])"),
+    re.compile(r"\bZAR\s?" + _AMOUNT + r"(?![\d\w])", re.IGNORECASE),
+    re.compile(r"(?<![\w])" + _AMOUNT + r"\s*(?:rand|zar)\b", re.IGNORECASE),
+)
+
+_DAY = (r"(?:today|tomorrow|(?:(?:next|this|coming)\s+)?(?:mon|tues|wednes|thurs|fri|satur|sun)day"
+        r"|next week|\d{1,2}(?:st|nd|rd|th)?(?:\s+of)?\s+(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)\w*"
+        r"|(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)\w*\s+\d{1,2}(?:st|nd|rd|th)?)")
+_TIME = r"(?:\d{1,2}(?::\d{2}|h\d{2})?\s*(?:am|pm)|\d{1,2}(?::|h)\d{2}|\d{1,2}(?=\W*$)|noon|midday|morning|afternoon)"
+DAY_RE = re.compile(r"\b" + _DAY + r"\b", re.IGNORECASE)
+# Date / time words left over around an AVAILABILITY_RE match
+UNPARSED_WHEN_RE = re.compile(
+    r"\d|\b(?:am|pm|a\.m|p\.m|morning|afternoon|evening|noon|midday|o'clock|half past|quarter (?:past|to)"
+    r"|january|february|march|april|june|july|august|september|october|november|december"
+    r"|jan|feb|mar|apr|jun|jul|aug|sep|sept|oct|nov|dec"
+    r"|first|second|third|fourth|fifth|sixth|seventh|eighth|ninth|tenth|\w+teenth|twentieth|thirtieth)\b",
+    re.IGNORECASE)
+CONSULTATION_RE = re.compile(r"\b(?:consult\w*|visit|first appointment|appointment fee)\b", re.IGNORECASE)
+AVAILABILITY_RE = re.compile(r"\b(" + _DAY + r")\b(?:[\s,]+(?:at|from|in the)?\s*(" + _TIME + r"))?",
+                             re.IGNORECASE)
+
+
+def parse_turns(transcript: str) -> list | None:
+    """
+    [(speaker, text)] for a labelled transcript, or None if unlabelled.
+    Continuation lines and consecutive turns by the same speaker are joined,
+    so "User: Yes." / "User: Actually no, she left." is read as one reply.
+    """
+    turns = []
+    for line in (transcript or "").splitlines():
+        m = TURN_RE.match(line)
+        if m:
+            speaker = "practice" if m.group(1).lower() in PRACTICE_SPEAKERS else "assistant"
+            if turns and turns[-1][0] == speaker:
+                turns[-1][1] += " " + m.group(2).strip()
+            else:
+                turns.append([speaker, m.group(2).strip()])
+        elif turns and line.strip():
+            turns[-1][1] += " " + line.strip()
+    return [tuple(t) for t in turns] if turns else None
+
+
+def _sentences(text: str) -> list:
+    return [s.strip() for s in SENTENCE_RE.findall(text) if s.strip()]
+
+
+def _answer(text: str, field: str) -> str | None:
+    """
+    'Yes' / 'No' for a bare answer to the question about field; None if it
+    hedges, or a later clause brings in a new negation, a "yes" or another topic
+    ("No problem, yes our gynae is in" / "No, not me, you need reception").
+    "Sorry" / "unfortunately" / "oh" only count with an answer after them.
+    """
+    while (m := OPENER_RE.match(text)) and m.end():
+        text = text[m.end():]
+    clauses = [c.strip() for c in re.split(r"[,.;:!?]+|\s+-\s+", text) if c.strip()]
+    if not clauses or HEDGE_RE.search(text):
+        return None
+    yes, no = YES_RE.search(clauses[0]), NO_RE.search(clauses[0])
+    if bool(yes) == bool(no):
+        return None
+    for clause in clauses[1:]:
+        if any(t.search(clause) for f, t in TOPICS.items() if f != field):
+            return None
+        if yes and (NEGATION_RE.search(clause) or NO_RE.search(clause)):
+            return None
+        if no and (YES_RE.search(clause) or NEGATION_RE.search(clause) and not (
+                NO_RESTATEMENT_RE.match(clause) or NEGATED_TOPICS[field].search(clause))):
+            return None
+    return "Yes" if yes else "No"
+
+
+def _statement(sentence: str, field: str) -> str | None:
+    """'Yes' / 'No' for a statement about a topic ('we don't have a gynae'), None otherwise."""
+    if not TOPICS[field].search(sentence) or sentence.endswith("?") or HEDGE_RE.search(sentence):
+        return None
+    if NEGATED_TOPICS[field].search(sentence):
+        return "No"
+    if NEGATION_RE.search(sentence):
+        return None  # a negation about something else ("no problem", "she can't take bookings")
+    if POSITIVE_STATEMENT_RE.search(sentence):
+        return "Yes"
+    return None
+
+
+def _agreed(signals: list) -> str | None:
+    return signals[0] if signals and len(set(signals)) == 1 else None
+
+
+def _yes_no(field: str, turns: list | None, speech: list) -> str | None:
+    topic = TOPICS[field]
+    signals = [s for s in (_statement(sentence, field) for sentence in speech) if s]
+    for i, (speaker, text) in enumerate(turns or []):
+        asked = speaker == "assistant" and QUESTION_RE.search(text) and topic.search(text)
+        other = [f for f, t in TOPICS.items() if f != field and t.search(text)]
+        if not asked or other or i + 1 >= len(turns) or turns[i + 1][0] != "practice":
+            continue
+        answer = _answer(turns[i + 1][1], field)
+        if answer:
+            signals.append(answer)
+    return _agreed(signals)
+
+
+def _amounts(text: str) -> set:
+    return {int(re.sub(r"[ ,]", "", m.group(1))) for pattern in PRICE_RES for m in pattern.finditer(text)}
+
+
+def _price(turns: list | None, speech: list) -> str | None:
+    """
+    One rand amount, said in reply to a price question or in a sentence about
+    the consultation fee. An amount in a sentence about a scan (or any other
+    topic) hands the field to Gemini.
+    """
+    sentences = [s for s in speech if CONSULTATION_RE.search(s)]
+    for i, (speaker, text) in enumerate(turns or []):
+        if (speaker == "assistant" and PRICE_QUESTION.search(text) and not any(t.search(text) for t in TOPICS.values())
+                and i + 1 < len(turns) and turns[i + 1][0] == "practice"):
+            sentences += _sentences(turns[i + 1][1])
+    if any(_amounts(s) and any(t.search(s) for t in TOPICS.values()) for s in sentences):
+        return None
+    amounts = set().union(*(_amounts(s) for s in sentences))
+    return f"R{amounts.pop()}" if len(amounts) == 1 else None
+
+
+def _availability(turns: list | None) -> str | None:
+    found = []
+    for i, (speaker, text) in enumerate(turns or []):
+        if speaker != "assistant" or not AVAILABILITY_QUESTION.search(text) or any(
+                t.search(text) for t in TOPICS.values()) or PRICE_QUESTION.search(text):
+            continue
+        if i + 1 < len(turns) and turns[i + 1][0] == "practice":
+            answer = turns[i + 1][1]
+            if HEDGE_RE.search(answer) or NEGATION_RE.search(answer) or len(DAY_RE.findall(answer)) != 1:
+                return None
+            m = AVAILABILITY_RE.search(answer)
+            if UNPARSED_WHEN_RE.search(answer[:m.start()] + " " + answer[m.end():]):
+                return None  # "Tuesday the 5th at 10am": more to it than the day and time matched
+            day = " ".join(w.capitalize() if w.lower() != "of" else w for w in m.group(1).split())
+            found.append(f"{day} {m.group(2)}" if m.group(2) else day)
+    return _agreed(found)
+
+
+# (transcript, the whole extract() result) - python fast_extract.py check
+CHECKS = [
+    ("AI: Do you have a gynae?\nUser: Yes, Dr Smith.", {"has_gyni": "Yes"}),
+    ("AI: Do you have a gynae?\nUser: No, sorry, we're a GP practice.", {"has_gyni": "No"}),
+    ("AI: Do you do ultrasound?\nUser: No, we don't.", {"has_ultrasound": "No"}),
+    ("User: We don't have a gynae here.", {"has_gyni": "No"}),
+    ("User: Unfortunately there is no ultrasound at this practice.", {"has_ultrasound": "No"}),
+    ("User: The consult includes an ultrasound.", {"has_ultrasound": "Yes"}),
+    ("User: No problem, yes our gynae Dr Smith is in on Tuesdays.", {}),
+    ("User: Our gynaecologist is away until next week, she can't take bookings.", {}),
+    ("AI: Do you do scans?\nUser: No, not me, you need reception.", {}),
+    ("AI: Do you have a gynae?\nUser: Yes, but only on Mondays.", {}),
+    ("AI: How much is a consultation?\nUser: It's R1 200.", {"price": "R1200"}),
+    ("User: The consultation is R950.", {"price": "R950"}),
+    ("AI: Do you have a gynaecologist available for new patients?\nUser: Sorry, can you repeat that?", {}),
+    ("AI: Do you have a gynaecologist available for new patients?\nUser: Sorry, can you repeat that?\n"
+     "AI: Is there a gynae at the practice?\nUser: Oh. Yes, Dr Naidoo.", {"has_gyni": "Yes"}),
+    ("AI: Do you do ultrasounds?\nUser: Sorry, hold on.", {}),
+    ("AI: Do you do ultrasounds?\nUser: Sure, one moment.", {}),
+    ("AI: Do you do ultrasounds?\nUser: Of course, one second.", {}),
+    ("AI: Do you have a gynae?\nUser: Sorry, no.", {"has_gyni": "No"}),
+    ("AI: Do you have a gynae?\nUser: Unfortunately we don't have one.", {"has_gyni": "No"}),
+    ("AI: Do you have a gynae?\nUser: Yes.\nUser: Actually no, she left.", {}),
+    ("User: The ultrasound scan alone is R650.", {}),
+    ("AI: When is the earliest appointment?\nUser: Tuesday the 5th at 10am.", {}),
+    ("AI: When is the earliest appointment?\nUser: Next Tuesday at 10am.", {"availability": "Next Tuesday 10am"}),
+]
+
+
+def extract(transcript: str) -> dict:
+    """{field: value} for the fields the transcript answers unambiguously; may be empty."""
+    turns = parse_turns(transcript)
+    if turns is not None:
+        said = [text for speaker, text in turns if speaker == "practice" and text]
+        if not said:
+            return {field: UNKNOWN for field in FIELDS}  # voicemail / nobody picked up
+        speech = [s for text in said for s in _sentences(text)]
+    else:
+        speech = [s for s in _sentences(transcript or "") if not s.endswith("?")]
+        if not speech:
+            return {}
+    found = {
+        "has_gyni": _yes_no("has_gyni", turns, speech),
+        "has_ultrasound": _yes_no("has_ultrasound", turns, speech),
+        "price": _price(turns, speech),
+        "availability": _availability(turns),
+    }
+    return {field: value for field, value in found.items() if value}
+
+
+def mentions(transcript: str) -> set:
+    """
+    Fields the practice said something about: the topic in their own words, a
+    yes/no answer to the question, a rand amount or a day. Looser than
+    extract() - call_analysis.py uses it to spot an "Unknown" worth a second look.
+    """
+    turns = parse_turns(transcript)
+    if turns is not None:
+        speech = " ".join(text for speaker, text in turns if speaker == "practice")
+    else:
+        speech = " ".join(s for s in _sentences(transcript or "") if not s.endswith("?"))
+    found = {field for field, topic in TOPICS.items() if topic.search(speech)}
+    for i, (speaker, text) in enumerate(turns or []):
+        if speaker != "assistant" or not QUESTION_RE.search(text) or i + 1 >= len(turns):
+            continue
+        reply = turns[i + 1]
+        if reply[0] == "practice" and (YES_RE.search(reply[1]) or NO_RE.search(reply[1])):
+            found.update(field for field, topic in TOPICS.items() if topic.search(text))
+    if any(pattern.search(speech) for pattern in PRICE_RES):
+        found.add("price")
+    if DAY_RE.search(speech):
+        found.add("availability")
+    return found
+
+
+def _normalise(field: str, value) -> str:
+    value = str(value or UNKNOWN).strip()
+    if field == "price":
+        digits = re.sub(r"[ ,]", "", value)
+        m = re.search(r"\d+", digits)
+        return m.group(0) if m else value.lower()
+    if field == "availability":
+        value = re.sub(r"(\d)(?:st|nd|rd|th)\b|\b(?:at|of|on|the)\b", r"\1", value.lower())
+        return " ".join(re.findall(r"[a-z0-9]+", value))
+    return value.lower()
+
+
+def agrees(field: str, local: str, stored) -> bool:
+    """Local vs stored Gemini answer; availability matches if either contains the other."""
+    a, b = _normalise(field, local), _normalise(field, stored)
+    if field == "availability":
+        return bool(a and b) and (a in b or b in a)
+    return a == b
+
+
+def bench(path: str):
+    """Run extract() over stored results and compare with the Gemini answers already in them."""
+    transcripts = fully = 0
+    resolved = {field: 0 for field in FIELDS}
+    agreed = {field: 0 for field in FIELDS}
+    disagreements = []
+    elapsed = 0.0
+    for result in iter_results(path):
+        transcript = result.get("transcript")
+        if not transcript or not result.get("has_gyni"):
+            continue  # never analysed, nothing to compare against
+        transcripts += 1
+        start = time.perf_counter()
+        local = extract(transcript)
+        elapsed += time.perf_counter() - start
+        fully += len(local) == len(FIELDS)
+        for field, value in local.items():
+            resolved[field] += 1
+            if agrees(field, value, result.get(field)):
+                agreed[field] += 1
+            elif len(disagreements) < 10:
+                practice = result.get("practice") or {}
+                name = practice.get("name", "?") if isinstance(practice, dict) else str(practice)
+                disagreements.append(f"  {name[:30]:<30} {field}: local {value!r}, Gemini {result.get(field)!r}")
+
+    if not transcripts:
+        print(f"No analysed transcripts in {path}")
+        return
+    total_resolved, total_agreed = sum(resolved.values()), sum(agreed.values())
+    print(f"{transcripts} analysed transcripts in {path} ({elapsed / transcripts * 1000:.2f} ms each locally)")
+    for field in FIELDS:
+        rate = f"{agreed[field] / resolved[field]:.1%} agree" if resolved[field] else "-"
+        print(f"  {field:<15} resolved locally {resolved[field]:>5} ({resolved[field] / transcripts:.0%}), {rate}")
+    if total_resolved:
+        print(f"Overall agreement {total_agreed / total_resolved:.1%} on {total_resolved} fields")
+    print(f"LLM calls saved: {fully} of {transcripts} ({fully / transcripts:.0%}) need no Gemini request; "
+          f"{total_resolved} of {transcripts * len(FIELDS)} fields answered locally")
+    if disagreements:
+        print("Disagreements (first 10):")
+        print("\n".join(disagreements))
+
+
+def check() -> bool:
+    """Run extract() over CHECKS; prints and returns False on any mismatch."""
+    failed = 0
+    for transcript, expected in CHECKS:
+        got = extract(transcript)
+        if got != expected:
+            failed += 1
+            print(f"  FAIL {transcript!r}: got {got}, expected {expected}")
+    print(f"{len(CHECKS) - failed} of {len(CHECKS)} checks passed")
+    return not failed
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark the local fast-path extractor against stored Gemini answers")
+    ap.add_argument("command", choices=["bench", "check"])
+    ap.add_argument("results", nargs="?", default=default_results_path(),
+                    help="call_results.jsonl (or a legacy call_results.json)")
+    args = ap.parse_args()
+    if args.command == "check":
+        raise SystemExit(0 if check() else 1)
+    bench(args.results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+"""
+Shared Gemini client: one pooled keep-alive session for every generateContent
+request the scripts make (transcript analysis, transcription, lead emails,
+pilot-fit tooling).
+
+- connection pool (no TLS handshake per request)
+- (connect, read) timeouts, longer for audio
+- paced by the shared gemini-rpm / gemini-tpm buckets (rate_limit.py); a 429
+  blocks the bucket for Retry-After across every thread and process
+- retry with jittered exponential backoff on 5xx and connection errors
+- JSON mode: responseMimeType application/json plus an optional response
+  schema, so replies parse with json.loads - no fence stripping or regex
+  recovery
+- token accounting from usageMetadata, per model, with an estimated cost
+- responses cached on disk (llm_cache.py); client.use_cache = False or
+  use_cache=False per call asks for a fresh answer
+
+Thread-safe; use get_gemini() to share one instance per process.
+
+Usage:
+  from gemini_client import GeminiError, get_gemini
+  data = get_gemini().generate_json(prompt, schema={"type": "OBJECT", "properties": {...}})
+  text = get_gemini().generate_text(prompt)
+  get_gemini().report()     # tokens used this run
+"""
+import json
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import GEMINI_API_KEY, GEMINI_BASE_URL, GEMINI_MODEL
+from llm_cache import cache_key, get_llm_cache
+from rate_limit import get_limiter, retry_after
+
+TEXT_TIMEOUT = (5, 60)
+AUDIO_TIMEOUT = (5, 180)
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+MAX_RETRIES = 4
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 30.0
+POOL_SIZE = 16
+# Token estimates for the gemini-tpm bucket: ~4 characters of text, or ~500 bytes
+# of 128 kbps MP3 (Gemini counts 32 tokens per second of audio), per token
+CHARS_PER_TOKEN = 4
+AUDIO_BYTES_PER_TOKEN = 500
+USE_DEFAULT_CACHE = object()  # GeminiClient(cache=...) default: the shared llm_cache
+
+# USD per million (input, output) tokens, for the cost estimate only
+PRICING = {
+    "gemini-2.0-flash": (0.10, 0.40),
+    "gemini-2.0-flash-lite": (0.075, 0.30),
+    "gemini-1.5-flash": (0.075, 0.30),
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gemini-2.5-pro": (1.25, 10.00),
+}
+
+
+class GeminiError(Exception):
+    """A request that failed after retries, or a reply that isn't the JSON asked for."""
+
+    def __init__(self, message: str, status: int = None, raw: str = None):
+        super().__init__(message)
+        self.status = status
+        self.raw = raw  # the reply text, kept so a paid response isn't lost
+
+
+def response_text(data: dict) -> str:
+    """Concatenated text of the first candidate."""
+    parts = ((data.get("candidates") or [{}])[0].get("content") or {}).get("parts") or []
+    return "".join(p.get("text", "") or "" for p in parts).strip()
+
+
+def estimate_request_tokens(parts: list) -> int:
+    """Rough input tokens for the TPM bucket (corrected from usageMetadata afterwards)."""
+    tokens = 0
+    for part in parts:
+        if "text" in part:
+            tokens += len(part["text"]) // CHARS_PER_TOKEN
+        elif "inlineData" in part:
+            tokens += len(part["inlineData"].get("data", "")) * 3 // 4 // AUDIO_BYTES_PER_TOKEN
+    return tokens + 1
+
+
+def estimate_cost(model: str, prompt_tokens: int, output_tokens: int) -> float | None:
+    price = PRICING.get(model)
+    if not price:
+        return None
+    return (prompt_tokens * price[0] + output_tokens * price[1]) / 1_000_000
+
+
+class GeminiClient:
+    def __init__(self, api_key: str = GEMINI_API_KEY, model: str = GEMINI_MODEL, base_url: str = GEMINI_BASE_URL,
+                 max_retries: int = MAX_RETRIES, pool_size: int = POOL_SIZE, cache=USE_DEFAULT_CACHE,
+                 limiter=None):
+        self.api_key = api_key
+        self.model = model
+        self.base_url = base_url.rstrip("/")
+        self.max_retries = max_retries
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._lock = threading.Lock()
+        self._usage = {}  # model -> request / token / cache-hit counters
+        # LLMCache or None, opened on first request; use_cache=False bypasses lookups (--no-cache)
+        self._cache = cache
+        self.use_cache = True
+        self.limiter = limiter  # RateLimiter; None = the shared one (rate_limit.py)
+
+    @property
+    def cache(self):
+        if self._cache is USE_DEFAULT_CACHE:
+            self._cache = get_llm_cache()
+        return self._cache
+
+    def _account(self, model: str, usage: dict = None, retries: int = 0, failed: bool = False,
+                 cached: bool = False):
+        with self._lock:
+            u = self._usage.setdefault(model, {"requests": 0, "prompt_tokens": 0, "output_tokens": 0,
+                                               "retries": 0, "failures": 0, "cache_hits": 0,
+                                               "cached_prompt_tokens": 0, "cached_output_tokens": 0})
+            if cached:
+                # Served from llm_cache: no request, no spend; tokens kept to show the saving
+                u["cache_hits"] += 1
+                if usage:
+                    u["cached_prompt_tokens"] += usage.get("promptTokenCount", 0)
+                    u["cached_output_tokens"] += usage.get("candidatesTokenCount", 0)
+                return
+            u["requests"] += 1
+            u["retries"] += retries
+            u["failures"] += failed
+            if usage:
+                u["prompt_tokens"] += usage.get("promptTokenCount", 0)
+                u["output_tokens"] += usage.get("candidatesTokenCount", 0)
+
+    def _payload(self, contents, temperature: float, schema: dict, json_mode: bool,
+                 max_output_tokens: int) -> dict:
+        parts = [{"text": contents}] if isinstance(contents, str) else contents
+        config = {"temperature": temperature}
+        if json_mode or schema:
+            config["responseMimeType"] = "application/json"
+        if schema:
+            config["responseSchema"] = schema
+        if max_output_tokens:
+            config["maxOutputTokens"] = max_output_tokens
+        return {"contents": [{"parts": parts}], "generationConfig": config}
+
+    def generate(self, contents, model: str = None, temperature: float = 0, schema: dict = None,
+                 json_mode: bool = False, max_output_tokens: int = None, timeout=None, use_cache: bool = None) -> dict:
+        """
+        POST generateContent and return the response JSON. contents is a prompt
+        string or a list of parts. Raises GeminiError when every attempt failed.
+        use_cache=False skips the cache lookup (the fresh response is still stored).
+        """
+        payload = self._payload(contents, temperature, schema, json_mode, max_output_tokens)
+        data, _ = self._generate(model or self.model, payload, timeout, use_cache)
+        return data
+
+    def _generate(self, model: str, payload: dict, timeout, use_cache: bool) -> tuple:
+        """(response JSON, cache key or None)"""
+        if not self.api_key:
+            raise GeminiError("GEMINI_API_KEY not set")
+        key = None
+        if self.cache:
+            key = cache_key(model, payload["contents"], payload["generationConfig"])
+            use_cache = self.use_cache if use_cache is None else use_cache
+            cached = self.cache.get(key, bypass=not use_cache)
+            if cached is not None:
+                self._account(model, cached.get("usageMetadata"), cached=True)
+                return cached, key
+
+        parts = payload["contents"][0]["parts"]
+        if timeout is None:
+            timeout = AUDIO_TIMEOUT if any("inlineData" in p for p in parts) else TEXT_TIMEOUT
+        url = f"{self.base_url}/models/{model}:generateContent"
+        headers = {"x-goog-api-key": self.api_key, "Content-Type": "application/json"}
+        limiter = self.limiter or get_limiter()
+        estimated = estimate_request_tokens(parts)
+        limiter.acquire("gemini-tpm", estimated)
+        attempt = 0
+        while True:
+            limiter.acquire("gemini-rpm")
+            try:
+                resp = self.session.post(url, headers=headers, json=payload, timeout=timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= self.max_retries:
+                    self._account(model, retries=attempt, failed=True)
+                    raise GeminiError(f"Gemini request failed: {e}") from e
+                wait = None
+            else:
+                if resp.status_code == 200:
+                    data = resp.json()
+                    usage = data.get("usageMetadata") or {}
+                    self._account(model, usage, retries=attempt)
+                    if usage.get("totalTokenCount"):
+                        limiter.adjust("gemini-tpm", usage["totalTokenCount"] - estimated)
+                    if key:
+                        self.cache.put(key, model, data)
+                    return data, key
+                if resp.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                    self._account(model, retries=attempt, failed=True)
+                    raise GeminiError(f"Gemini {resp.status_code}: {resp.text[:500]}", status=resp.status_code)
+                wait = retry_after(resp)
+                resp.close()
+                if resp.status_code == 429:
+                    # Quota: hold every worker (threads and processes) off the bucket, not just this one
+                    limiter.penalize("gemini-rpm", wait or random.uniform(1, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** (attempt + 1))))
+                    attempt += 1
+                    continue
+
+            if wait is None:
+                wait = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+            attempt += 1
+            time.sleep(wait)
+
+    def generate_text(self, contents, **kwargs) -> str:
+        return response_text(self.generate(contents, **kwargs))
+
+    def generate_json(self, contents, schema: dict = None, model: str = None, temperature: float = 0,
+                      max_output_tokens: int = None, timeout=None, use_cache: bool = None):
+        """Parsed JSON reply. A reply that doesn't parse raises GeminiError with .raw set (and isn't cached)."""
+        payload = self._payload(contents, temperature, schema, True, max_output_tokens)
+        data, key = self._generate(model or self.model, payload, timeout, use_cache)
+        text = response_text(data)
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError as e:
+            if key:
+                self.cache.delete(key)
+            reason = (data.get("candidates") or [{}])[0].get("finishReason", "")
+            raise GeminiError(f"Gemini returned invalid JSON ({reason or e})", raw=text) from e
+
+    def usage(self) -> dict:
+        """{model: counters + estimated_cost}"""
+        with self._lock:
+            usage = {model: dict(u) for model, u in self._usage.items()}
+        for model, u in usage.items():
+            u["estimated_cost"] = estimate_cost(model, u["prompt_tokens"], u["output_tokens"])
+            u["saved_cost"] = estimate_cost(model, u["cached_prompt_tokens"], u["cached_output_tokens"])
+        return usage
+
+    def report(self):
+        for model, u in self.usage().items():
+            cost = f", ~${u['estimated_cost']:.4f}" if u["estimated_cost"] is not None else ""
+            cached = ""
+            if u["cache_hits"]:
+                saved = f", ~${u['saved_cost']:.4f} saved" if u["saved_cost"] is not None else ""
+                cached = f"; {u['cache_hits']} from cache{saved}"
+            print(f"Gemini {model}: {u['requests']} requests ({u['failures']} failed, {u['retries']} retries), "
+                  f"{u['prompt_tokens']} in / {u['output_tokens']} out tokens{cost}{cached}")
+        if self._cache not in (None, USE_DEFAULT_CACHE):
+            self._cache.report()
+        if any(u["requests"] for u in self._usage.values()):
+            (self.limiter or get_limiter()).report()
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_gemini() -> GeminiClient:
+    """The process-wide shared client (GEMINI_API_KEY / GEMINI_MODEL from config)."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = GeminiClient()
+        return _client
@@ -1,12 +1,22 @@
 """
 Read all raw Apollo CSV exports, parse (handle quoted newlines), deduplicate,
 and write one cleaned Excel file (.xlsx).
+
+Company phones are normalised to E.164 (see phone_numbers.py in the repo root),
+and accounts without an Apollo id are also deduplicated by phone.
 """
 import csv
+import sys
 from pathlib import Path
 
 from openpyxl import Workbook
 
+REPO_ROOT = str(Path(__file__).resolve().parent.parent)
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from phone_numbers import PhoneIndex, normalize
+
 SEGMENT = "lead_gen_appointment_setting"
 RAW_FILES = [
     "apollo-accounts-export.csv",
@@ -51,6 +61,7 @@ def main():
     all_header = None
     all_rows = []
     seen_ids = set()
+    seen_phones = PhoneIndex(dialable_only=False)
 
     for name in RAW_FILES:
         path = base / name
@@ -67,15 +78,24 @@ def main():
             idx = all_header.index("Apollo Account Id")
         except ValueError:
             idx = all_header.index("Company Name")  # fallback
+        phone_idx = all_header.index("Company Phone") if "Company Phone" in all_header else None
         for row in rows:
+            if phone_idx is not None and len(row) > phone_idx:
+                row[phone_idx] = normalize(row[phone_idx]) or row[phone_idx]
             if len(row) <= idx:
                 all_rows.append(row)
                 continue
             key = (row[idx] or "").strip()
             if key and key in seen_ids:
                 continue
+            # Same company exported without an id: fall back to its phone number
+            phone = row[phone_idx] if phone_idx is not None and len(row) > phone_idx else ""
+            if not key and phone and phone in seen_phones:
+                continue
             if key:
                 seen_ids.add(key)
+            if phone:
+                seen_phones.add(phone)
             all_rows.append(row)
 
     if not all_header or not all_rows:
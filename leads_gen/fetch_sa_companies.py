@@ -14,21 +14,25 @@ import csv
 import json
 import os
 import sys
-import time
 from typing import List, Dict
 
-import requests
 from dotenv import load_dotenv
 
 load_dotenv()
 
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(SCRIPT_DIR)
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from rate_limit import get_limiter, limited_request
+
 GOOGLE_PLACES_API_KEY = os.getenv("GOOGLE_PLACES_API_KEY")
 if not GOOGLE_PLACES_API_KEY:
     print("Missing GOOGLE_PLACES_API_KEY in .env")
     print("Get one at: https://console.cloud.google.com/apis/credentials")
     sys.exit(1)
 
-SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 OUTPUT_CSV = os.path.join(SCRIPT_DIR, "TOP_CONVERSION_LEADS.csv")
 
 # SA cities for search
@@ -111,7 +115,7 @@ def google_places_text_search(query: str, location: str = "South Africa", max_re
     
     results = []
     try:
-        r = requests.get(url, params=params, timeout=15)
+        r = limited_request("places", "GET", url, params=params, timeout=15)
         r.raise_for_status()
         data = r.json()
         
@@ -134,8 +138,6 @@ def google_places_text_search(query: str, location: str = "South Africa", max_re
                     "address": address,
                     "place_id": place_id,
                 })
-        
-        time.sleep(0.1)  # Rate limit
     except Exception as e:
         print(f"  Error searching '{query}': {e}")
     
@@ -152,7 +154,7 @@ def get_place_website(place_id: str) -> str:
     }
     
     try:
-        r = requests.get(url, params=params, timeout=10)
+        r = limited_request("places", "GET", url, params=params, timeout=10)
         r.raise_for_status()
         data = r.json()
         if data.get("status") == "OK":
@@ -208,6 +210,7 @@ def main():
     
     print(f"\n✅ Found {len(all_companies)} companies")
     print(f"✅ Saved to {OUTPUT_CSV}")
+    get_limiter().report()
     print("\nNext steps:")
     print("  1. Review and clean the CSV (remove duplicates, verify websites)")
     print("  2. Run find_emails.py to enrich with contacts")
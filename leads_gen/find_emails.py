@@ -14,11 +14,17 @@ import re
 import sys
 from urllib.parse import urlparse
 
-import requests
 from dotenv import load_dotenv
 
 load_dotenv()
 
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(SCRIPT_DIR)
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from rate_limit import get_limiter, limited_request
+
 HUNTER_API_KEY = os.getenv("HUNTER_API_KEY")
 if not HUNTER_API_KEY:
     print("Missing HUNTER_API_KEY in .env. Get one at https://hunter.io/api")
@@ -32,7 +38,6 @@ TITLE_KEYWORDS = [
     "operations", "regional", "franchise", "multi-site",
 ]
 
-SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 COMPANIES_CSV = os.path.join(SCRIPT_DIR, "companies_to_enrich.csv")
 OUTPUT_CSV = os.path.join(SCRIPT_DIR, "enriched_leads.csv")
 
@@ -59,7 +64,7 @@ def hunter_domain_search(domain: str, limit: int = 10) -> list[dict]:
     url = "https://api.hunter.io/v2/domain-search"
     params = {"domain": domain, "api_key": HUNTER_API_KEY, "limit": limit}
     try:
-        r = requests.get(url, params=params, timeout=15)
+        r = limited_request("hunter", "GET", url, params=params, timeout=15)
         r.raise_for_status()
         data = r.json().get("data", {})
         return data.get("emails", []) or []
@@ -73,7 +78,7 @@ def hunter_verify_email(email: str) -> str:
     url = "https://api.hunter.io/v2/email-verifier"
     params = {"email": email, "api_key": HUNTER_API_KEY}
     try:
-        r = requests.get(url, params=params, timeout=10)
+        r = limited_request("hunter", "GET", url, params=params, timeout=10)
         r.raise_for_status()
         return r.json().get("data", {}).get("status", "unknown")
     except Exception:
@@ -155,6 +160,7 @@ def main():
     valid_count = sum(1 for r in results if r.get("verification_status") == "valid")
     catch_all_count = sum(1 for r in results if r.get("verification_status") == "catch_all")
     print(f"\n✅ Wrote {len(results)} verified contacts to {OUTPUT_CSV}")
+    get_limiter().report()
     print(f"   - {valid_count} valid emails")
     print(f"   - {catch_all_count} catch_all emails (use with caution)")
     print(f"\n⚠️  ZERO BOUNCE RULE: Only valid/catch_all emails included. Invalid emails were filtered out.")
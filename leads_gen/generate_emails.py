@@ -11,12 +11,12 @@ Usage:
   3. python generate_emails.py
   4. python generate_emails.py --verified-only   # only valid/catch_all
   5. python generate_emails.py --input my_leads.csv --output my_emails.csv
+  6. python generate_emails.py --no-cache    # new wording for contacts already generated
 """
 
 import argparse
 import csv
 import os
-import re
 import sys
 
 # Load .env from doctor repo root (parent of leads_gen)
@@ -28,11 +28,7 @@ if REPO_ROOT not in sys.path:
 from dotenv import load_dotenv
 load_dotenv(os.path.join(REPO_ROOT, ".env"))
 
-try:
-    import requests
-except ImportError:
-    print("Install requests: pip install requests")
-    sys.exit(1)
+from gemini_client import GeminiError, get_gemini
 
 DEFAULT_INPUT = os.path.join(SCRIPT_DIR, "enriched_leads.csv")
 DEFAULT_OUTPUT = os.path.join(SCRIPT_DIR, "emails_ready.csv")
@@ -43,6 +39,11 @@ VALUE_PROP = (
     "results in Excel or your stack. Cut call time and cost—no extra headcount."
 )
 CTA = "Book a short call to see a demo or discuss your use case."
+EMAIL_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {"subject": {"type": "STRING"}, "body": {"type": "STRING"}},
+    "required": ["subject", "body"],
+}
 
 
 def get_gemini_email(segment: str, company_name: str, contact_name: str, job_title: str, gemini_key: str) -> dict:
@@ -62,33 +63,13 @@ Their segment: {segment}
 Company: {company_name}
 Contact: {contact_name}
 Title: {job_title}
-
-Return only valid JSON, e.g. {{"subject": "...", "body": "..."}}
 """
 
     try:
-        resp = requests.post(
-            f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={gemini_key}",
-            headers={"Content-Type": "application/json"},
-            json={
-                "contents": [{"parts": [{"text": prompt}]}],
-                "generationConfig": {"temperature": 0.3},
-            },
-            timeout=30,
-        )
-        resp.raise_for_status()
-        data = resp.json()
-        text = (data.get("candidates") or [{}])[0].get("content", {}).get("parts", [{}])[0].get("text", "")
-        if not text:
-            return result
-        # Extract JSON from response (may be wrapped in markdown code block)
-        json_match = re.search(r"\{[\s\S]*\}", text)
-        if json_match:
-            import json as _json
-            obj = _json.loads(json_match.group())
-            result["subject"] = (obj.get("subject") or "").strip()
-            result["body"] = (obj.get("body") or "").strip()
-    except Exception as e:
+        obj = get_gemini().generate_json(prompt, schema=EMAIL_SCHEMA, temperature=0.3)
+        result["subject"] = (obj.get("subject") or "").strip()
+        result["body"] = (obj.get("body") or "").strip()
+    except GeminiError as e:
         print(f"  Gemini error: {e}", file=sys.stderr)
     return result
 
@@ -98,7 +79,10 @@ def main():
     ap.add_argument("--input", default=DEFAULT_INPUT, help="Input CSV (enriched_leads.csv)")
     ap.add_argument("--output", default=DEFAULT_OUTPUT, help="Output CSV (emails_ready.csv)")
     ap.add_argument("--allow-unverified", action="store_true", help="Allow unverified emails (NOT RECOMMENDED - will cause bounces). Default: only verified emails.")
+    ap.add_argument("--no-cache", action="store_true", help="Write fresh emails instead of reusing cached Gemini answers")
     args = ap.parse_args()
+    if args.no_cache:
+        get_gemini().use_cache = False
 
     gemini_key = os.getenv("GEMINI_API_KEY")
     if not gemini_key:
@@ -162,6 +146,7 @@ def main():
 
     verified_count = sum(1 for r in results if r.get("verification_status", "").lower() == "valid")
     print(f"\n✅ Wrote {len(results)} emails to {args.output}")
+    get_gemini().report()
     print(f"   - All emails verified (zero bounce rule)")
     print(f"   - {verified_count} valid emails")
     print("\n📧 Import this file into Instantly/SendGrid for sending.")
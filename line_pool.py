@@ -0,0 +1,190 @@
+"""
+Pool of outbound VAPI phone numbers ("lines") for campaigns.
+
+One line caps a campaign at that number's concurrency and gets it flagged as
+spam at volume, so calls are sharded over several phone-number ids:
+
+- each line has its own max concurrent calls and calls-per-hour ceiling
+  (rolling one-hour window)
+- acquire() hands out the least-loaded line with spare capacity, blocking
+  until one frees up
+- a line whose calls keep failing to start (VAPI refuses the create because
+  of the phone number or its provider, or the provider drops the call) is
+  taken out of the pool; undialable practice numbers, a rejected customer
+  number and network errors don't count against the line
+- report() prints per-line throughput at the end of the run
+
+Lines come from VAPI_PHONE_NUMBER_IDS in .env: "id1,id2" or, with per-line
+limits, "id1:5:60,id2:3:40" (id:max concurrent:calls per hour). Unset falls
+back to the single VAPI_PHONE_NUMBER_ID.
+"""
+import threading
+import time
+from collections import deque
+
+from config import (
+    VAPI_LINE_CALLS_PER_HOUR, VAPI_LINE_MAX_CONCURRENT, VAPI_PHONE_NUMBER_ID, VAPI_PHONE_NUMBER_IDS,
+)
+
+# Consecutive failed calls before a line is removed from the pool
+FAILURE_THRESHOLD = 3
+HOUR = 3600
+
+# endedReasons that point at the line / provider rather than the practice (ones naming the customer,
+# e.g. twilio-reported-customer-misdialed, are the practice's number and never count)
+LINE_FAILURE_REASONS = ("twilio-failed", "vonage-failed", "vonage-rejected", "sip-", "phone-call-provider",
+                        "call.start.error", "call-start-error", "outbound-sip", "twilio-reported")
+
+# Words in a refused call-create (HTTP error body) that blame our phone number or its provider
+LINE_ERROR_MARKERS = ("phonenumberid", "phone number", "phonenumber", "twilio", "vonage", "telnyx", "sip",
+                      "provider")
+
+
+class NoLinesAvailable(Exception):
+    """Every line in the pool has been disabled."""
+
+
+def parse_lines(spec: str = VAPI_PHONE_NUMBER_IDS, default_id: str = VAPI_PHONE_NUMBER_ID,
+                max_concurrent: int = VAPI_LINE_MAX_CONCURRENT, calls_per_hour: int = VAPI_LINE_CALLS_PER_HOUR) -> list:
+    """'id1:5:60,id2' -> [Line, Line]"""
+    lines = []
+    for entry in (spec or "").split(","):
+        parts = [p.strip() for p in entry.split(":")]
+        if not parts[0]:
+            continue
+        lines.append(Line(
+            parts[0],
+            int(parts[1]) if len(parts) > 1 and parts[1] else max_concurrent,
+            int(parts[2]) if len(parts) > 2 and parts[2] else calls_per_hour,
+        ))
+    if not lines and default_id:
+        lines.append(Line(default_id, max_concurrent, calls_per_hour))
+    return lines
+
+
+def is_line_failure(call, completed_call, error: dict = None) -> bool:
+    """
+    Did this dial fail because of the line (not the practice, and not a blip)?
+    error is make_call's cause when no call was created.
+    """
+    if not call:
+        if not error or error.get("reason") != "http":
+            return False  # undialable number, or a network error: nothing to do with the line
+        detail = str(error.get("detail") or "").lower()
+        if "customer" in detail:
+            return False  # VAPI rejected the practice's number
+        return any(marker in detail for marker in LINE_ERROR_MARKERS)
+    reason = ((completed_call or {}).get("endedReason") or "").lower()
+    if "customer" in reason:
+        return False
+    return any(marker in reason for marker in LINE_FAILURE_REASONS)
+
+
+class Line:
+    def __init__(self, phone_number_id: str, max_concurrent: int, calls_per_hour: int):
+        self.id = phone_number_id
+        self.max_concurrent = max(1, max_concurrent)
+        self.calls_per_hour = max(1, calls_per_hour)
+        self.in_flight = 0
+        self.recent_starts = deque()
+        self.placed = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.busy_seconds = 0.0
+        self.disabled = None  # reason, once removed from the pool
+
+    def _prune(self, now: float):
+        while self.recent_starts and self.recent_starts[0] <= now - HOUR:
+            self.recent_starts.popleft()
+
+    def has_capacity(self, now: float) -> bool:
+        self._prune(now)
+        return (not self.disabled and self.in_flight < self.max_concurrent
+                and len(self.recent_starts) < self.calls_per_hour)
+
+    def load(self) -> float:
+        return max(self.in_flight / self.max_concurrent, len(self.recent_starts) / self.calls_per_hour)
+
+    def __repr__(self):
+        return f"Line({self.id[:8]}, {self.in_flight}/{self.max_concurrent} in flight)"
+
+
+class LinePool:
+    """Thread-safe; dialer threads acquire() a line per call and release() it when the call ends."""
+
+    def __init__(self, lines: list, failure_threshold: int = FAILURE_THRESHOLD):
+        if not lines:
+            raise ValueError("no phone number ids configured")
+        self.lines = lines
+        self.failure_threshold = failure_threshold
+        self._cond = threading.Condition()
+        self._started = time.time()
+
+    @property
+    def capacity(self) -> int:
+        """Calls that can be in flight at once across the usable lines."""
+        return sum(line.max_concurrent for line in self.lines if not line.disabled)
+
+    def acquire(self, timeout: float = None) -> Line:
+        """The least-loaded line with spare capacity. Blocks until one is free; raises NoLinesAvailable."""
+        deadline = time.time() + timeout if timeout is not None else None
+        with self._cond:
+            while True:
+                now = time.time()
+                usable = [line for line in self.lines if not line.disabled]
+                if not usable:
+                    raise NoLinesAvailable("all phone lines have been disabled")
+                free = [line for line in usable if line.has_capacity(now)]
+                if free:
+                    line = min(free, key=Line.load)
+                    line.in_flight += 1
+                    line.placed += 1
+                    line.recent_starts.append(now)
+                    return line
+                # Sleep until a call ends (notify) or the oldest start leaves the hourly window
+                wait = min(
+                    (line.recent_starts[0] + HOUR - now for line in usable
+                     if line.in_flight < line.max_concurrent and line.recent_starts),
+                    default=None,
+                )
+                if deadline is not None:
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        raise TimeoutError("no phone line free")
+                    wait = remaining if wait is None else min(wait, remaining)
+                self._cond.wait(wait)
+
+    def release(self, line: Line, failed: bool = False, started: float = None):
+        """Return a line after its call ended; failed marks a line-side failure."""
+        with self._cond:
+            line.in_flight -= 1
+            if started:
+                line.busy_seconds += time.time() - started
+            if failed:
+                line.failures += 1
+                line.consecutive_failures += 1
+                if line.consecutive_failures >= self.failure_threshold and not line.disabled:
+                    line.disabled = f"{line.consecutive_failures} failures in a row"
+                    print(f"  ✗ Removing line {line.id} from the pool ({line.disabled})")
+            else:
+                line.consecutive_failures = 0
+            self._cond.notify_all()
+
+    def stats(self) -> list:
+        hours = max(1e-9, (time.time() - self._started) / HOUR)
+        with self._cond:
+            return [{
+                "id": line.id,
+                "placed": line.placed,
+                "failures": line.failures,
+                "calls_per_hour": line.placed / hours,
+                "utilisation": line.busy_seconds / (hours * HOUR * line.max_concurrent),
+                "disabled": line.disabled,
+            } for line in self.lines]
+
+    def report(self):
+        print("Phone lines:")
+        for s in self.stats():
+            status = f"DISABLED ({s['disabled']})" if s["disabled"] else "ok"
+            print(f"  {s['id']}: {s['placed']} calls ({s['failures']} failed), "
+                  f"{s['calls_per_hour']:.0f} calls/hr, {s['utilisation']:.0%} utilised - {status}")
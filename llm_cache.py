@@ -0,0 +1,230 @@
+"""
+On-disk cache of Gemini responses in SQLite (WAL mode), so --reanalyze runs,
+re-transcriptions and pilot-fit reruns don't pay for identical prompts twice.
+
+- keyed by a SHA-256 of model, request contents (prompt text and any inline
+  audio) and generationConfig - change any of them and it's a new entry
+- size-bounded: least-recently-used entries are evicted past LLM_CACHE_MAX_MB
+- optional TTL (LLM_CACHE_TTL_DAYS); expired entries count as misses
+- hit / miss counters for this run and for the lifetime of the file
+- only successful responses are stored; gemini_client.py drops entries whose
+  JSON doesn't parse
+
+gemini_client.py reads and writes it transparently. Ask for a fresh answer
+with --no-cache on the scripts (the new response replaces the stored one), or
+turn it off entirely with LLM_CACHE=off in .env.
+
+Usage:
+  python llm_cache.py stats
+  python llm_cache.py purge      # drop expired entries
+  python llm_cache.py clear
+"""
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from config import LLM_CACHE_DB, LLM_CACHE_ENABLED, LLM_CACHE_MAX_MB, LLM_CACHE_TTL_DAYS
+
+# Evict down to this fraction of the limit, so eviction doesn't run on every insert
+EVICT_TO = 0.9
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key          TEXT PRIMARY KEY,
+    model        TEXT NOT NULL,
+    response     TEXT NOT NULL,
+    size         INTEGER NOT NULL,
+    created_at   REAL NOT NULL,
+    last_used_at REAL NOT NULL,
+    hits         INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS responses_lru ON responses (last_used_at);
+CREATE TABLE IF NOT EXISTS counters (
+    name  TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+def cache_key(model: str, contents, generation_config: dict) -> str:
+    """Stable hash of everything that determines the response."""
+    blob = json.dumps({"model": model, "contents": contents, "generationConfig": generation_config},
+                      sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """One connection per thread on a shared WAL database."""
+
+    def __init__(self, path: str = LLM_CACHE_DB, max_mb: float = LLM_CACHE_MAX_MB,
+                 ttl_days: float = LLM_CACHE_TTL_DAYS):
+        self.path = path
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.ttl = ttl_days * 86400 if ttl_days else None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "stores": 0, "evictions": 0, "bypassed": 0}
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        self._size = self.size_bytes()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, name: str, n: int = 1):
+        with self._lock:
+            self.stats[name] += n
+        self._conn().execute(
+            "INSERT INTO counters (name, value) VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET value = value + ?",
+            (name, n, n),
+        )
+
+    def get(self, key: str, bypass: bool = False) -> dict | None:
+        """The stored response, or None on a miss (expired entries are deleted)."""
+        if bypass:
+            self._count("bypassed")
+            return None
+        conn = self._conn()
+        row = conn.execute("SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+        now = time.time()
+        if row and self.ttl and row[1] < now - self.ttl:
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._count("expired")
+            row = None
+        if not row:
+            self._count("misses")
+            return None
+        conn.execute("UPDATE responses SET last_used_at = ?, hits = hits + 1 WHERE key = ?", (now, key))
+        self._count("hits")
+        return json.loads(row[0])
+
+    def put(self, key: str, model: str, response: dict):
+        text = json.dumps(response, ensure_ascii=False)
+        size = len(text.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        self._conn().execute(
+            """INSERT INTO responses (key, model, response, size, created_at, last_used_at)
+               VALUES (?, ?, ?, ?, ?, ?)
+               ON CONFLICT(key) DO UPDATE SET
+                   response = excluded.response, size = excluded.size,
+                   created_at = excluded.created_at, last_used_at = excluded.last_used_at""",
+            (key, model, text, size, now, now),
+        )
+        self._count("stores")
+        with self._lock:
+            self._size += size
+            over = self._size > self.max_bytes
+        if over:
+            self.evict()
+
+    def delete(self, key: str):
+        self._conn().execute("DELETE FROM responses WHERE key = ?", (key,))
+
+    def evict(self):
+        """Drop least-recently-used entries until the cache is under EVICT_TO of its limit."""
+        conn = self._conn()
+        target = self.max_bytes * EVICT_TO
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            evicted = 0
+            for key, size in conn.execute("SELECT key, size FROM responses ORDER BY last_used_at").fetchall():
+                if total <= target:
+                    break
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                total -= size
+                evicted += 1
+        with self._lock:
+            self._size = total
+        if evicted:
+            self._count("evictions", evicted)
+
+    def purge_expired(self) -> int:
+        if not self.ttl:
+            return 0
+        cur = self._conn().execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl,))
+        self._size = self.size_bytes()
+        return cur.rowcount
+
+    def clear(self):
+        conn = self._conn()
+        conn.execute("DELETE FROM responses")
+        conn.execute("DELETE FROM counters")
+        self._size = 0
+
+    def size_bytes(self) -> int:
+        return self._conn().execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def count(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def lifetime_stats(self) -> dict:
+        return dict(self._conn().execute("SELECT name, value FROM counters").fetchall())
+
+    def report(self):
+        s = dict(self.stats)
+        lookups = s["hits"] + s["misses"]
+        if not lookups and not s["bypassed"]:
+            return
+        rate = f" ({s['hits'] / lookups:.0%} hit rate)" if lookups else ""
+        print(f"LLM cache: {s['hits']} hits, {s['misses']} misses{rate}, {s['bypassed']} bypassed, "
+              f"{s['evictions']} evicted - {self.count()} entries, {self.size_bytes() / 1024 / 1024:.1f} MB")
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> LLMCache | None:
+    """The process-wide cache, or None when LLM_CACHE=off."""
+    global _cache
+    if not LLM_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMCache()
+        return _cache
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Inspect or clear the Gemini response cache")
+    ap.add_argument("command", choices=["stats", "purge", "clear"])
+    ap.add_argument("--db", default=LLM_CACHE_DB)
+    args = ap.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"No cache at {args.db}")
+        return
+    cache = LLMCache(args.db)
+    if args.command == "stats":
+        print(f"{args.db}: {cache.count()} entries, {cache.size_bytes() / 1024 / 1024:.1f} MB "
+              f"(limit {cache.max_bytes / 1024 / 1024:.0f} MB"
+              f"{f', TTL {cache.ttl / 86400:g} days' if cache.ttl else ''})")
+        life = cache.lifetime_stats()
+        lookups = life.get("hits", 0) + life.get("misses", 0)
+        print(f"Lifetime: {life.get('hits', 0)} hits / {lookups} lookups, {life.get('stores', 0)} stored, "
+              f"{life.get('evictions', 0)} evicted, {life.get('expired', 0)} expired")
+        for model, n, size in cache._conn().execute(
+                "SELECT model, COUNT(*), SUM(size) FROM responses GROUP BY model ORDER BY 2 DESC"):
+            print(f"  {model}: {n} entries, {size / 1024:.0f} KB")
+    elif args.command == "purge":
+        print(f"Removed {cache.purge_expired()} expired entries")
+    else:
+        cache.clear()
+        print(f"Cleared {args.db}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""
+Phone number normalisation, validation and dedupe shared by the scraper, the
+dialer and the lead pipelines.
+
+Everything is keyed on E.164 ("+27215551234"), so "021 555 1234",
+"+27 (0)21 555-1234" and "0027215551234" are one practice, not three dial
+attempts. Numbers are checked against an offline copy of the South African
+numbering plan (ICASA) - geographic, mobile, toll-free, share-call, VoIP - and
+fax-to-email (086x) or premium (090) numbers are flagged as not worth a call.
+Non-SA numbers in international format are accepted on length alone.
+
+Pure string operations and dict lookups (no regex on the hot path), so it
+handles hundreds of thousands of numbers per second.
+
+Usage:
+  from phone_numbers import normalize, PhoneIndex
+  normalize("021 555 1234")        # -> "+27215551234"
+  python phone_numbers.py check "021 555 1234" "+27 82 123 4567"
+  python phone_numbers.py dedupe gynecologists.json
+  python phone_numbers.py bench
+"""
+import argparse
+import json
+import random
+import time
+from collections import namedtuple
+
+COUNTRY_CODE = "27"
+NSN_LENGTH = 9  # national significant number: digits after the trunk "0"
+
+# First two NSN digits -> number type (ICASA numbering plan)
+_GEOGRAPHIC = [10, 11, 12, 13, 14, 15, 16, 17, 18, 21, 22, 23, 27, 28, 31, 32, 33, 34, 35, 36, 39,
+               40, 41, 42, 43, 44, 45, 46, 47, 48, 49, 51, 53, 54, 56, 57, 58]
+_MOBILE = [60, 61, 62, 63, 64, 65, 66, 67, 68, 71, 72, 73, 74, 76, 78, 79, 81, 82, 83, 84]
+PREFIX_TYPES = {
+    **{str(p): "geographic" for p in _GEOGRAPHIC},
+    **{str(p): "mobile" for p in _MOBILE},
+    "80": "toll_free",
+    "87": "voip",
+    "90": "premium",
+}
+# 086 splits on the third digit: 0860/0861 share-call, the rest is fax-to-email
+PREFIX3_TYPES = {"860": "shared_cost", "861": "shared_cost",
+                 **{f"86{d}": "fax" for d in "23456789"}}
+DIALABLE_TYPES = frozenset({"geographic", "mobile", "toll_free", "shared_cost", "voip", "foreign"})
+
+_EXTENSION_MARKERS = ("ext", "x", "#", ",", ";")
+
+PhoneNumber = namedtuple("PhoneNumber", "raw e164 kind valid dialable")
+
+
+def _digits(raw: str) -> str:
+    # Chained replace() beats translate()/regex for the handful of separators people use
+    s = raw.replace(" ", "").replace("-", "").replace("(", "").replace(")", "").replace(".", "").replace("/", "")
+    if s.isdigit() or (s[:1] == "+" and s[1:].isdigit()):
+        return s
+    # Slow path: extensions ("021 555 1234 ext 2") and stray characters
+    lowered = s.lower()
+    for marker in _EXTENSION_MARKERS:
+        i = lowered.find(marker, 1)
+        if i > 0:
+            lowered = lowered[:i]
+    lowered = "".join(lowered.split())  # tabs, non-breaking spaces
+    plus = lowered[:1] == "+"
+    return ("+" if plus else "") + "".join(c for c in lowered if c.isdigit())
+
+
+def _classify_nsn(nsn: str) -> str:
+    if len(nsn) != NSN_LENGTH or not nsn.isdigit():
+        return "invalid"
+    return PREFIX3_TYPES.get(nsn[:3]) or PREFIX_TYPES.get(nsn[:2], "invalid")
+
+
+def parse(raw) -> PhoneNumber:
+    """Normalise and classify one number. e164 is None when it can't be read as a number at all."""
+    if not raw:
+        return PhoneNumber(raw, None, "invalid", False, False)
+    s = _digits(str(raw))
+
+    if s[:1] == "+":
+        s = s[1:]
+        if s[:2] != COUNTRY_CODE:
+            valid = 8 <= len(s) <= 15
+            return PhoneNumber(raw, "+" + s if valid else None, "foreign" if valid else "invalid", valid, valid)
+        nsn = s[2:]
+    elif s[:2] == "00":
+        return parse("+" + s[2:])._replace(raw=raw)
+    elif s[:1] == "0":
+        nsn = s[1:]
+    elif s[:2] == COUNTRY_CODE and len(s) == NSN_LENGTH + 2:
+        nsn = s[2:]
+    else:
+        nsn = s
+    # "+27 (0)21 ..." leaves the trunk zero in
+    if nsn[:1] == "0" and len(nsn) == NSN_LENGTH + 1:
+        nsn = nsn[1:]
+
+    kind = _classify_nsn(nsn)
+    valid = kind != "invalid"
+    e164 = "+" + COUNTRY_CODE + nsn if valid else None
+    return PhoneNumber(raw, e164, kind, valid, kind in DIALABLE_TYPES)
+
+
+def normalize(raw) -> str | None:
+    """E.164 for a valid number, else None."""
+    return parse(raw).e164
+
+
+def is_dialable(raw) -> bool:
+    """Valid, and a type worth an AI call (not fax-to-email / premium)."""
+    return parse(raw).dialable
+
+
+def phone_key(raw) -> str:
+    """Dedupe / state key: E.164 when valid, else the stripped raw string."""
+    return parse(raw).e164 or str(raw or "").strip()
+
+
+class PhoneIndex:
+    """
+    Dedupe index keyed by E.164. add() returns True the first time a number is
+    seen and False for duplicates or numbers that fail validation.
+    """
+
+    def __init__(self, dialable_only: bool = True):
+        self.dialable_only = dialable_only
+        self._items = {}
+        self.duplicates = 0
+        self.rejected = []  # PhoneNumber for every invalid / undialable number
+
+    def add(self, raw, item=None) -> bool:
+        number = parse(raw)
+        if not number.valid or (self.dialable_only and not number.dialable):
+            self.rejected.append(number)
+            return False
+        if number.e164 in self._items:
+            self.duplicates += 1
+            return False
+        self._items[number.e164] = item if item is not None else raw
+        return True
+
+    def __contains__(self, raw) -> bool:
+        return normalize(raw) in self._items
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, raw, default=None):
+        return self._items.get(normalize(raw), default)
+
+    def keys(self):
+        return self._items.keys()
+
+    def values(self):
+        return self._items.values()
+
+    def summary(self) -> str:
+        return f"{len(self)} unique, {self.duplicates} duplicates, {len(self.rejected)} invalid/undialable"
+
+
+def dedupe(items: list, field: str = "phone", dialable_only: bool = True) -> tuple:
+    """(unique items in original order, PhoneIndex) for a list of dicts with a phone field."""
+    index = PhoneIndex(dialable_only)
+    unique = [item for item in items if index.add(item.get(field), item)]
+    return unique, index
+
+
+def _bench(n: int = 300_000):
+    """Unique numbers in the formats we see from Places and Apollo."""
+    formats = ["0{}{} {}{}{} {}{}{}{}", "+27 {}{} {}{}{} {}{}{}{}", "({}{}) {}{}{}-{}{}{}{}",
+               "0027{}{}{}{}{}{}{}{}{}", "+27 (0){}{} {}{}{} {}{}{}{}", "0{}{}-{}{}{}-{}{}{}{}"]
+    rng = random.Random(1)
+    numbers = [formats[i % len(formats)].format(rng.choice("12345678"), *(rng.choice("0123456789") for _ in range(8)))
+               for i in range(n)]
+    started = time.perf_counter()
+    index = PhoneIndex()
+    for raw in numbers:
+        index.add(raw)
+    elapsed = time.perf_counter() - started
+    print(f"{n} numbers in {elapsed:.2f}s = {n / elapsed:,.0f}/s ({index.summary()})")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Normalise / validate / dedupe phone numbers")
+    sub = ap.add_subparsers(dest="command", required=True)
+    check = sub.add_parser("check", help="Show how numbers are parsed")
+    check.add_argument("numbers", nargs="+")
+    dd = sub.add_parser("dedupe", help="Report duplicates and invalid numbers in a JSON list of practices")
+    dd.add_argument("file")
+    dd.add_argument("--field", default="phone")
+    dd.add_argument("--write", action="store_true", help="Rewrite the file deduplicated, with phone_e164 added")
+    sub.add_parser("bench")
+    args = ap.parse_args()
+
+    if args.command == "check":
+        for raw in args.numbers:
+            n = parse(raw)
+            print(f"{raw!r:28} -> {n.e164 or '-':14} {n.kind}{'' if n.dialable else ' (not dialable)'}")
+    elif args.command == "dedupe":
+        with open(args.file, "r", encoding="utf-8") as f:
+            items = json.load(f)
+        unique, index = dedupe(items, args.field)
+        print(f"{args.file}: {len(items)} entries -> {index.summary()}")
+        for n in index.rejected:
+            print(f"  rejected {n.raw!r} ({n.kind})")
+        if args.write:
+            for item in unique:
+                item["phone_e164"] = normalize(item.get(args.field))
+            with open(args.file, "w", encoding="utf-8") as f:
+                json.dump(unique, f, indent=2, ensure_ascii=False)
+            print(f"Wrote {len(unique)} entries to {args.file}")
+    else:
+        _bench()
+
+
+if __name__ == "__main__":
+    main()
@@ -4,42 +4,51 @@ Enrich hubspot_marketplace_sa_companies.json using Gemini: for each profile URL,
 fetch the page with Playwright, send the text to Gemini, and extract company name + description.
 
 Usage:
-  pip install google-generativeai playwright python-dotenv
+  pip install playwright requests python-dotenv
   python -m playwright install chromium
   Add GOOGLE_API_KEY or GEMINI_API_KEY to .env
   cd "pilot checklist"
   python enrich_hubspot_companies_with_gemini.py
+  python enrich_hubspot_companies_with_gemini.py --no-cache   # re-ask Gemini for every page
 
 Reads: hubspot_marketplace_sa_companies.json (dedupes by URL)
 Writes: hubspot_marketplace_sa_companies.json (updated with Gemini-extracted name + description)
 """
 
+import argparse
 import json
 import os
-import re
 import sys
-import time
 from pathlib import Path
 
-import requests
 from dotenv import load_dotenv
 
 load_dotenv()
 
 SCRIPT_DIR = Path(__file__).resolve().parent
+REPO_ROOT = SCRIPT_DIR.parent
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from gemini_client import GeminiClient, GeminiError
+from rate_limit import get_limiter
+
 INPUT_JSON = SCRIPT_DIR / "hubspot_marketplace_sa_companies.json"
 EXTRACT_PROMPT = """From this HubSpot Solutions Marketplace partner profile page text, extract:
-1. The exact company/partner name (as shown on the page, e.g. "Huble" or "MO Agency").
-2. A 1-2 sentence description of what they do (focus on services, location, HubSpot focus).
-
-Return ONLY valid JSON in this exact format, no other text:
-{"name": "Company Name", "description": "One or two sentences."}
+1. name: the exact company/partner name (as shown on the page, e.g. "Huble" or "MO Agency").
+2. description: a 1-2 sentence description of what they do (focus on services, location, HubSpot focus).
 
 Page text:
 ---
 {text}
----
-JSON:"""
+---"""
+EXTRACT_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {"name": {"type": "STRING"}, "description": {"type": "STRING"}},
+    "required": ["name", "description"],
+}
+GEMINI_MODEL = "gemini-1.5-flash"
+_gemini = None
 
 
 def fetch_page_text(url: str) -> str:
@@ -65,109 +74,37 @@ def fetch_page_text(url: str) -> str:
             return ""
 
 
-def _gemini_rest(prompt: str, api_key: str) -> str | None:
-    """Call Gemini via REST and return response text (avoids SDK KeyError on some responses)."""
-    url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent"
-    payload = {
-        "contents": [{"parts": [{"text": prompt}]}],
-        "generationConfig": {"responseMimeType": "application/json"},
-    }
-    try:
-        r = requests.post(
-            url,
-            params={"key": api_key},
-            json=payload,
-            timeout=60,
-        )
-        r.raise_for_status()
-        data = r.json()
-        parts = (data.get("candidates") or [{}])[0].get("content", {}).get("parts") or []
-        return "".join(p.get("text", "") or "" for p in parts).strip() or None
-    except Exception:
-        return None
+def gemini() -> GeminiClient:
+    """One pooled client for the whole run (key from GOOGLE_API_KEY or GEMINI_API_KEY)."""
+    global _gemini
+    if _gemini is None:
+        _gemini = GeminiClient(api_key=os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY"), model=GEMINI_MODEL)
+    return _gemini
 
 
 def extract_with_gemini(page_text: str) -> dict | None:
     """Send page text to Gemini and return {name, description} or None."""
-    api_key = os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
-    if not api_key:
+    client = gemini()
+    if not client.api_key:
         return None
     try:
-        prompt = EXTRACT_PROMPT.format(text=page_text[:5000])
-        raw = None
-        # Prefer REST to avoid SDK KeyError('"name"') when parsing response
-        raw = _gemini_rest(prompt, api_key)
-        if not raw or not raw.strip():
-            import google.generativeai as genai
-            genai.configure(api_key=api_key)
-            model = genai.GenerativeModel("gemini-1.5-flash")
-            response = model.generate_content(prompt)
-            raw = ""
-            try:
-                if response.candidates and response.candidates[0].content.parts:
-                    for p in response.candidates[0].content.parts:
-                        t = getattr(p, "text", None)
-                        if t and isinstance(t, str):
-                            raw += t
-            except (KeyError, AttributeError, TypeError, IndexError):
-                pass
-            raw = (raw or "").strip() or None
-        if not raw:
-            return None
-        raw = raw.strip()
-        # Strip markdown code block if present
-        if "```" in raw:
-            raw = re.sub(r"```(?:json)?\s*", "", raw).replace("```", "").strip()
-        # Find first { ... } and parse
-        start = raw.find("{")
-        if start >= 0:
-            depth = 0
-            for i in range(start, len(raw)):
-                if raw[i] == "{":
-                    depth += 1
-                elif raw[i] == "}":
-                    depth -= 1
-                    if depth == 0:
-                        raw = raw[start : i + 1]
-                        break
-        # Fix smart quotes and trailing commas for JSON
-        raw = raw.replace("\u201c", '"').replace("\u201d", '"').replace("\u2018", "'").replace("\u2019", "'")
-        raw = re.sub(r",\s*}", "}", raw)
-        raw = re.sub(r",\s*]", "]", raw)
-        try:
-            data = json.loads(raw)
-        except json.JSONDecodeError:
-            # Fallback: regex extract "name": "..." and "description": "..."
-            m_name = re.search(r'"name"\s*:\s*"([^"]*)"', raw)
-            m_desc = re.search(r'"description"\s*:\s*"([^"]*)"', raw)
-            name = (m_name.group(1) if m_name else "").strip()
-            desc = (m_desc.group(1) if m_desc else "").strip()
-            if name:
-                return {"name": name[:200], "description": desc[:800]}
-            return None
-        # Normalize keys (Gemini sometimes returns keys with extra quotes, e.g. '"name"')
-        if isinstance(data, dict):
-            data = {str(k).strip('"').strip("'"): v for k, v in data.items()}
-        name = (data.get("name") or data.get("company_name") or data.get("company") or "").strip()
-        if isinstance(name, dict):
-            name = ""
-        else:
-            name = str(name)
-        desc = (data.get("description") or data.get("desc") or "").strip()
-        if isinstance(desc, dict):
-            desc = ""
-        else:
-            desc = str(desc)
-        if name:
-            return {"name": name[:200], "description": desc[:800]}
-    except json.JSONDecodeError as e:
-        print(f"  Gemini JSON error: {e}")
-    except Exception as e:
-        print(f"  Gemini error: {type(e).__name__}: {e}")
+        data = client.generate_json(EXTRACT_PROMPT.format(text=page_text[:5000]), schema=EXTRACT_SCHEMA)
+    except GeminiError as e:
+        print(f"  Gemini error: {e}")
+        return None
+    name = str(data.get("name") or "").strip()
+    desc = str(data.get("description") or "").strip()
+    if name:
+        return {"name": name[:200], "description": desc[:800]}
     return None
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Enrich HubSpot SA partner names and descriptions with Gemini")
+    parser.add_argument("--no-cache", action="store_true", help="Ask Gemini again instead of using llm_cache.db answers")
+    args = parser.parse_args()
+    if args.no_cache:
+        gemini().use_cache = False
     if not INPUT_JSON.exists():
         print(f"Missing {INPUT_JSON}. Run fetch_hubspot_marketplace_sa_playwright.py first.")
         sys.exit(1)
@@ -191,10 +128,10 @@ def main():
     for i, c in enumerate(companies):
         url = c["url"]
         print(f"  [{i+1}/{n}] {url.split('/')[-1]}...", end=" ", flush=True)
+        get_limiter().acquire("hubspot-web")
         text = fetch_page_text(url)
         if not text:
             print("(no text)")
-            time.sleep(0.5)
             continue
         out = extract_with_gemini(text)
         if out:
@@ -203,10 +140,10 @@ def main():
             print("ok")
         else:
             print("(kept)")
-        time.sleep(0.8)
 
     INPUT_JSON.write_text(json.dumps(companies, indent=2), encoding="utf-8")
     print(f"Wrote {INPUT_JSON}. Run: python fetch_hubspot_marketplace_sa.py --from-json")
+    gemini().report()
 
 
 if __name__ == "__main__":
@@ -12,27 +12,49 @@ Usage:
   Add GOOGLE_API_KEY or GEMINI_API_KEY to .env
   cd "pilot checklist"
   python evaluate_pilot_fit_gemini.py
+  python evaluate_pilot_fit_gemini.py --no-cache   # re-ask Gemini for every page
 """
 
+import argparse
 import json
 import os
-import re
 import sys
-import time
 from pathlib import Path
 
-import requests as req
 from dotenv import load_dotenv
 
 load_dotenv()
 
 SCRIPT_DIR = Path(__file__).resolve().parent
+REPO_ROOT = SCRIPT_DIR.parent
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from gemini_client import GeminiClient, GeminiError
+from rate_limit import get_limiter
+
 INPUT_JSON = SCRIPT_DIR / "hubspot_marketplace_sa_companies.json"
 OUTPUT_JSON = SCRIPT_DIR / "pilot_fit_evaluation.json"
 OUTPUT_EXCEL = SCRIPT_DIR / "pilot_fit_evaluation.xlsx"
 DEBUG_LOG = SCRIPT_DIR / "pilot_fit_debug.log"
 
 MAX_PAGE_CHARS = 10000
+GEMINI_MODEL = "gemini-2.0-flash"
+FIT_VERDICTS = ("Good fit", "Maybe", "Poor fit")
+EVAL_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "name": {"type": "STRING"},
+        "url": {"type": "STRING"},
+        "fit_verdict": {"type": "STRING", "enum": list(FIT_VERDICTS)},
+        "score": {"type": "INTEGER"},
+        "why_fit": {"type": "STRING"},
+        "why_not": {"type": "STRING"},
+        "key_signals": {"type": "ARRAY", "items": {"type": "STRING"}},
+    },
+    "required": ["name", "fit_verdict", "score", "why_fit", "why_not", "key_signals"],
+}
+_clients = {}
 
 EVAL_PROMPT_TEMPLATE = (
     "You are evaluating HubSpot Solutions Marketplace (South Africa) partner profiles "
@@ -46,7 +68,7 @@ EVAL_PROMPT_TEMPLATE = (
     "Poor fit: Pure design/creative only (no sales); only inbound/marketing with no "
     "outbound; not SA-focused; very small/solo with no outbound offering.\n\n"
     "Maybe: Some overlap but unclear on outbound/agency; mixed signals.\n\n"
-    "Return ONLY valid JSON. No markdown, no code fences, just the JSON object:\n"
+    "Return a JSON object like:\n"
     '{"name":"Company Name","url":"THE_URL","fit_verdict":"Good fit","score":7,'
     '"why_fit":"bullet points","why_not":"bullet points",'
     '"key_signals":["signal 1","signal 2"]}\n\n'
@@ -63,96 +85,43 @@ def build_prompt(url: str, text: str) -> str:
     return prompt
 
 
-def gemini_eval(prompt: str, api_key: str, model: str = "gemini-2.0-flash") -> str:
-    """Call Gemini REST API. Returns raw response text or empty string."""
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent"
-    payload = {
-        "contents": [{"parts": [{"text": prompt}]}],
-        "generationConfig": {"responseMimeType": "application/json"},
-    }
-    try:
-        r = req.post(url, params={"key": api_key}, json=payload, timeout=90)
-        r.raise_for_status()
-        data = r.json()
-        parts = (data.get("candidates") or [{}])[0].get("content", {}).get("parts") or []
-        return "".join(p.get("text", "") or "" for p in parts).strip()
-    except Exception as e:
-        return f"ERROR: {e}"
-
-
-def parse_response(raw: str, company_url: str, fallback_name: str) -> dict:
-    """Parse Gemini JSON response into a row dict. Always returns a dict (never None)."""
-    default = {
-        "name": fallback_name,
-        "url": company_url,
-        "fit_verdict": "Maybe",
-        "score": 5,
-        "why_fit": "",
-        "why_not": f"Parse failed. Raw: {(raw or '')[:200]}",
-        "key_signals": "",
-    }
-    if not raw or not raw.strip() or raw.startswith("ERROR:"):
-        default["why_not"] = raw or "Empty response"
-        return default
-
-    raw = raw.strip()
-    # Strip code fences
-    raw = re.sub(r"```(?:json)?\s*", "", raw).replace("```", "").strip()
-    # Fix quotes
-    raw = raw.replace("\u201c", '"').replace("\u201d", '"').replace("\u2018", "'").replace("\u2019", "'")
-    # Fix trailing commas
-    raw = re.sub(r",\s*}", "}", raw)
-    raw = re.sub(r",\s*]", "]", raw)
-
-    # Find outermost { ... }
-    data = None
-    start = raw.find("{")
-    if start >= 0:
-        depth = 0
-        for i in range(start, len(raw)):
-            if raw[i] == "{":
-                depth += 1
-            elif raw[i] == "}":
-                depth -= 1
-                if depth == 0:
-                    chunk = raw[start : i + 1]
-                    try:
-                        data = json.loads(chunk)
-                    except json.JSONDecodeError:
-                        pass
-                    break
+def gemini(api_key: str, model: str = GEMINI_MODEL) -> GeminiClient:
+    """One pooled client per key/model for the whole run."""
+    key = (api_key, model)
+    if key not in _clients:
+        _clients[key] = GeminiClient(api_key=api_key, model=model)
+    return _clients[key]
 
+
+def gemini_eval(prompt: str, api_key: str, model: str = GEMINI_MODEL) -> dict:
+    """Call Gemini in JSON mode with EVAL_SCHEMA. Returns the parsed object; raises GeminiError."""
+    return gemini(api_key, model).generate_json(prompt, schema=EVAL_SCHEMA)
+
+
+def parse_response(data: dict | None, company_url: str, fallback_name: str, error: str = "") -> dict:
+    """Normalise the Gemini JSON into a row dict. Always returns a dict (never None)."""
     if not isinstance(data, dict):
-        # Regex fallback
-        m_name = re.search(r'"name"\s*:\s*"([^"]*)"', raw)
-        m_verdict = re.search(r'"fit_verdict"\s*:\s*"(Good fit|Maybe|Poor fit)"', raw)
-        m_score = re.search(r'"score"\s*:\s*(\d+)', raw)
-        if m_name or m_verdict:
-            return {
-                "name": (m_name.group(1) if m_name else fallback_name)[:200],
-                "url": company_url,
-                "fit_verdict": m_verdict.group(1) if m_verdict else "Maybe",
-                "score": min(10, max(1, int(m_score.group(1)))) if m_score else 5,
-                "why_fit": "",
-                "why_not": "",
-                "key_signals": "",
-            }
-        return default
-
-    # Normalize
-    d = {str(k).strip('"').strip("'"): v for k, v in data.items()}
+        return {
+            "name": fallback_name,
+            "url": company_url,
+            "fit_verdict": "Maybe",
+            "score": 5,
+            "why_fit": "",
+            "why_not": error or "Empty response",
+            "key_signals": "",
+        }
 
     def s(val, maxlen=800):
         if isinstance(val, list):
             return " | ".join(str(x)[:200] for x in val[:10])[:maxlen]
         return str(val or "")[:maxlen]
 
-    name = s(d.get("name") or d.get("company_name") or fallback_name, 200)
-    verdict = s(d.get("fit_verdict") or d.get("verdict"), 20).strip()
-    if verdict not in ("Good fit", "Maybe", "Poor fit"):
+    name = s(data.get("name") or fallback_name, 200)
+    verdict = s(data.get("fit_verdict"), 20).strip()
+    if verdict not in FIT_VERDICTS:
         verdict = "Maybe"
     try:
-        score = max(1, min(10, int(float(str(d.get("score", 5))))))
+        score = max(1, min(10, int(float(str(data.get("score", 5))))))
     except (ValueError, TypeError):
         score = 5
 
@@ -161,9 +130,9 @@ def parse_response(raw: str, company_url: str, fallback_name: str) -> dict:
         "url": company_url,
         "fit_verdict": verdict,
         "score": score,
-        "why_fit": s(d.get("why_fit")),
-        "why_not": s(d.get("why_not")),
-        "key_signals": s(d.get("key_signals"), 500),
+        "why_fit": s(data.get("why_fit")),
+        "why_not": s(data.get("why_not")),
+        "key_signals": s(data.get("key_signals"), 500),
     }
 
 
@@ -191,6 +160,9 @@ def write_excel(results: list[dict]):
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Evaluate HubSpot SA partner pages for pilot fit with Gemini")
+    parser.add_argument("--no-cache", action="store_true", help="Ask Gemini again instead of using llm_cache.db answers")
+    args = parser.parse_args()
     if not INPUT_JSON.exists():
         print(f"Missing {INPUT_JSON}.")
         sys.exit(1)
@@ -198,6 +170,8 @@ def main():
     if not api_key:
         print("Add GOOGLE_API_KEY or GEMINI_API_KEY to .env")
         sys.exit(1)
+    if args.no_cache:
+        gemini(api_key).use_cache = False
 
     companies = json.loads(INPUT_JSON.read_text(encoding="utf-8"))
     by_url = {}
@@ -229,6 +203,7 @@ def main():
 
             # Fetch page
             text = ""
+            get_limiter().acquire("hubspot-web")
             try:
                 page.goto(url, wait_until="domcontentloaded", timeout=15000)
                 page.wait_for_timeout(1500)
@@ -248,14 +223,17 @@ def main():
 
             # Gemini
             prompt = build_prompt(url, text)
-            raw = gemini_eval(prompt, api_key)
-            debug_lines.append(f"[{slug}] raw response:\n{raw[:500]}\n")
-
-            row = parse_response(raw, url, name)
+            try:
+                data, error = gemini_eval(prompt, api_key), ""
+            except GeminiError as e:
+                data, error = None, str(e)
+                if e.raw:
+                    error += f" Raw: {e.raw[:200]}"
+            debug_lines.append(f"[{slug}] response:\n{json.dumps(data)[:500] if data else error}\n")
+
+            row = parse_response(data, url, name, error)
             results.append(row)
             print(f"{row['fit_verdict']} ({row['score']})")
-
-            time.sleep(1)
     except KeyboardInterrupt:
         print("\nStopped early. Saving results so far...")
     finally:
@@ -282,6 +260,7 @@ def main():
     maybe = sum(1 for r in results if r["fit_verdict"] == "Maybe")
     poor = len(results) - good - maybe
     print(f"Done: {good} Good fit, {maybe} Maybe, {poor} Poor fit.")
+    gemini(api_key).report()
 
 
 if __name__ == "__main__":
@@ -4,7 +4,7 @@ Scrape HubSpot Solutions Marketplace (South Africa): all pages, all company card
 optionally visit each profile for full description.
 
 Usage:
-  pip install playwright openpyxl
+  pip install playwright openpyxl python-dotenv
   python -m playwright install chromium
   cd "pilot checklist"
   python fetch_hubspot_marketplace_sa_playwright.py              # list only (cards)
@@ -18,10 +18,15 @@ Output:
 import argparse
 import json
 import sys
-import time
 from pathlib import Path
 
 SCRIPT_DIR = Path(__file__).resolve().parent
+REPO_ROOT = SCRIPT_DIR.parent
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from rate_limit import get_limiter
+
 OUTPUT_JSON = SCRIPT_DIR / "hubspot_marketplace_sa_companies.json"
 OUTPUT_EXCEL = SCRIPT_DIR / "hubspot_marketplace_sa_companies.xlsx"
 BASE_URL = "https://ecosystem.hubspot.com"
@@ -189,10 +194,10 @@ def main():
                 url = data.get("url") or ""
                 if not url or "south-africa" in url.split("/")[-1]:
                     continue
+                get_limiter().acquire("hubspot-web")
                 full_desc = get_full_description(page, url)
                 if full_desc:
                     data["description"] = full_desc
-                time.sleep(0.5)
                 if (i + 1) % 10 == 0:
                     print(f"  Fetched full description for {i + 1}/{len(companies_by_slug)}")
 
@@ -0,0 +1,111 @@
+"""
+Background post-call processing for campaigns.
+
+Transcript analysis (a Gemini round trip) and the recording download used to run
+inline before the next dial. Here they run on a bounded pool of worker threads
+fed by a queue: the dialer submits a job per finished call and goes straight back
+to dialing. The queue is bounded, so if post-call work falls far behind the
+dialer blocks on submit (backpressure) instead of growing memory without limit.
+
+drain() waits for every queued job at campaign shutdown; stats() reports queue
+depth and per-job wait / processing latency.
+"""
+import math
+import queue
+import threading
+import time
+
+DEFAULT_WORKERS = 4
+DEFAULT_MAX_QUEUE = 100
+
+
+def percentile(values: list, pct: float) -> float:
+    """Nearest-rank percentile (0 for an empty list)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[k]
+
+
+class PostCallPool:
+    """
+    handler(**job) does the work and returns a result dict; results are collected
+    in completion order. Handler exceptions are reported and counted, never raised.
+    """
+
+    def __init__(self, handler, workers: int = DEFAULT_WORKERS, max_queue: int = DEFAULT_MAX_QUEUE):
+        self._handler = handler
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self.results = []
+        self.errors = 0
+        self.max_depth = 0
+        self._waits = []
+        self._durations = []
+        self._threads = [
+            threading.Thread(target=self._work, name=f"post-call-{i}", daemon=True)
+            for i in range(max(1, workers))
+        ]
+        for t in self._threads:
+            t.start()
+
+    def submit(self, **job):
+        """Queue a job (blocks while the queue is full)."""
+        self._queue.put((time.time(), job))
+        with self._lock:
+            self.max_depth = max(self.max_depth, self._queue.qsize())
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            queued_at, job = item
+            started = time.time()
+            try:
+                result = self._handler(**job)
+            except Exception as e:
+                print(f"  ✗ Post-call error: {e}")
+                result = None
+                with self._lock:
+                    self.errors += 1
+            finished = time.time()
+            with self._lock:
+                self._waits.append(started - queued_at)
+                self._durations.append(finished - started)
+                if result is not None:
+                    self.results.append(result)
+            self._queue.task_done()
+
+    def drain(self) -> list:
+        """Finish every queued job, stop the workers and return all results."""
+        self._queue.join()
+        for _ in self._threads:
+            self._queue.put(None)
+        for t in self._threads:
+            t.join()
+        return self.results
+
+    def stats(self) -> dict:
+        with self._lock:
+            waits, durations = list(self._waits), list(self._durations)
+        return {
+            "jobs": len(durations),
+            "errors": self.errors,
+            "max_queue_depth": self.max_depth,
+            "wait_p50": percentile(waits, 50),
+            "wait_p95": percentile(waits, 95),
+            "work_p50": percentile(durations, 50),
+            "work_p95": percentile(durations, 95),
+        }
+
+    def report(self):
+        s = self.stats()
+        print(f"Post-call: {s['jobs']} jobs ({s['errors']} errors), max queue depth {s['max_queue_depth']}, "
+              f"queue wait p50/p95 {s['wait_p50']:.1f}s/{s['wait_p95']:.1f}s, "
+              f"processing p50/p95 {s['work_p50']:.1f}s/{s['work_p95']:.1f}s")
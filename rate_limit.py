@@ -0,0 +1,241 @@
+"""
+Token-bucket rate limits for the external APIs, shared by every thread and
+every process on the machine through a small SQLite (WAL) file.
+
+Each named bucket refills at count/seconds and holds a few seconds' worth of
+burst. acquire() takes from the bucket and sleeps until there is enough; a
+429 / 503 calls penalize() with the server's Retry-After, which blocks the
+bucket for every worker, not just the one that was refused.
+
+  gemini-rpm   Gemini requests per minute
+  gemini-tpm   Gemini tokens per minute (estimated up front, corrected from usageMetadata)
+  vapi         VAPI REST requests
+  places       Google Places requests
+  hunter       Hunter.io requests
+  hubspot-web  HubSpot marketplace pages scraped with Playwright
+
+Limits default to DEFAULT_LIMITS; override any of them in .env with
+RATE_LIMITS="gemini-rpm=300/60,places=5/1".
+
+Usage:
+  from rate_limit import get_limiter, limited_request
+  get_limiter().acquire("gemini-rpm")
+  resp = limited_request("hunter", "GET", url, params=params, timeout=15)
+  python rate_limit.py status
+"""
+import argparse
+import random
+import sqlite3
+import threading
+import time
+
+import requests
+
+from config import RATE_LIMIT_DB, RATE_LIMITS
+
+# bucket -> (count, per seconds)
+DEFAULT_LIMITS = {
+    "gemini-rpm": (1000, 60),
+    "gemini-tpm": (1_000_000, 60),
+    "vapi": (20, 1),
+    "places": (10, 1),
+    "hunter": (10, 1),
+    "hubspot-web": (1, 1),
+}
+# Burst size as seconds of refill (at least one request's worth)
+BURST_SECONDS = 2.0
+# Longest single sleep, so a penalty set by another process is noticed promptly
+MAX_SLEEP = 2.0
+RETRY_STATUSES = (429, 503)
+MAX_RETRIES = 4
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    name          TEXT PRIMARY KEY,
+    tokens        REAL NOT NULL,
+    updated_at    REAL NOT NULL,
+    blocked_until REAL NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+"""
+
+
+def parse_limits(spec: str = RATE_LIMITS, defaults: dict = None) -> dict:
+    """'gemini-rpm=300/60,places=5' -> {name: (count, seconds)} over the defaults."""
+    limits = dict(DEFAULT_LIMITS if defaults is None else defaults)
+    for entry in (spec or "").split(","):
+        name, _, value = entry.partition("=")
+        if not name.strip() or not value.strip():
+            continue
+        count, _, seconds = value.partition("/")
+        limits[name.strip()] = (float(count), float(seconds or 1))
+    return limits
+
+
+class RateLimiter:
+    """One connection per thread on a shared WAL database."""
+
+    def __init__(self, path: str = RATE_LIMIT_DB, limits: dict = None):
+        self.path = path
+        self.limits = parse_limits() if limits is None else limits
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.waited = {}  # bucket -> seconds spent waiting in this process
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _bucket(self, name: str) -> tuple:
+        """(refill per second, capacity)"""
+        if name not in self.limits:
+            raise KeyError(f"unknown rate-limit bucket {name!r}")
+        count, seconds = self.limits[name]
+        rate = count / seconds
+        return rate, max(1.0, rate * BURST_SECONDS)
+
+    def _take(self, name: str, n: float) -> float:
+        """Try to take n tokens; returns 0 on success or how long to wait."""
+        rate, capacity = self._bucket(name)
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            now = time.time()
+            row = conn.execute("SELECT tokens, updated_at, blocked_until FROM buckets WHERE name = ?",
+                               (name,)).fetchone()
+            tokens, updated_at, blocked_until = row if row else (capacity, now, 0.0)
+            tokens = min(capacity, tokens + max(0.0, now - updated_at) * rate)
+            if blocked_until > now:
+                wait = blocked_until - now
+            elif tokens >= min(n, capacity):
+                # A request bigger than the burst may go into debt; later callers wait it off
+                tokens -= n
+                wait = 0.0
+            else:
+                wait = (min(n, capacity) - tokens) / rate
+            conn.execute(
+                """INSERT INTO buckets (name, tokens, updated_at, blocked_until) VALUES (?, ?, ?, ?)
+                   ON CONFLICT(name) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at""",
+                (name, tokens, now, blocked_until),
+            )
+        return wait
+
+    def acquire(self, name: str, n: float = 1) -> float:
+        """Block until n tokens are available in the bucket. Returns seconds waited."""
+        waited = 0.0
+        while True:
+            wait = self._take(name, n)
+            if wait <= 0:
+                break
+            wait = min(wait, MAX_SLEEP)
+            time.sleep(wait)
+            waited += wait
+        if waited:
+            with self._lock:
+                self.waited[name] = self.waited.get(name, 0.0) + waited
+        return waited
+
+    def adjust(self, name: str, n: float):
+        """Charge n more tokens (or refund, if negative) once the real cost is known."""
+        rate, capacity = self._bucket(name)
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("UPDATE buckets SET tokens = MIN(?, tokens - ?) WHERE name = ?", (capacity, n, name))
+
+    def penalize(self, name: str, seconds: float):
+        """The server said slow down: block the bucket for everyone and empty it."""
+        self._bucket(name)
+        until = time.time() + seconds
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                """INSERT INTO buckets (name, tokens, updated_at, blocked_until) VALUES (?, 0, ?, ?)
+                   ON CONFLICT(name) DO UPDATE SET
+                       tokens = MIN(tokens, 0), updated_at = excluded.updated_at,
+                       blocked_until = MAX(blocked_until, excluded.blocked_until)""",
+                (name, time.time(), until),
+            )
+
+    def status(self) -> dict:
+        now = time.time()
+        rows = {name: (tokens, updated_at, blocked_until) for name, tokens, updated_at, blocked_until
+                in self._conn().execute("SELECT name, tokens, updated_at, blocked_until FROM buckets")}
+        out = {}
+        for name in self.limits:
+            rate, capacity = self._bucket(name)
+            tokens, updated_at, blocked_until = rows.get(name, (capacity, now, 0.0))
+            out[name] = {
+                "limit": self.limits[name],
+                "available": min(capacity, tokens + max(0.0, now - updated_at) * rate),
+                "capacity": capacity,
+                "blocked_for": max(0.0, blocked_until - now),
+            }
+        return out
+
+    def report(self):
+        if not self.waited:
+            return
+        print("Rate-limit waits: " + ", ".join(f"{name} {s:.1f}s" for name, s in sorted(self.waited.items())))
+
+
+def retry_after(resp: requests.Response) -> float | None:
+    value = resp.headers.get("Retry-After")
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+def limited_request(bucket: str, method: str, url: str, session=None, max_retries: int = MAX_RETRIES,
+                    **kwargs) -> requests.Response:
+    """
+    requests.request() paced by a bucket. A 429 / 503 blocks the bucket for
+    Retry-After (or a jittered backoff) and is retried; the last response is
+    returned either way.
+    """
+    limiter = get_limiter()
+    send = (session or requests).request
+    attempt = 0
+    while True:
+        limiter.acquire(bucket)
+        resp = send(method, url, **kwargs)
+        if resp.status_code not in RETRY_STATUSES or attempt >= max_retries:
+            return resp
+        wait = retry_after(resp) or random.uniform(0.5, min(30.0, 2 ** attempt))
+        limiter.penalize(bucket, wait)
+        resp.close()
+        attempt += 1
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter() -> RateLimiter:
+    """The process-wide limiter."""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = RateLimiter()
+        return _limiter
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Show the shared API rate-limit buckets")
+    ap.add_argument("command", choices=["status"])
+    ap.parse_args()
+    for name, s in get_limiter().status().items():
+        count, seconds = s["limit"]
+        blocked = f", blocked {s['blocked_for']:.0f}s" if s["blocked_for"] else ""
+        print(f"  {name:12} {count:g}/{seconds:g}s  {s['available']:.0f}/{s['capacity']:.0f} available{blocked}")
+
+
+if __name__ == "__main__":
+    main()
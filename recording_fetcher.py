@@ -0,0 +1,222 @@
+"""
+Parallel, resumable call-recording downloader.
+
+- downloads over the shared pooled VAPI client session (see vapi_client.py)
+- chunk size adapts to throughput (64 KB up to 1 MB)
+- writes to <file>.part and renames into place only when complete, so a half
+  written file never looks like a finished one
+- resumes an interrupted .part with an HTTP Range request, checking the 206's
+  Content-Range starts where the .part ends
+- when HEAD fails, a one-byte Range GET supplies the size instead
+- skips files that already exist with the remote size (and MD5, when the server
+  exposes one via Content-MD5 or a plain ETag)
+
+Usage:
+  python recording_fetcher.py backfill                      # every recording_url in the results log
+  python recording_fetcher.py backfill --results call_results.json --workers 16
+"""
+import argparse
+import base64
+import hashlib
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+
+from results_log import default_results_path, iter_results
+from vapi_client import get_client
+
+RECORDINGS_FOLDER = "recordings"
+DEFAULT_WORKERS = 8
+MIN_CHUNK = 64 * 1024
+MAX_CHUNK = 1024 * 1024
+# Grow the chunk while each read completes faster than this
+FAST_READ_SECONDS = 0.05
+# Byte offsets and sizes must refer to the file itself, not a compressed transfer
+IDENTITY = {"Accept-Encoding": "identity"}
+CONTENT_RANGE_RE = re.compile(r"bytes\s+(?:(\d+)-(\d+)|\*)/(\d+|\*)", re.IGNORECASE)
+
+
+def recording_filename(practice_name: str, call_id: str) -> str:
+    """'Blouberg Doctors', '019c09b4-...' -> 'Blouberg Doctors_019c09b4.mp3'"""
+    safe_name = "".join(c if c.isalnum() or c in (' ', '-', '_') else '_' for c in practice_name)
+    safe_name = safe_name[:50]  # Limit length
+    return f"{safe_name}_{call_id[:8]}.mp3"
+
+
+def _remote_md5(headers) -> str | None:
+    md5_b64 = headers.get("Content-MD5")
+    if md5_b64:
+        try:
+            return base64.b64decode(md5_b64).hex()
+        except ValueError:
+            return None
+    etag = (headers.get("ETag") or "").removeprefix("W/").strip('"')
+    return etag.lower() if re.fullmatch(r"[0-9a-fA-F]{32}", etag) else None
+
+
+def _content_range(headers) -> tuple:
+    """(first byte, total size) from a Content-Range header; None for anything missing."""
+    m = CONTENT_RANGE_RE.match(headers.get("Content-Range") or "")
+    if not m:
+        return None, None
+    return (int(m.group(1)) if m.group(1) else None), (int(m.group(3)) if m.group(3) != "*" else None)
+
+
+def _probe(client, url: str) -> tuple:
+    """(size, md5) from a one-byte Range GET, for servers where HEAD fails."""
+    try:
+        with client.request("GET", url, "recording", auth=False, stream=True,
+                            headers=dict(IDENTITY, Range="bytes=0-0")) as resp:
+            if resp.status_code == 206:
+                return _content_range(resp.headers)[1], None
+            if resp.status_code == 200:
+                length = resp.headers.get("Content-Length")
+                return (int(length) if length else None), _remote_md5(resp.headers)
+    except requests.RequestException:
+        pass
+    return None, None
+
+
+def _file_md5(path: str) -> str:
+    h = hashlib.md5()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(MAX_CHUNK), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _is_complete(path: str, size: int | None, md5: str | None) -> bool:
+    if not os.path.exists(path):
+        return False
+    if size is not None and os.path.getsize(path) != size:
+        return False
+    if md5 and _file_md5(path) != md5:
+        return False
+    return size is not None or md5 is not None
+
+
+def fetch_recording(url: str, filepath: str) -> str:
+    """
+    Download url to filepath. Returns "skipped", "resumed" or "downloaded";
+    raises requests.RequestException / IOError on failure (the .part is kept to resume).
+    """
+    client = get_client()
+    size, md5, head_ok = None, None, False
+    try:
+        head = client.request("HEAD", url, "recording", auth=False, allow_redirects=True, headers=IDENTITY)
+        if head.status_code == 200:
+            head_ok = True
+            size = int(head.headers["Content-Length"]) if head.headers.get("Content-Length") else None
+            md5 = _remote_md5(head.headers)
+    except requests.RequestException:
+        pass
+    if not head_ok:
+        size, md5 = _probe(client, url)
+
+    if _is_complete(filepath, size, md5):
+        return "skipped"
+
+    part = filepath + ".part"
+    offset = os.path.getsize(part) if os.path.exists(part) else 0
+    if size is not None and offset == size:
+        return _finish(part, filepath, size, md5, "resumed")  # finished downloading, never renamed
+    if size is not None and offset > size:
+        offset = 0
+    headers = dict(IDENTITY, Range=f"bytes={offset}-") if offset else IDENTITY
+
+    with client.request("GET", url, "recording", auth=False, stream=True, headers=headers) as resp:
+        first, total = _content_range(resp.headers)
+        if resp.status_code == 416 and offset and total == offset:
+            # Nothing after the .part: it already holds the whole file
+            return _finish(part, filepath, total, md5, "resumed")
+        if resp.status_code == 206 and offset:
+            if first != offset:
+                os.remove(part)
+                raise IOError(f"server resumed at byte {first}, not {offset}; discarded the .part")
+            size = total if size is None else size
+            mode, status = "ab", "resumed"
+        elif resp.status_code == 200:
+            mode, status, offset = "wb", "downloaded", 0
+        else:
+            raise requests.HTTPError(f"HTTP {resp.status_code}", response=resp)
+
+        chunk = MIN_CHUNK
+        with open(part, mode) as f:
+            raw = resp.raw
+            while True:
+                started = time.time()
+                data = raw.read(chunk)
+                if not data:
+                    break
+                f.write(data)
+                if time.time() - started < FAST_READ_SECONDS and chunk < MAX_CHUNK:
+                    chunk *= 2
+            f.flush()
+            os.fsync(f.fileno())
+    return _finish(part, filepath, size, md5, status)
+
+
+def _finish(part: str, filepath: str, size: int | None, md5: str | None, status: str) -> str:
+    """Check the .part against the remote size / MD5 and rename it into place."""
+    got = os.path.getsize(part)
+    if size is not None and got != size:
+        raise IOError(f"incomplete download ({got}/{size} bytes), will resume next time")
+    if md5 and _file_md5(part) != md5:
+        os.remove(part)
+        raise IOError("checksum mismatch, discarded")
+    os.replace(part, filepath)
+    return status
+
+
+def fetch_many(jobs: list, workers: int = DEFAULT_WORKERS) -> dict:
+    """jobs: (url, filepath) pairs. Downloads in parallel; returns {filepath: status or 'error: ...'}."""
+    statuses = {}
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="recordings") as pool:
+        futures = {pool.submit(fetch_recording, url, path): path for url, path in jobs}
+        for i, future in enumerate(as_completed(futures), 1):
+            path = futures[future]
+            try:
+                statuses[path] = future.result()
+            except Exception as e:
+                statuses[path] = f"error: {e}"
+            print(f"  [{i}/{len(futures)}] {statuses[path]:<10} {os.path.basename(path)}")
+    return statuses
+
+
+def backfill(results_path: str, folder: str = RECORDINGS_FOLDER, workers: int = DEFAULT_WORKERS) -> dict:
+    """Fetch every recording_url in a call results log (JSONL or legacy JSON)."""
+    os.makedirs(folder, exist_ok=True)
+    jobs = {}
+    for result in iter_results(results_path):
+        url = result.get("recording_url")
+        call_id = result.get("call_id")
+        if not url or not call_id:
+            continue
+        practice = result.get("practice") or {}
+        name = practice.get("name", "") if isinstance(practice, dict) else str(practice)
+        jobs[os.path.join(folder, recording_filename(name, call_id))] = url
+    print(f"{len(jobs)} recordings referenced in {results_path}")
+    return fetch_many([(url, path) for path, url in jobs.items()], workers)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Download call recordings (parallel, resumable)")
+    ap.add_argument("command", choices=["backfill"])
+    ap.add_argument("--results", default=default_results_path(), help="call_results.jsonl (or legacy .json)")
+    ap.add_argument("--folder", default=RECORDINGS_FOLDER)
+    ap.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    args = ap.parse_args()
+
+    statuses = backfill(args.results, args.folder, args.workers)
+    counts = {}
+    for status in statuses.values():
+        key = status.split(":")[0]
+        counts[key] = counts.get(key, 0) + 1
+    print("\n" + ", ".join(f"{n} {k}" for k, n in sorted(counts.items())) if counts else "Nothing to fetch.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""
+Streaming call results log (JSONL, one result per line).
+
+2_vapi_caller.py appends each result the moment it is produced; nothing waits for
+the end of the batch and nothing rewrites history. fsync is batched (every
+FSYNC_EVERY records or FSYNC_INTERVAL seconds, and on close), so a crash loses at
+most the last few results and never corrupts earlier ones.
+
+Readers stream with iter_results(), which also understands the legacy
+call_results.json array. The first time the log is opened (ResultsLog or
+default_results_path()) a legacy call_results.json next to it is folded in,
+oldest first, and renamed call_results.json.imported, so earlier history
+stays in the one file every reader uses. ResultsRewrite replaces a results file atomically
+(analyze_recordings_to_excel.py --reanalyze stamps updated analyses this way).
+
+Usage:
+  python results_log.py compact                     # dedupe call_results.jsonl by call_id
+  python results_log.py compact --legacy call_results.json   # fold the old JSON array in too
+"""
+import argparse
+import json
+import os
+import threading
+import time
+
+CALL_RESULTS_LOG = "call_results.jsonl"
+LEGACY_CALL_RESULTS = "call_results.json"
+FSYNC_EVERY = 20
+FSYNC_INTERVAL = 2.0
+
+
+class ResultsLog:
+    """Append-only, thread-safe JSONL writer with batched fsync."""
+
+    def __init__(self, path: str = CALL_RESULTS_LOG, fsync_every: int = FSYNC_EVERY,
+                 fsync_interval: float = FSYNC_INTERVAL, fold_legacy: bool = True):
+        """fold_legacy=False for logs that aren't call results (a sibling .json is not a legacy array of them)."""
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self._lock = threading.Lock()
+        if fold_legacy:
+            import_legacy(path)
+        self._f = open(path, "a", encoding="utf-8")
+        self._unsynced = 0
+        self._last_sync = time.time()
+        self.written = 0
+
+    def append(self, result: dict):
+        line = json.dumps(result, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            self._f.write(line)
+            self._f.flush()
+            self._unsynced += 1
+            self.written += 1
+            if self._unsynced >= self.fsync_every or time.time() - self._last_sync >= self.fsync_interval:
+                self._sync()
+
+    def _sync(self):
+        os.fsync(self._f.fileno())
+        self._unsynced = 0
+        self._last_sync = time.time()
+
+    def close(self):
+        with self._lock:
+            if not self._f.closed:
+                self._f.flush()
+                self._sync()
+                self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ResultsRewrite:
+    """
+    Stream every result of a file into a replacement, then commit() swaps it in
+    atomically (discard() keeps the original). A legacy JSON array stays an
+    array. If the file grew meanwhile (a campaign appending to it), commit()
+    keeps the original rather than drop the new lines.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.tmp = path + ".tmp"
+        self.legacy = is_legacy_array(path)
+        self._size = os.path.getsize(path) if os.path.exists(path) else 0
+        self._f = open(self.tmp, "w", encoding="utf-8")
+        self.written = 0
+        if self.legacy:
+            self._f.write("[\n")
+
+    def append(self, result: dict):
+        line = json.dumps(result, ensure_ascii=False, default=str)
+        if self.legacy:
+            line = ("" if not self.written else ",\n") + "  " + line
+        else:
+            line += "\n"
+        self._f.write(line)
+        self.written += 1
+
+    def commit(self) -> bool:
+        if self.legacy:
+            self._f.write("\n]\n")
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        self._f.close()
+        if os.path.exists(self.path) and os.path.getsize(self.path) != self._size:
+            print(f"  {self.path} changed while it was being rewritten; left as is")
+            os.remove(self.tmp)
+            return False
+        os.replace(self.tmp, self.path)
+        return True
+
+    def discard(self):
+        if not self._f.closed:
+            self._f.close()
+        if os.path.exists(self.tmp):
+            os.remove(self.tmp)
+
+
+def is_legacy_array(path: str) -> bool:
+    """True for the old call_results.json (one JSON array) rather than a JSONL log."""
+    if not os.path.exists(path):
+        return False
+    with open(path, "r", encoding="utf-8") as f:
+        head = f.read(1)
+        while head and head.isspace():
+            head = f.read(1)
+    return head == "["
+
+
+def iter_results(path: str = CALL_RESULTS_LOG):
+    """Yield result dicts from a JSONL log, or from a legacy JSON array file."""
+    if not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        head = f.read(1)
+        while head and head.isspace():
+            head = f.read(1)
+        if head == "[":
+            f.seek(0)
+            data = json.load(f)
+            yield from (r for r in data if isinstance(r, dict)) if isinstance(data, list) else ()
+            return
+        f.seek(0)
+        for lineno, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                # A torn last line from a crash mid-write - skip it
+                print(f"  Skipping unreadable line {lineno} in {path}")
+
+
+def import_legacy(path: str = CALL_RESULTS_LOG) -> int:
+    """
+    Fold the legacy JSON array next to a JSONL log (call_results.json for
+    call_results.jsonl) into the log, ahead of its own lines, then rename the
+    array *.imported. Returns the results imported (0 if there was nothing to do,
+    or the log was written to meanwhile - it is tried again next time).
+    """
+    legacy = os.path.splitext(path)[0] + ".json"
+    if not path.endswith(".jsonl") or not is_legacy_array(legacy):
+        return 0
+    size = os.path.getsize(path) if os.path.exists(path) else 0
+    tmp = path + ".tmp"
+    imported = 0
+    with open(tmp, "w", encoding="utf-8") as out:
+        for result in iter_results(legacy):
+            out.write(json.dumps(result, ensure_ascii=False, default=str) + "\n")
+            imported += 1
+        if size:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    out.write(line if line.endswith("\n") else line + "\n")
+        out.flush()
+        os.fsync(out.fileno())
+    if (os.path.getsize(path) if os.path.exists(path) else 0) != size:
+        os.remove(tmp)
+        return 0
+    os.replace(tmp, path)
+    backup = legacy + ".imported"
+    if os.path.exists(backup):
+        backup = f"{legacy}.{int(time.time())}.imported"
+    os.replace(legacy, backup)
+    print(f"  Imported {imported} results from {legacy} into {path} (original kept as {backup})")
+    return imported
+
+
+def default_results_path() -> str:
+    """The JSONL log, with a legacy call_results.json folded in first if one is still there."""
+    import_legacy(CALL_RESULTS_LOG)
+    if os.path.exists(CALL_RESULTS_LOG) or not os.path.exists(LEGACY_CALL_RESULTS):
+        return CALL_RESULTS_LOG
+    return LEGACY_CALL_RESULTS
+
+
+def compact(path: str = CALL_RESULTS_LOG, legacy: str = None) -> tuple[int, int]:
+    """
+    Rewrite the log with one line per call_id (the latest wins, keeping first-seen
+    order). Results without a call_id (failed to dial) are kept as-is.
+    Returns (lines read, lines written).
+    """
+    keyed = {}
+    order = []
+    read = 0
+    sources = ([legacy] if legacy else []) + [path]
+    for source in sources:
+        for result in iter_results(source):
+            read += 1
+            call_id = result.get("call_id")
+            key = call_id if call_id else f"__row{read}"
+            if key not in keyed:
+                order.append(key)
+            keyed[key] = result
+
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        for key in order:
+            f.write(json.dumps(keyed[key], ensure_ascii=False, default=str) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return read, len(order)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Maintain the call results JSONL log")
+    ap.add_argument("command", choices=["compact"])
+    ap.add_argument("--log", default=CALL_RESULTS_LOG, help="JSONL log to compact")
+    ap.add_argument("--legacy", default=None, help="Also fold in a legacy call_results.json array")
+    args = ap.parse_args()
+
+    read, written = compact(args.log, args.legacy)
+    print(f"Compacted {args.log}: {read} lines -> {written} unique results")
+
+
+if __name__ == "__main__":
+    main()
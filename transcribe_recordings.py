@@ -2,11 +2,22 @@
 Transcribe all MP3s in recordings/ with Gemini, build recordings_manifest.json,
 then run: python analyze_recordings_to_excel.py --from-recordings
 
-Uses GEMINI_API_KEY from .env. No Whisper needed.
+Uses GEMINI_API_KEY from .env. No Whisper needed. Per-recording stage timing
+(started, transcribed, saved) goes to transcription_trace.jsonl and
+transcription_metrics.prom (see call_metrics.py).
+
+--workers N transcribes N recordings at a time, paced by the shared Gemini
+rate limits (rate_limit.py). Each .txt is written to a temporary file and
+renamed into place, so a transcript on disk is always complete. Manifest
+entries are appended to recordings_manifest.jsonl as each recording finishes;
+recordings_manifest.json is written from it at the end. After a crash or
+Ctrl+C, rerun the same command: recordings with a transcript are not sent
+again, and the entries already in the .jsonl are kept.
 
 Usage:
   python transcribe_recordings.py
   python transcribe_recordings.py --recordings-dir plan/recordings
+  python transcribe_recordings.py --workers 8
   python analyze_recordings_to_excel.py --from-recordings --output gyni_results.xlsx
 """
 import argparse
@@ -15,7 +26,11 @@ import json
 import os
 import re
 import sys
-import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from call_metrics import StageMetrics
+from gemini_client import get_gemini
+from results_log import ResultsLog, iter_results
 
 RECORDINGS_FOLDER = "recordings"
 MANIFEST_FILE = "recordings_manifest.json"
@@ -23,6 +38,10 @@ GYNECOLOGISTS_JSON = "gynecologists.json"
 # Inline audio limit ~20MB; stay under to leave room for prompt
 MAX_INLINE_BYTES = 18 * 1024 * 1024
 GEMINI_MODEL = "gemini-2.0-flash"
+TRANSCRIPTION_STAGES = ["started", "transcribed", "saved"]
+TRANSCRIPTION_TRACE_FILE = "transcription_trace.jsonl"
+TRANSCRIPTION_METRICS_FILE = "transcription_metrics.prom"
+DEFAULT_WORKERS = 4
 
 
 def practice_name_from_filename(filename: str) -> str:
@@ -70,30 +89,15 @@ def transcribe_mp3_gemini(filepath: str, gemini_key: str) -> str:
     if len(data) > MAX_INLINE_BYTES:
         return _transcribe_via_files_api(filepath, data, gemini_key)
     b64 = base64.standard_b64encode(data).decode("ascii")
-    import requests
     prompt = (
         "Transcribe this phone call exactly. Return only the full transcript as plain text. "
         "Do not add timestamps, speaker labels, or summary. Just the words spoken."
     )
-    payload = {
-        "contents": [{
-            "parts": [
-                {"text": prompt},
-                {"inlineData": {"mimeType": "audio/mpeg", "data": b64}},
-            ]
-        }],
-        "generationConfig": {"temperature": 0},
-    }
-    resp = requests.post(
-        f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_MODEL}:generateContent?key={gemini_key}",
-        headers={"Content-Type": "application/json"},
-        json=payload,
-        timeout=120,
-    )
-    if resp.status_code != 200:
-        raise RuntimeError(f"Gemini {resp.status_code}: {resp.text[:500]}")
-    text = (resp.json().get("candidates") or [{}])[0].get("content", {}).get("parts", [{}])[0].get("text", "")
-    return (text or "").strip()
+    parts = [
+        {"text": prompt},
+        {"inlineData": {"mimeType": "audio/mpeg", "data": b64}},
+    ]
+    return get_gemini().generate_text(parts, model=GEMINI_MODEL)
 
 
 def _transcribe_via_files_api(filepath: str, data: bytes, gemini_key: str) -> str:
@@ -102,6 +106,49 @@ def _transcribe_via_files_api(filepath: str, data: bytes, gemini_key: str) -> st
     return ""
 
 
+def journal_path(manifest_path: str) -> str:
+    """recordings_manifest.json -> recordings_manifest.jsonl (the incremental manifest)"""
+    return os.path.splitext(manifest_path)[0] + ".jsonl"
+
+
+def write_text_atomic(path: str, text: str):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def manifest_entry(filename: str, practices: list) -> dict:
+    practice_name = practice_name_from_filename(filename)
+    matched = match_practice(practice_name, practices) if practices else None
+    return {
+        "transcript_file": os.path.splitext(filename)[0] + ".txt",
+        "practice_name": practice_name,
+        "phone": (matched.get("phone") or matched.get("international_phone") or "") if matched else "",
+        "address": (matched.get("address") or "") if matched else "",
+        "recording_file": filename,
+    }
+
+
+def transcribe_one(rec_dir: str, entry: dict, gemini_key: str, metrics: StageMetrics) -> str:
+    """Transcribe one recording into its .txt; returns "transcribed" or "error: ..."."""
+    filename = entry["recording_file"]
+    trace = metrics.start(filename, practice=entry["practice_name"])
+    trace.mark("started")
+    try:
+        text = transcribe_mp3_gemini(os.path.join(rec_dir, filename), gemini_key)
+        trace.mark("transcribed")
+        write_text_atomic(os.path.join(rec_dir, entry["transcript_file"]), text)
+        trace.mark("saved")
+        return "transcribed"
+    except Exception as e:
+        return f"error: {e}"
+    finally:
+        metrics.finish(trace)
+
+
 def main():
     from dotenv import load_dotenv
     load_dotenv()
@@ -113,7 +160,13 @@ def main():
     ap = argparse.ArgumentParser(description="Transcribe recordings/*.mp3 with Gemini and build manifest")
     ap.add_argument("--recordings-dir", "-d", default=RECORDINGS_FOLDER, help="Folder containing .mp3 files")
     ap.add_argument("--manifest", "-m", default=MANIFEST_FILE, help="Output manifest JSON path")
+    ap.add_argument("--workers", type=int, default=DEFAULT_WORKERS, metavar="N",
+                    help=f"Recordings transcribed at a time (default {DEFAULT_WORKERS})")
+    ap.add_argument("--no-cache", action="store_true", help="Ask Gemini again instead of using llm_cache.db answers")
     args = ap.parse_args()
+    if args.no_cache:
+        get_gemini().use_cache = False
+    workers = max(1, args.workers)
 
     rec_dir = args.recordings_dir
     if not os.path.isdir(rec_dir):
@@ -126,47 +179,67 @@ def main():
         sys.exit(1)
 
     practices = load_gynecologists()
-    print(f"Found {len(mp3s)} MP3s, using Gemini to transcribe.")
+    print(f"Found {len(mp3s)} MP3s, using Gemini to transcribe ({workers} at a time).")
     print(f"Practice names matched from {GYNECOLOGISTS_JSON} where possible.\n")
 
-    manifest = []
-    for i, filename in enumerate(mp3s, 1):
-        practice_name = practice_name_from_filename(filename)
-        matched = match_practice(practice_name, practices) if practices else None
-        phone = (matched.get("phone") or matched.get("international_phone") or "") if matched else ""
-        address = (matched.get("address") or "") if matched else ""
-
-        mp3_path = os.path.join(rec_dir, filename)
-        txt_name = os.path.splitext(filename)[0] + ".txt"
-        txt_path = os.path.join(rec_dir, txt_name)
-
-        if os.path.isfile(txt_path):
-            print(f"[{i}/{len(mp3s)}] Using existing transcript: {txt_name}")
-            with open(txt_path, "r", encoding="utf-8", errors="replace") as f:
-                text = f.read()
+    # Entries from an interrupted run; a recording is done once its transcript exists
+    journal = journal_path(args.manifest)
+    done = {}
+    for entry in iter_results(journal):
+        if entry.get("recording_file") and os.path.isfile(os.path.join(rec_dir, entry.get("transcript_file", ""))):
+            done[entry["recording_file"]] = entry
+    if done:
+        print(f"Resuming: {len(done)} recordings already in {journal}")
+
+    metrics = StageMetrics(TRANSCRIPTION_STAGES, prefix="transcription", item="recording",
+                           trace_path=TRANSCRIPTION_TRACE_FILE, metrics_path=TRANSCRIPTION_METRICS_FILE)
+    log = ResultsLog(journal, fold_legacy=False)  # the .json next to it is the finished manifest
+    todo = []
+    for filename in mp3s:
+        if filename in done:
+            continue
+        entry = manifest_entry(filename, practices)
+        if os.path.isfile(os.path.join(rec_dir, entry["transcript_file"])):
+            print(f"Using existing transcript: {entry['transcript_file']}")
+            log.append(entry)
+            done[filename] = entry
         else:
-            print(f"[{i}/{len(mp3s)}] Transcribing with Gemini: {filename}")
-            try:
-                text = transcribe_mp3_gemini(mp3_path, gemini_key)
-                with open(txt_path, "w", encoding="utf-8") as f:
-                    f.write(text)
-            except Exception as e:
-                print(f"  Error: {e}")
-                text = ""
-            time.sleep(1)
-        manifest.append({
-            "transcript_file": txt_name,
-            "practice_name": practice_name,
-            "phone": phone,
-            "address": address,
-            "recording_file": filename,
-        })
-
+            todo.append(entry)
+
+    failed = 0
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="transcribe")
+    try:
+        futures = {pool.submit(transcribe_one, rec_dir, entry, gemini_key, metrics): entry for entry in todo}
+        for n, future in enumerate(as_completed(futures), 1):
+            entry, status = futures[future], future.result()
+            if status.startswith("error"):
+                # Left out of the journal and the manifest (no .txt), so the next run tries it again
+                print(f"[{n}/{len(todo)}] {entry['recording_file']}: {status}")
+                failed += 1
+                continue
+            print(f"[{n}/{len(todo)}] Transcribed: {entry['recording_file']}")
+            log.append(entry)
+            done[entry["recording_file"]] = entry
+    except KeyboardInterrupt:
+        pool.shutdown(wait=False, cancel_futures=True)
+        log.close()
+        print(f"\nInterrupted. {log.written} entries written to {journal}; rerun the same command to resume.")
+        metrics.close()
+        return
+    pool.shutdown()
+    log.close()
+
+    manifest = [done[filename] for filename in mp3s if filename in done]
     manifest_path = args.manifest
-    with open(manifest_path, "w", encoding="utf-8") as f:
-        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    write_text_atomic(manifest_path, json.dumps(manifest, indent=2, ensure_ascii=False))
+    if not failed:
+        os.remove(journal)
 
     print(f"\nWrote {manifest_path} with {len(manifest)} entries.")
+    if failed:
+        print(f"{failed} recordings failed; rerun to retry them ({journal} keeps the rest).")
+    metrics.close()
+    get_gemini().report()
     print("Run: python analyze_recordings_to_excel.py --from-recordings "
           f"--recordings-dir {rec_dir} --manifest {manifest_path} --output gyni_results.xlsx")
 
@@ -0,0 +1,241 @@
+"""
+Trims a call transcript to the parts that matter before it goes into a Gemini
+extraction prompt (call_analysis.py), so long calls stop paying for IVR menus
+and hold chatter.
+
+- split into turns ("AI: ..." / "User: ..."), or sentences for unlabelled
+  transcripts (transcribe_recordings.py)
+- drop IVR / hold boilerplate ("for accounts press 2", "please hold",
+  "your call is important to us")
+- keep windows of WINDOW_TURNS turns around each mention of the gynae,
+  ultrasound, price or appointment questions, joined with "..."
+- stay within WINDOW_TOKEN_BUDGET, preferring windows that touch more fields
+
+Transcripts under WINDOW_MIN_TOKENS are left alone. The fast path and the
+"did the practice mention it" escalation check still read the full
+transcript; only the prompt is windowed. TRANSCRIPT_WINDOW=off in .env sends
+full transcripts.
+
+Usage:
+  from transcript_window import window
+  window(transcript)
+  python transcript_window.py stats call_results.jsonl        # reduction ratio, no Gemini calls
+  python transcript_window.py sample call_results.jsonl -n 20 # Gemini answers with vs without windowing
+"""
+import argparse
+import random
+import re
+import time
+
+from fast_extract import DAY_RE, PRICE_RES, SENTENCE_RE, TOPICS, TURN_RE
+from gemini_client import CHARS_PER_TOKEN, get_gemini
+from post_call import percentile
+from results_log import default_results_path, iter_results
+
+# Part of call_analysis.PROMPT_VERSION: bump when the rules change
+WINDOW_VERSION = 2
+WINDOW_TURNS = 1  # turns kept either side of a mention (the question and the answer)
+WINDOW_MIN_TOKENS = 300
+WINDOW_TOKEN_BUDGET = 1500
+GAP = "..."
+
+BOILERPLATE_RE = re.compile(
+    r"\bpress (?:\d|one|two|three|four|five|star|hash)\b|\bplease (?:hold|stay on the line)\b|\bhold the line\b"
+    r"|\byour call is (?:important|valuable)\b|\ball (?:of )?our (?:agents|consultants|lines|staff) are\b"
+    r"|\byou(?: have|'ve) reached\b|\b(?:after|at) the (?:tone|beep)\b|\bleave (?:a|your) (?:message|name)\b"
+    r"|\bcalls? (?:may be|are|is being) recorded\b|\bthank you for (?:calling|holding|your patience)\b"
+    r"|\bour (?:office|practice) hours are\b|\bwe are (?:currently )?closed\b"
+    r"|^\W*\[?(?:music|hold music|silence|inaudible|ringing)\]?\W*$",
+    re.IGNORECASE)
+RELEVANT = {
+    "has_gyni": (TOPICS["has_gyni"],),
+    "has_ultrasound": (TOPICS["has_ultrasound"],),
+    "price": PRICE_RES + (re.compile(r"\b(?:price|prices|fee|fees|cost|costs|charge|how much|rand|medical aid)\b",
+                                     re.IGNORECASE),),
+    "availability": (DAY_RE, re.compile(r"\b(?:appointment|appointments|available|availability|earliest|soonest"
+                                        r"|book|booking|slot|slots|fully booked|waiting list"
+                                        r"|(?:mon|tues|wednes|thurs|fri|satur|sun)days|weekends?)\b", re.IGNORECASE)),
+}
+
+
+def tokens(text: str) -> int:
+    return len(text or "") // CHARS_PER_TOKEN + 1
+
+
+def split_units(transcript: str) -> list:
+    """Turns (continuation lines joined, labels kept), or sentences when the transcript isn't labelled."""
+    turns = []
+    for line in (transcript or "").splitlines():
+        if TURN_RE.match(line):
+            turns.append(line.strip())
+        elif turns and line.strip():
+            turns[-1] += " " + line.strip()
+    if turns:
+        return turns
+    return [s.strip() for s in SENTENCE_RE.findall(transcript or "") if s.strip()]
+
+
+def _strip_boilerplate(unit: str) -> str:
+    """
+    The unit without IVR / hold sentences ("" if nothing else was said). A
+    sentence that also mentions a field ("Please hold, I'll check the gynae's
+    diary", "we are closed on Fridays") is kept.
+    """
+    label, sep, text = unit.partition(":") if TURN_RE.match(unit) else ("", "", unit)
+    kept = [s.strip() for s in SENTENCE_RE.findall(text)
+            if s.strip() and not (BOILERPLATE_RE.search(s) and not _fields(s))]
+    if not kept:
+        return ""
+    return f"{label}{sep} {' '.join(kept)}" if sep else " ".join(kept)
+
+
+def _fields(unit: str) -> set:
+    return {field for field, patterns in RELEVANT.items() if any(p.search(unit) for p in patterns)}
+
+
+def window(transcript: str, budget: int = WINDOW_TOKEN_BUDGET, min_tokens: int = WINDOW_MIN_TOKENS) -> str:
+    """The transcript cut down to the windows around relevant mentions (unchanged if it is short)."""
+    if not transcript or tokens(transcript) <= min_tokens:
+        return transcript
+    units = [u for u in (_strip_boilerplate(u) for u in split_units(transcript)) if u]
+    if not units:
+        return transcript  # nothing but IVR / hold messages: let Gemini see what there is
+    hits = [(i, _fields(u)) for i, u in enumerate(units)]
+    hits = [(i, f) for i, f in hits if f]
+    if not hits:
+        return _cap("\n".join(units), budget)
+
+    # Merge overlapping windows: [start, end, fields]
+    windows = []
+    for i, fields in hits:
+        start, end = max(0, i - WINDOW_TURNS), min(len(units) - 1, i + WINDOW_TURNS)
+        if windows and start <= windows[-1][1] + 1:
+            windows[-1][1] = max(windows[-1][1], end)
+            windows[-1][2] |= fields
+        else:
+            windows.append([start, end, set(fields)])
+
+    cost = [sum(tokens(units[j]) for j in range(s, e + 1)) for s, e, _ in windows]
+    chosen, used = set(), 0
+    # Windows touching more fields first, then earlier ones
+    for w in sorted(range(len(windows)), key=lambda w: (-len(windows[w][2]), w)):
+        if used + cost[w] <= budget:
+            chosen.add(w)
+            used += cost[w]
+    if not chosen:
+        best = min(range(len(windows)), key=lambda w: (-len(windows[w][2]), w))
+        s, e, _ = windows[best]
+        return _cap("\n".join(units[s:e + 1]), budget)
+
+    out, last = [], -1
+    for w in sorted(chosen):
+        s, e, _ = windows[w]
+        if s > last + 1:
+            out.append(GAP)
+        out.extend(units[s:e + 1])
+        last = e
+    if last < len(units) - 1:
+        out.append(GAP)
+    return "\n".join(out)
+
+
+def _cap(text: str, budget: int) -> str:
+    limit = budget * CHARS_PER_TOKEN
+    return text if len(text) <= limit else text[:limit].rsplit(" ", 1)[0] + " " + GAP
+
+
+def _transcripts(path: str) -> list:
+    out = []
+    for result in iter_results(path):
+        if result.get("transcript"):
+            practice = result.get("practice") or {}
+            name = practice.get("name", "?") if isinstance(practice, dict) else str(practice)
+            out.append((name, result["transcript"]))
+    return out
+
+
+def stats(path: str):
+    """Reduction over a results file, without calling Gemini."""
+    items = _transcripts(path)
+    if not items:
+        print(f"No transcripts in {path}")
+        return
+    full = sent = trimmed = 0
+    start = time.perf_counter()
+    for _, transcript in items:
+        text = window(transcript)
+        full += tokens(transcript)
+        sent += tokens(text)
+        trimmed += text != transcript
+    elapsed = time.perf_counter() - start
+    print(f"{len(items)} transcripts in {path}: {trimmed} windowed, {len(items) - trimmed} short enough to send whole")
+    print(f"Transcript tokens {full} -> {sent} ({1 - sent / full:.0%} cut, ratio {sent / full:.2f}); "
+          f"{elapsed / len(items) * 1000:.2f} ms per transcript")
+
+
+def sample(path: str, n: int = 20, seed: int = 1):
+    """Ask Gemini about the same transcripts with and without windowing and compare the answers."""
+    import call_analysis  # imports this module
+
+    items = [item for item in _transcripts(path) if window(item[1]) != item[1]]
+    if not items:
+        print(f"No transcripts in {path} long enough to be windowed")
+        return
+    random.Random(seed).shuffle(items)
+    items = items[:n]
+    client = get_gemini()
+    if not client.api_key:
+        print("GEMINI_API_KEY required for sample mode.")
+        return
+
+    agree = {field: 0 for field in call_analysis.ANALYSIS_FIELDS}
+    seconds = {"full": [], "windowed": []}
+    full_tokens = sent_tokens = 0
+    differences = []
+    for name, transcript in items:
+        answers = {}
+        for mode in ("full", "windowed"):
+            start = time.time()
+            # local={} sends every field to Gemini, so the comparison isn't masked by the fast path
+            answers[mode] = call_analysis.analyze_transcript(transcript, client, local={}, windowed=mode == "windowed")
+            seconds[mode].append(time.time() - start)
+        full_tokens += tokens(transcript)
+        sent_tokens += tokens(window(transcript))
+        for field in agree:
+            if answers["full"][field] == answers["windowed"][field]:
+                agree[field] += 1
+            elif len(differences) < 10:
+                differences.append(f"  {name[:30]:<30} {field}: full {answers['full'][field]!r}, "
+                                   f"windowed {answers['windowed'][field]!r}")
+
+    total = len(items)
+    print(f"Sample of {total} long transcripts from {path}: windowed prompts carry "
+          f"{sent_tokens / full_tokens:.0%} of the transcript tokens ({full_tokens} -> {sent_tokens})")
+    print("Agreement, windowed vs full: " + ", ".join(f"{f} {n / total:.0%}" for f, n in agree.items())
+          + f"; overall {sum(agree.values()) / (total * len(agree)):.1%}")
+    for mode, values in seconds.items():
+        print(f"  {mode:<9} p50 {percentile(values, 50):.2f}s / p95 {percentile(values, 95):.2f}s per transcript")
+    if differences:
+        print("Differences (first 10):")
+        print("\n".join(differences))
+    client.report()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Measure transcript windowing on a call results file")
+    ap.add_argument("command", choices=["stats", "sample"])
+    ap.add_argument("results", nargs="?", default=default_results_path(),
+                    help="call_results.jsonl (or a legacy call_results.json)")
+    ap.add_argument("-n", type=int, default=20, help="Transcripts to compare in sample mode (default 20)")
+    ap.add_argument("--no-cache", action="store_true", help="Ask Gemini again instead of using llm_cache.db answers")
+    args = ap.parse_args()
+    if args.command == "stats":
+        stats(args.results)
+    else:
+        if args.no_cache:
+            get_gemini().use_cache = False
+        sample(args.results, args.n)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Shared VAPI client: one pooled keep-alive session for every VAPI request the
+scripts make (2_vapi_caller.py, create_demo_agent.py, campaign tooling).
+
+- connection pool sized for the campaign's concurrency (no TLS handshake per request)
+- per-endpoint (connect, read) timeouts, so one hung socket can't freeze a campaign
+- paced by the shared "vapi" bucket (rate_limit.py); a 429 blocks it for
+  Retry-After across every thread and process
+- retry with jittered exponential backoff on 5xx and connection errors
+- a bounded semaphore capping requests in flight across all threads
+
+Thread-safe; use get_client() to share one instance per process.
+
+Usage:
+  from vapi_client import get_client
+  resp = get_client().get_call(call_id)
+"""
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import VAPI_API_KEY, VAPI_BASE_URL, VAPI_MAX_CONCURRENT_CALLS
+from rate_limit import get_limiter, retry_after
+
+# (connect, read) seconds per endpoint
+TIMEOUTS = {
+    "assistant": (5, 30),
+    "call.create": (5, 30),
+    "call.get": (5, 15),
+    "call.list": (5, 30),
+    "recording": (5, 120),
+}
+DEFAULT_TIMEOUT = (5, 30)
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# POST /call/phone is not idempotent: a 5xx may still have dialed, so only retry
+# when VAPI clearly refused (429) or the request never reached it.
+NO_5XX_RETRY = ("call.create",)
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 20.0
+
+
+class VapiClient:
+    def __init__(self, api_key: str = VAPI_API_KEY, base_url: str = VAPI_BASE_URL,
+                 max_concurrency: int = None, max_retries: int = MAX_RETRIES):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.max_retries = max_retries
+        max_concurrency = max_concurrency or max(8, VAPI_MAX_CONCURRENT_CALLS + 4)
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max_concurrency)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _headers(self) -> dict:
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+        }
+
+    def request(self, method: str, url: str, endpoint: str, auth: bool = True, **kwargs) -> requests.Response:
+        """
+        Send one request with pooling, timeout, retries and the concurrency cap.
+        Returns the last response (callers check status_code as before); raises
+        requests.RequestException only when every attempt failed to get one.
+        """
+        if not url.startswith("http"):
+            url = self.base_url + url
+        if auth:
+            kwargs["headers"] = {**self._headers(), **(kwargs.get("headers") or {})}
+        kwargs.setdefault("timeout", TIMEOUTS.get(endpoint, DEFAULT_TIMEOUT))
+
+        attempt = 0
+        while True:
+            get_limiter().acquire("vapi")
+            try:
+                with self._slots:
+                    resp = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                # A read timeout on a non-idempotent POST may have gone through
+                if endpoint in NO_5XX_RETRY and isinstance(e, requests.ReadTimeout):
+                    raise
+                if attempt >= self.max_retries:
+                    raise
+                wait = None
+            else:
+                retryable = resp.status_code in RETRY_STATUSES and not (
+                    endpoint in NO_5XX_RETRY and resp.status_code >= 500
+                )
+                if not retryable or attempt >= self.max_retries:
+                    return resp
+                wait = retry_after(resp)
+                resp.close()
+                if resp.status_code == 429:
+                    # Hold every campaign thread / process off VAPI, not just this request
+                    get_limiter().penalize("vapi", wait or random.uniform(0.5, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** (attempt + 1))))
+                    attempt += 1
+                    continue
+
+            if wait is None:
+                wait = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+            attempt += 1
+            time.sleep(wait)
+
+    # --- Endpoints ---
+
+    def create_assistant(self, config: dict) -> requests.Response:
+        return self.request("POST", "/assistant", "assistant", json=config)
+
+    def update_assistant(self, assistant_id: str, config: dict) -> requests.Response:
+        return self.request("PATCH", f"/assistant/{assistant_id}", "assistant", json=config)
+
+    def get_assistant(self, assistant_id: str) -> requests.Response:
+        return self.request("GET", f"/assistant/{assistant_id}", "assistant")
+
+    def create_call(self, payload: dict) -> requests.Response:
+        return self.request("POST", "/call/phone", "call.create", json=payload)
+
+    def get_call(self, call_id: str) -> requests.Response:
+        return self.request("GET", f"/call/{call_id}", "call.get")
+
+    def list_calls(self, **params) -> requests.Response:
+        return self.request("GET", "/call", "call.list", params=params)
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> VapiClient:
+    """The process-wide shared client."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = VapiClient()
+        return _client
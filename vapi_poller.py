@@ -0,0 +1,163 @@
+"""
+Batched status polling for many in-flight VAPI calls.
+
+Instead of one GET /call/{id} per call per tick, a single background thread
+refreshes every tracked call with one list-calls request (GET /call filtered by
+createdAtGt). Each call's poll interval depends on how long it has been running:
+rarely in the first 30 seconds (it is still ringing), then faster as it nears the
+assistant's maxDurationSeconds, when it is most likely to end.
+
+Used by 2_vapi_caller.py when webhooks are off, and as the webhook fallback.
+"""
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from datetime import datetime, timedelta, timezone
+
+TERMINAL_STATUSES = ("ended", "failed")
+
+EARLY_SECONDS = 30          # calls younger than this are almost always still ringing
+EARLY_INTERVAL = 15.0
+SLOW_INTERVAL = 10.0        # just after the early phase
+FAST_INTERVAL = 2.0         # near / past maxDurationSeconds
+# Look back this far before the oldest call's createdAt, to absorb clock skew
+CREATED_SLACK_SECONDS = 120
+# A call missing from list results this many ticks in a row is fetched on its own
+MISSING_TICKS_BEFORE_GET = 3
+
+
+def poll_interval(age: float, max_duration: float) -> float:
+    """Seconds until a call of this age is worth polling again."""
+    if age < EARLY_SECONDS:
+        return EARLY_INTERVAL
+    span = max(1.0, max_duration - EARLY_SECONDS)
+    progress = min(1.0, (age - EARLY_SECONDS) / span)
+    return SLOW_INTERVAL - (SLOW_INTERVAL - FAST_INTERVAL) * progress
+
+
+def _parse_iso(value: str) -> datetime | None:
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except (AttributeError, ValueError):
+        return None
+
+
+class _Tracked:
+    __slots__ = ("future", "started", "created_at", "deadline", "next_due", "missing")
+
+    def __init__(self, created_at: datetime, timeout: float):
+        now = time.time()
+        self.future = Future()
+        self.started = now
+        self.created_at = created_at
+        self.deadline = now + timeout
+        self.next_due = now + EARLY_INTERVAL
+        self.missing = 0
+
+
+class BatchCallPoller:
+    """
+    list_calls(created_after_iso, limit) -> list of call dicts (GET /call).
+    get_call(call_id) -> call dict or None (GET /call/{id}), used only for stragglers.
+    """
+
+    def __init__(self, list_calls, get_call=None, max_duration: float = 180, timeout: float = 300):
+        self._list_calls = list_calls
+        self._get_call = get_call
+        self.max_duration = max_duration
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._calls = {}
+        self._thread = None
+        self.requests_made = 0
+
+    def start(self):
+        if not self._thread:
+            self._thread = threading.Thread(target=self._run, name="vapi-poller", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        with self._lock:
+            for tracked in self._calls.values():
+                if not tracked.future.done():
+                    tracked.future.set_result(None)
+            self._calls.clear()
+
+    def track(self, call_id: str, created_at: str = "", timeout: float = None) -> Future:
+        """Start tracking a call. The future resolves with the ended call dict, or None on timeout."""
+        created = _parse_iso(created_at) or datetime.now(timezone.utc)
+        with self._lock:
+            tracked = self._calls.get(call_id)
+            if tracked is None:
+                tracked = self._calls[call_id] = _Tracked(created, timeout or self.timeout)
+        self._wake.set()
+        return tracked.future
+
+    def wait(self, call_id: str, timeout: float = None, created_at: str = "") -> dict | None:
+        future = self.track(call_id, created_at, timeout)
+        try:
+            return future.result(timeout=(timeout or self.timeout) + EARLY_INTERVAL)
+        except FutureTimeout:
+            return None
+        finally:
+            with self._lock:
+                self._calls.pop(call_id, None)
+
+    def _run(self):
+        while not self._stop.is_set():
+            with self._lock:
+                next_due = min((t.next_due for t in self._calls.values() if not t.future.done()), default=None)
+            if next_due is None:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            delay = next_due - time.time()
+            if delay > 0:
+                self._wake.wait(delay)
+                self._wake.clear()
+                continue
+            try:
+                self._tick()
+            except Exception as e:
+                print(f"  Poller error: {e}")
+                with self._lock:
+                    for tracked in self._calls.values():
+                        tracked.next_due = time.time() + FAST_INTERVAL
+
+    def _tick(self):
+        with self._lock:
+            pending = {cid: t for cid, t in self._calls.items() if not t.future.done()}
+        if not pending:
+            return
+
+        oldest = min(t.created_at for t in pending.values())
+        created_after = (oldest - timedelta(seconds=CREATED_SLACK_SECONDS)).isoformat().replace("+00:00", "Z")
+        calls = self._list_calls(created_after, max(100, 2 * len(pending)))
+        self.requests_made += 1
+        by_id = {c.get("id"): c for c in calls or []}
+
+        now = time.time()
+        for call_id, tracked in pending.items():
+            call = by_id.get(call_id)
+            if call is None:
+                tracked.missing += 1
+                if self._get_call and tracked.missing >= MISSING_TICKS_BEFORE_GET:
+                    call = self._get_call(call_id)
+                    self.requests_made += 1
+                    tracked.missing = 0
+            else:
+                tracked.missing = 0
+
+            if call and call.get("status") in TERMINAL_STATUSES:
+                tracked.future.set_result(call)
+            elif now >= tracked.deadline:
+                tracked.future.set_result(None)
+            else:
+                tracked.next_due = now + poll_interval(now - tracked.started, self.max_duration)
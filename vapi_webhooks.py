@@ -0,0 +1,312 @@
+"""
+Local receiver for VAPI server messages, so campaigns learn a call has ended the
+moment VAPI says so instead of polling GET /call/{id} every few seconds.
+
+VAPI POSTs {"message": {"type": ...}} to the server URL set on the call. We use:
+  - status-update        (status == "ended": the call is over, report follows)
+  - end-of-call-report   (transcript, recording, cost, endedReason -> resolves the call)
+
+Expose the port publicly (e.g. ngrok http 8765) and set VAPI_WEBHOOK_URL in .env;
+2_vapi_caller.py then starts the receiver and points each call at it. Calls whose
+report never arrives fall back to polling.
+
+Offline testing - every received payload can be recorded and replayed later:
+  python vapi_webhooks.py serve --port 8765 --record webhook_log.jsonl
+  python vapi_webhooks.py replay vapi_webhook_samples.jsonl --url http://127.0.0.1:8765/
+  python vapi_webhooks.py replay vapi_webhook_samples.jsonl --local
+"""
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+DEFAULT_PORT = 8765
+SERVER_MESSAGES = ["status-update", "end-of-call-report"]
+# After a status-update says "ended", wait this long for the end-of-call-report
+# before giving up on the webhook and polling instead
+REPORT_GRACE_SECONDS = 15
+# Reports / status-updates for a call nobody is waiting on are dropped after this long
+UNCLAIMED_SECONDS = 600
+
+
+def call_from_report(message: dict) -> dict:
+    """Shape an end-of-call-report like a GET /call/{id} response (what extract_call_results expects)."""
+    call = dict(message.get("call") or {})
+    artifact = message.get("artifact") or {}
+    call["status"] = "ended"
+    call["endedReason"] = message.get("endedReason") or call.get("endedReason")
+    call["transcript"] = message.get("transcript") or artifact.get("transcript") or call.get("transcript", "")
+    call["recordingUrl"] = (
+        message.get("recordingUrl")
+        or artifact.get("recordingUrl")
+        or call.get("recordingUrl", "")
+    )
+    if message.get("cost") is not None:
+        call["cost"] = message["cost"]
+    if message.get("durationSeconds") is not None:
+        call["duration"] = message["durationSeconds"]
+    for key in ("startedAt", "endedAt"):
+        if message.get(key):
+            call[key] = message[key]
+    return call
+
+
+class CallWaiter:
+    """
+    Pending calls keyed by VAPI call id. The webhook handler resolves them; dialer
+    threads block in wait(). Reports that arrive before expect() are kept so a
+    fast-failing call is never missed, but only for UNCLAIMED_SECONDS: calls
+    from other campaigns (or ones whose timeline is never read) don't pile up.
+    """
+
+    def __init__(self, unclaimed_seconds: float = UNCLAIMED_SECONDS):
+        self.unclaimed_seconds = unclaimed_seconds
+        self._lock = threading.Lock()
+        self._futures = {}
+        self._ended_at = {}
+        self._timelines = {}
+        self._expected = set()
+        self._first_seen = {}  # call id -> when a message for it first arrived
+        self._last_prune = time.time()
+
+    def _future(self, call_id: str) -> Future:
+        with self._lock:
+            fut = self._futures.get(call_id)
+            if fut is None:
+                fut = self._futures[call_id] = Future()
+            return fut
+
+    def expect(self, call_id: str) -> Future:
+        with self._lock:
+            self._expected.add(call_id)
+        return self._future(call_id)
+
+    def _prune(self, now: float):
+        """Forget calls nobody is waiting on once they are older than unclaimed_seconds. Holds self._lock."""
+        if now - self._last_prune < min(60.0, self.unclaimed_seconds):
+            return
+        self._last_prune = now
+        for call_id, seen in list(self._first_seen.items()):
+            if call_id not in self._expected and now - seen > self.unclaimed_seconds:
+                del self._first_seen[call_id]
+                self._futures.pop(call_id, None)
+                self._ended_at.pop(call_id, None)
+                self._timelines.pop(call_id, None)
+
+    def pending(self) -> int:
+        """Calls with anything still held (waiting, or reports not yet claimed)."""
+        with self._lock:
+            return len(set(self._futures) | set(self._timelines) | set(self._ended_at))
+
+    def handle_message(self, message: dict) -> str | None:
+        """Apply one server message. Returns the call id it touched, if any."""
+        call_id = (message.get("call") or {}).get("id")
+        if not call_id:
+            return None
+        now = time.time()
+        with self._lock:
+            self._first_seen.setdefault(call_id, now)
+            self._prune(now)
+        msg_type = message.get("type")
+        if msg_type == "end-of-call-report":
+            fut = self._future(call_id)
+            if not fut.done():
+                fut.set_result(call_from_report(message))
+        elif msg_type == "status-update":
+            with self._lock:
+                self._timelines.setdefault(call_id, {}).setdefault(message.get("status"), time.time())
+                if message.get("status") == "ended":
+                    self._ended_at.setdefault(call_id, time.time())
+        return call_id
+
+    def timeline(self, call_id: str) -> dict:
+        """{status: first time we heard it} from status-updates (ringing, in-progress, ended); forgets the call."""
+        with self._lock:
+            return self._timelines.pop(call_id, {})
+
+    def wait(self, call_id: str, timeout: float) -> dict | None:
+        """
+        Block until the call's end-of-call-report arrives. Returns the call dict, or
+        None on timeout / when the call ended but no report followed in time.
+        """
+        fut = self.expect(call_id)
+        deadline = time.time() + timeout
+        try:
+            while True:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return None
+                try:
+                    return fut.result(timeout=min(remaining, 1.0))
+                except FutureTimeout:
+                    pass
+                with self._lock:
+                    ended_at = self._ended_at.get(call_id)
+                if ended_at and time.time() - ended_at > REPORT_GRACE_SECONDS:
+                    return None
+        finally:
+            with self._lock:
+                self._expected.discard(call_id)
+                self._futures.pop(call_id, None)
+                self._ended_at.pop(call_id, None)
+                # The timeline stays for timeline() until it expires with the rest
+                self._first_seen.setdefault(call_id, time.time())
+
+
+def make_handler(waiter: CallWaiter, secret: str = "", record_path: str = ""):
+    record_lock = threading.Lock()
+
+    class WebhookHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if secret and self.headers.get("x-vapi-secret") != secret:
+                self.send_response(401)
+                self.end_headers()
+                return
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                body = json.loads(self.rfile.read(length) or b"{}")
+            except json.JSONDecodeError:
+                self.send_response(400)
+                self.end_headers()
+                return
+
+            if record_path:
+                with record_lock, open(record_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({"received_at": time.time(), "body": body}, ensure_ascii=False) + "\n")
+
+            message = body.get("message") or {}
+            waiter.handle_message(message)
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(b"{}")
+
+        def log_message(self, format, *args):
+            pass
+
+    return WebhookHandler
+
+
+def start_webhook_server(waiter: CallWaiter, port: int = DEFAULT_PORT, secret: str = "",
+                         record_path: str = "", host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Start the receiver on a daemon thread. Call .shutdown() on the result to stop it."""
+    server = ThreadingHTTPServer((host, port), make_handler(waiter, secret, record_path))
+    thread = threading.Thread(target=server.serve_forever, name="vapi-webhooks", daemon=True)
+    thread.start()
+    print(f"Listening for VAPI webhooks on {host}:{server.server_port}")
+    return server
+
+
+def server_override(url: str, secret: str = "") -> dict:
+    """assistantOverrides fragment that sends this call's server messages to url."""
+    server = {"url": url}
+    if secret:
+        server["secret"] = secret
+    return {"server": server, "serverMessages": SERVER_MESSAGES}
+
+
+def load_recorded(path: str) -> list:
+    """Read a recording (lines of {"received_at", "body"}) or plain lines of raw webhook bodies."""
+    entries = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            if "body" not in entry:
+                entry = {"received_at": None, "body": entry}
+            entries.append(entry)
+    return entries
+
+
+def replay(path: str, url: str, speed: float = 0.0, secret: str = "") -> int:
+    """
+    POST recorded payloads to url. speed=0 sends back-to-back; speed=1 keeps the
+    original gaps between messages, 10 plays them 10x faster.
+    """
+    entries = load_recorded(path)
+    headers = {"Content-Type": "application/json"}
+    if secret:
+        headers["x-vapi-secret"] = secret
+    prev = None
+    with requests.Session() as session:
+        for entry in entries:
+            at = entry.get("received_at")
+            if speed > 0 and prev is not None and at is not None:
+                time.sleep(max(0.0, (at - prev) / speed))
+            prev = at if at is not None else prev
+            resp = session.post(url, headers=headers, json=entry["body"], timeout=10)
+            msg = entry["body"].get("message") or {}
+            call_id = (msg.get("call") or {}).get("id", "?")
+            print(f"  {msg.get('type', '?'):<20} {call_id[:8]}  -> {resp.status_code}")
+    return len(entries)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="VAPI webhook receiver and offline replay")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    sp = sub.add_parser("serve", help="Run the receiver and print each resolved call")
+    sp.add_argument("--port", type=int, default=DEFAULT_PORT)
+    sp.add_argument("--secret", default="", help="Expected x-vapi-secret header")
+    sp.add_argument("--record", default="", help="Append every payload to this JSONL file")
+
+    rp = sub.add_parser("replay", help="POST recorded payloads to a receiver")
+    rp.add_argument("file", help="JSONL of recorded payloads")
+    rp.add_argument("--url", default=f"http://127.0.0.1:{DEFAULT_PORT}/")
+    rp.add_argument("--speed", type=float, default=0.0, help="0 = no gaps, 1 = real time")
+    rp.add_argument("--secret", default="")
+    rp.add_argument("--local", action="store_true",
+                    help="Start a receiver in-process on a free port and report which calls resolved")
+    args = ap.parse_args()
+
+    if args.cmd == "serve":
+        waiter = CallWaiter()
+        server = start_webhook_server(waiter, args.port, args.secret, args.record)
+        original = waiter.handle_message
+
+        def handle_and_print(message):
+            call_id = original(message)
+            if call_id and message.get("type") == "end-of-call-report":
+                call = call_from_report(message)
+                print(f"  ended {call_id[:8]}: {call.get('endedReason')} ({call.get('duration')}s)")
+            return call_id
+
+        waiter.handle_message = handle_and_print
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            server.shutdown()
+        return
+
+    if args.local:
+        waiter = CallWaiter()
+        server = start_webhook_server(waiter, 0, args.secret, host="127.0.0.1")
+        url = f"http://127.0.0.1:{server.server_port}/"
+        call_ids = {
+            ((e["body"].get("message") or {}).get("call") or {}).get("id")
+            for e in load_recorded(args.file)
+        } - {None}
+        futures = {cid: waiter.expect(cid) for cid in call_ids}
+        replay(args.file, url, args.speed, args.secret)
+        server.shutdown()
+        resolved = [cid for cid, fut in futures.items() if fut.done()]
+        print(f"\nResolved {len(resolved)}/{len(futures)} calls from webhooks")
+        for cid in sorted(resolved):
+            call = futures[cid].result()
+            print(f"  {cid[:8]}: {call.get('endedReason')} | transcript {len(call.get('transcript') or '')} chars")
+        return
+
+    n = replay(args.file, args.url, args.speed, args.secret)
+    print(f"Replayed {n} payloads to {args.url}")
+
+
+if __name__ == "__main__":
+    main()